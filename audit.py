@@ -0,0 +1,178 @@
+"""
+Automatic audit capture into ``audit_log_legal`` via session flush hooks.
+
+Diffs come from SQLAlchemy attribute history, so no row is re-read before an
+update. An attribute that was expired (e.g. by a commit) and then set has no
+previous value in memory: it appears in ``new_values`` and ``changed_fields``
+but is left out of ``old_values`` rather than recorded as null. Only changed
+columns are serialized (JSONB and ARRAY values included),
+and every audit row produced by a flush is written with a single multi-row
+insert on the flush's own connection, inside the same transaction.
+
+Auditing is opt-in per table with optional excluded fields:
+
+    enable_auditing(SessionLocal, {
+        'abogados': (),
+        'suscripciones_legales': ('metodo_pago',),
+    })
+
+Actor details are read from ``session.info['audit']`` (keys: actor_id,
+actor_type, actor_email, ip_address, user_agent, request_id).
+"""
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import event, insert, inspect
+from sqlalchemy.orm import Session
+
+from models import AuditLogLegal
+
+# Columns that change on every update and carry no audit value
+ALWAYS_EXCLUDED = frozenset({'updated_at'})
+
+DEFAULT_AUDITED_TABLES: Mapping[str, Iterable[str]] = {
+    'organizaciones_legales': (),
+    'planes_suscripcion_legal': (),
+    'suscripciones_legales': ('metodo_pago',),
+    'abogados': (),
+    'abogados_certificaciones': (),
+}
+
+_ACTOR_FIELDS = ('actor_id', 'actor_type', 'actor_email', 'ip_address', 'user_agent', 'request_id')
+
+
+def to_json_value(value):
+    """Convert a column value to something JSONB can store."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): to_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_json_value(v) for v in value]
+    return str(value)
+
+
+def _record_id(state):
+    """
+    First primary-key value of ``state``. ``state.identity`` is still None for
+    new objects inside ``after_flush``, so read the flushed value from the
+    instance dict (no SQL is emitted).
+    """
+    if state.identity:
+        return state.identity[0]
+    column = state.mapper.primary_key[0]
+    return state.dict.get(state.mapper.get_property_by_column(column).key)
+
+
+class AuditConfig:
+    """Per-table opt-in and field exclusions."""
+
+    def __init__(self, tables: Mapping[str, Iterable[str]]):
+        self.excluded: Dict[str, frozenset] = {
+            table: frozenset(fields) | ALWAYS_EXCLUDED for table, fields in tables.items()
+        }
+
+    def _columns(self, state) -> Optional[List]:
+        table = state.mapper.local_table.name
+        excluded = self.excluded.get(table)
+        if excluded is None:
+            return None
+        return [
+            (prop.key, prop.columns[0].name)
+            for prop in state.mapper.column_attrs
+            if prop.columns[0].name not in excluded
+        ]
+
+    def _row(self, state, action: str, old, new, changed, actor: Mapping) -> dict:
+        row = {
+            'id': uuid.uuid4(),
+            'action': action,
+            'table_name': state.mapper.local_table.name,
+            'record_id': _record_id(state),
+            'old_values': old,
+            'new_values': new,
+            'changed_fields': changed,
+            'action_timestamp': datetime.now(timezone.utc),
+            'metadata': {},
+        }
+        for key in _ACTOR_FIELDS:
+            row[key] = actor.get(key)
+        if not row['actor_type']:
+            row['actor_type'] = 'system'
+        return row
+
+    def collect(self, session: Session) -> List[dict]:
+        """Build audit rows for everything flushed in ``session``."""
+        actor = session.info.get('audit', {})
+        rows = []
+
+        for obj in session.new:
+            state = inspect(obj)
+            columns = self._columns(state)
+            if columns is None:
+                continue
+            # Server-generated values are expired after the flush; use what is in memory
+            loaded = state.dict
+            new = {name: to_json_value(loaded[key]) for key, name in columns if loaded.get(key) is not None}
+            rows.append(self._row(state, 'INSERT', None, new, sorted(new), actor))
+
+        for obj in session.dirty:
+            state = inspect(obj)
+            columns = self._columns(state)
+            if columns is None:
+                continue
+            old, new = {}, {}
+            for key, name in columns:
+                history = state.attrs[key].history
+                if not history.has_changes():
+                    continue
+                after = history.added[0] if history.added else None
+                if history.deleted:
+                    before = history.deleted[0]
+                    if before == after:
+                        continue
+                    old[name] = to_json_value(before)
+                # else: the old value was never loaded, so it is unknown
+                new[name] = to_json_value(after)
+            if new:
+                rows.append(self._row(state, 'UPDATE', old, new, sorted(new), actor))
+
+        for obj in session.deleted:
+            state = inspect(obj)
+            columns = self._columns(state)
+            if columns is None:
+                continue
+            # Only values already loaded are recorded; nothing is re-read
+            loaded = state.dict
+            old = {name: to_json_value(loaded[key]) for key, name in columns if key in loaded}
+            rows.append(self._row(state, 'DELETE', old, None, None, actor))
+
+        return rows
+
+    def after_flush(self, session: Session, flush_context):
+        rows = self.collect(session)
+        if rows:
+            session.connection().execute(insert(AuditLogLegal.__table__), rows)
+
+
+def enable_auditing(target=Session, tables: Mapping[str, Iterable[str]] = DEFAULT_AUDITED_TABLES) -> AuditConfig:
+    """
+    Write audit rows on every flush of ``target`` (a Session class,
+    sessionmaker or session) for the given tables, skipping excluded fields.
+    Bulk ``update()``/``delete()`` statements bypass the flush and are not
+    captured.
+    """
+    config = AuditConfig(tables)
+    event.listen(target, 'after_flush', config.after_flush)
+    return config
+
+
+def disable_auditing(config: AuditConfig, target=Session):
+    """Remove hooks installed by ``enable_auditing``."""
+    event.remove(target, 'after_flush', config.after_flush)
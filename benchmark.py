@@ -0,0 +1,334 @@
+"""
+Benchmark suite for the lawyer registry schema.
+
+Times the queries the application depends on (directory listing over
+``v_abogados_activos``, GIN array lookups, review and log browsing), log
+inserts and the incremental ``schema.sql`` deploy against a database loaded
+with ``synthetic_data.py``. For every query the ``EXPLAIN (ANALYZE, BUFFERS,
+FORMAT JSON)`` plan is captured next to its timings.
+
+Each run is saved as JSON. Given a baseline run, ``compare`` flags cases whose
+median got slower than the threshold, and queries whose plan changed shape
+(different indexes, or a new sequential scan), so schema and index changes
+can be checked before they reach production.
+"""
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import insert, text
+
+import database
+import migrations
+from models import AuditLogLegal, EventLogLegal
+
+BENCHMARK_DIR = os.getenv("BENCHMARK_DIR", "benchmark_results")
+DEFAULT_REPEAT = 20
+DEFAULT_WARMUP = 3
+DEFAULT_THRESHOLD = 0.20
+# Ignore slowdowns smaller than this; sub-millisecond noise is not a regression
+MIN_REGRESSION_MS = 0.5
+INSERT_BATCH = 1000
+
+
+@dataclass
+class BenchmarkCase:
+    """A named query with fixed parameters; ``params_sql`` picks them from the data."""
+    name: str
+    sql: str
+    params: Dict[str, object] = field(default_factory=dict)
+    params_sql: Optional[str] = None
+    explain: bool = True
+
+
+QUERY_CASES: List[BenchmarkCase] = [
+    BenchmarkCase(
+        'directory_departamento',
+        "SELECT id, nombres, apellidos, municipio, calificacion_promedio, nombre_organizacion "
+        "FROM v_abogados_activos WHERE departamento = :departamento "
+        "ORDER BY calificacion_promedio DESC, total_valoraciones DESC LIMIT 20",
+        {'departamento': 'Antioquia'},
+    ),
+    BenchmarkCase(
+        'directory_cobertura_especialidad',
+        "SELECT id, nombres, apellidos, calificacion_promedio FROM v_abogados_activos "
+        "WHERE departamentos_cobertura @> ARRAY[:departamento]::text[] "
+        "AND especialidades @> ARRAY[:especialidad]::text[] "
+        "ORDER BY calificacion_promedio DESC LIMIT 20",
+        {'departamento': 'Valle del Cauca', 'especialidad': 'SOAT'},
+    ),
+    BenchmarkCase(
+        'directory_deep_page',
+        "SELECT id, nombres, apellidos FROM v_abogados_activos "
+        "ORDER BY calificacion_promedio DESC, id LIMIT 20 OFFSET 10000",
+    ),
+    BenchmarkCase(
+        'directory_keyset_page',
+        "SELECT id, nombres, apellidos FROM abogados_directorio "
+        "WHERE (rating_sort, id) < (:rating, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::uuid) "
+        "ORDER BY rating_sort DESC, id DESC LIMIT 20",
+        {'rating': 4},
+    ),
+    BenchmarkCase(
+        'directory_search',
+        "SELECT id, nombres, apellidos FROM abogados_directorio "
+        "WHERE search_vector @@ to_tsquery('es_unaccent', :tsquery) OR :phrase <% search_text "
+        "ORDER BY ts_rank_cd(search_vector, to_tsquery('es_unaccent', :tsquery)) "
+        "+ word_similarity(:phrase, search_text) DESC LIMIT 20",
+        {'tsquery': 'gomez:*', 'phrase': 'gomez'},
+    ),
+    BenchmarkCase(
+        'gin_especialidades_count',
+        "SELECT COUNT(*) FROM abogados WHERE especialidades @> ARRAY[:especialidad]::text[]",
+        {'especialidad': 'Derecho de Seguros'},
+    ),
+    BenchmarkCase(
+        'gin_municipios_overlap',
+        "SELECT id FROM abogados WHERE municipios_cobertura && ARRAY[:a, :b]::text[] LIMIT 100",
+        {'a': 'Envigado', 'b': 'Palmira'},
+    ),
+    BenchmarkCase(
+        'abogado_por_email',
+        "SELECT * FROM abogados WHERE email = :email",
+        params_sql="SELECT email FROM abogados ORDER BY id LIMIT 1",
+    ),
+    BenchmarkCase(
+        'valoraciones_abogado',
+        "SELECT id, calificacion, comentario, created_at FROM abogados_valoraciones "
+        "WHERE abogado_id = :abogado_id AND verificado = TRUE ORDER BY created_at DESC LIMIT 20",
+        params_sql="SELECT id AS abogado_id FROM abogados ORDER BY total_valoraciones DESC, id LIMIT 1",
+    ),
+    BenchmarkCase(
+        'eventos_actor_rango',
+        "SELECT id, event_type, event_timestamp FROM event_log_legal "
+        "WHERE actor_id = :actor_id AND event_timestamp >= :desde ORDER BY event_timestamp DESC LIMIT 50",
+        params_sql="SELECT actor_id, MAX(event_timestamp) - INTERVAL '30 days' AS desde FROM event_log_legal "
+                   "WHERE actor_id = (SELECT actor_id FROM event_log_legal WHERE actor_id IS NOT NULL "
+                   "ORDER BY event_timestamp DESC, id DESC LIMIT 1) GROUP BY actor_id",
+    ),
+    BenchmarkCase(
+        'eventos_pendientes',
+        "SELECT id FROM event_log_legal WHERE processed = FALSE ORDER BY event_timestamp LIMIT 500",
+    ),
+    BenchmarkCase(
+        'auditoria_registro',
+        "SELECT id, action, changed_fields, action_timestamp FROM audit_log_legal "
+        "WHERE record_id = :record_id ORDER BY action_timestamp DESC LIMIT 50",
+        params_sql="SELECT record_id FROM audit_log_legal WHERE record_id IS NOT NULL "
+                   "ORDER BY action_timestamp DESC, id DESC LIMIT 1",
+    ),
+]
+
+
+# ============================================================================
+# Measuring
+# ============================================================================
+def _stats(samples_ms: List[float]) -> dict:
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0], 3),
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(p95, 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def _time(fn: Callable[[], None], repeat: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return _stats(samples)
+
+
+def summarize_plan(plan: dict) -> dict:
+    """Node types, scanned relations and indexes used by an EXPLAIN JSON plan."""
+    nodes, indexes, seq_scans = set(), set(), set()
+
+    def walk(node):
+        nodes.add(node['Node Type'])
+        if 'Index Name' in node:
+            indexes.add(node['Index Name'])
+        if node['Node Type'] == 'Seq Scan':
+            seq_scans.add(node.get('Relation Name'))
+        for child in node.get('Plans', ()):
+            walk(child)
+
+    walk(plan['Plan'])
+    return {
+        'node_types': sorted(nodes),
+        'indexes': sorted(indexes),
+        'seq_scans': sorted(s for s in seq_scans if s),
+        'total_cost': plan['Plan'].get('Total Cost'),
+        'execution_ms': plan.get('Execution Time'),
+        'shared_hit': plan['Plan'].get('Shared Hit Blocks'),
+        'shared_read': plan['Plan'].get('Shared Read Blocks'),
+    }
+
+
+def run_query_case(conn, case: BenchmarkCase, repeat: int, warmup: int) -> dict:
+    params = dict(case.params)
+    if case.params_sql:
+        row = conn.execute(text(case.params_sql)).mappings().first()
+        if row is None:
+            return {'skipped': 'no data for parameters'}
+        params.update(row)
+    statement = text(case.sql)
+    result = _time(lambda: conn.execute(statement, params).fetchall(), repeat, warmup)
+    if case.explain:
+        explained = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {case.sql}"), params).scalar()
+        plan = explained[0] if isinstance(explained, list) else json.loads(explained)[0]
+        result['plan_summary'] = summarize_plan(plan)
+        result['plan'] = plan
+    return result
+
+
+def _event_rows(n: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        'id': uuid.uuid4(), 'event_type': 'benchmark', 'event_category': 'system', 'actor_type': 'system',
+        'payload': {'i': i}, 'event_timestamp': now, 'processed': True,
+    } for i in range(n)]
+
+
+def _audit_rows(n: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        'id': uuid.uuid4(), 'action': 'UPDATE', 'table_name': 'abogados', 'actor_type': 'system',
+        'record_id': uuid.uuid4(), 'old_values': {'telefono': '1'}, 'new_values': {'telefono': '2'},
+        'changed_fields': ['telefono'], 'action_timestamp': now,
+    } for _ in range(n)]
+
+
+def run_insert_case(engine, table, make_rows: Callable[[int], List[dict]], repeat: int, warmup: int) -> dict:
+    """Time one multi-row insert of INSERT_BATCH rows; each run is rolled back."""
+    def once():
+        rows = make_rows(INSERT_BATCH)
+        with engine.connect() as conn:
+            trans = conn.begin()
+            conn.execute(insert(table), rows)
+            trans.rollback()
+    result = _time(once, repeat, warmup)
+    result['rows_per_second'] = round(INSERT_BATCH / (result['median_ms'] / 1000)) if result['median_ms'] else None
+    return result
+
+
+def run_benchmarks(repeat: int = DEFAULT_REPEAT, warmup: int = DEFAULT_WARMUP, include_deploy: bool = True,
+                   database_url: Optional[str] = None) -> dict:
+    """Run every case and return the results document."""
+    engine = database.get_engine(database_url)
+    results = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'repeat': repeat,
+        'cases': {},
+    }
+    with engine.connect() as conn:
+        results['server_version'] = conn.exec_driver_sql("SHOW server_version").scalar()
+        results['row_counts'] = {
+            table: conn.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"
+            ), {"t": table}).scalar()
+            for table in ('abogados', 'abogados_valoraciones', 'event_log_legal', 'audit_log_legal')
+        }
+        for case in QUERY_CASES:
+            results['cases'][case.name] = run_query_case(conn, case, repeat, warmup)
+            conn.rollback()
+
+    results['cases']['insert_event_log_batch'] = run_insert_case(
+        engine, EventLogLegal.__table__, _event_rows, max(3, repeat // 4), 1)
+    results['cases']['insert_audit_log_batch'] = run_insert_case(
+        engine, AuditLogLegal.__table__, _audit_rows, max(3, repeat // 4), 1)
+
+    if include_deploy:
+        # With nothing pending this measures parsing, checksumming and the no-op path
+        results['cases']['deploy_schema_incremental'] = _time(
+            lambda: migrations.apply_schema(database_url=database_url), max(3, repeat // 4), 1)
+    results['finished_at'] = datetime.now(timezone.utc).isoformat()
+    return results
+
+
+# ============================================================================
+# Comparing
+# ============================================================================
+@dataclass
+class Regression:
+    case: str
+    kind: str
+    detail: str
+
+    def __str__(self) -> str:
+        return f"{self.case}: {self.kind} - {self.detail}"
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD,
+            min_delta_ms: float = MIN_REGRESSION_MS) -> List[Regression]:
+    """Cases that got slower than ``threshold`` (relative) or changed plan shape."""
+    regressions = []
+    for name, result in current['cases'].items():
+        before = baseline.get('cases', {}).get(name)
+        if not before or 'median_ms' not in before or 'median_ms' not in result:
+            continue
+        old, new = before['median_ms'], result['median_ms']
+        if new - old > min_delta_ms and old and new / old - 1 > threshold:
+            regressions.append(Regression(name, 'slower', f"median {old:.3f}ms -> {new:.3f}ms (+{(new / old - 1):.0%})"))
+
+        old_plan, new_plan = before.get('plan_summary'), result.get('plan_summary')
+        if old_plan and new_plan:
+            new_seq = set(new_plan['seq_scans']) - set(old_plan['seq_scans'])
+            if new_seq:
+                regressions.append(Regression(name, 'seq_scan', f"new sequential scan on {', '.join(sorted(new_seq))}"))
+            lost = set(old_plan['indexes']) - set(new_plan['indexes'])
+            if lost:
+                regressions.append(Regression(name, 'plan_changed', f"no longer uses {', '.join(sorted(lost))}"))
+    return regressions
+
+
+def save_results(results: dict, path: Optional[str] = None) -> str:
+    if path is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        path = os.path.join(BENCHMARK_DIR, f"{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    return path
+
+
+def format_results(results: dict) -> str:
+    lines = []
+    for name, result in results['cases'].items():
+        if 'skipped' in result:
+            lines.append(f"{name:36} skipped ({result['skipped']})")
+            continue
+        plan = result.get('plan_summary')
+        via = f"  [{', '.join(plan['indexes']) or 'no index'}]" if plan else ''
+        lines.append(f"{name:36} median {result['median_ms']:9.3f}ms  p95 {result['p95_ms']:9.3f}ms{via}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    repeat = DEFAULT_REPEAT
+    if "--repeat" in sys.argv:
+        repeat = int(sys.argv[sys.argv.index("--repeat") + 1])
+    output = sys.argv[sys.argv.index("--output") + 1] if "--output" in sys.argv else None
+
+    run = run_benchmarks(repeat=repeat, include_deploy="--no-deploy" not in sys.argv)
+    print(format_results(run))
+    print(f"Saved to {save_results(run, output)}")
+
+    if "--baseline" in sys.argv:
+        with open(sys.argv[sys.argv.index("--baseline") + 1]) as f:
+            found = compare(run, json.load(f))
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if found else 0)
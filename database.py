@@ -1,55 +1,310 @@
 """
 Database operations helper for SOAT Connect Lawyer Registry.
+
+Clients and engines are created once per process and reused. The SQLAlchemy
+engine uses a bounded connection pool and sessions are bound to
+``models.Base`` and scoped per thread (or per asyncio task).
 """
+import asyncio
+import itertools
 import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from supabase import create_client, Client
-from typing import Optional
+
+from models import Base
 
 # Environment variables
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Process-wide registry
+_registry_lock = threading.Lock()
+_supabase_clients: Dict[Tuple[str, str], Client] = {}
+_engines: Dict[str, Engine] = {}
+_session_factories: Dict[str, sessionmaker] = {}
+_scoped_sessions: Dict[str, scoped_session] = {}
+
+# Scope tokens of asyncio tasks; unlike id(task), never reused by a later task
+_task_tokens: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+_task_token_counter = itertools.count(1)
+_task_tokens_lock = threading.Lock()
+
+
+# ============================================================================
+# Pool metrics
+# ============================================================================
+class PoolMetrics:
+    """Checkout/wait counters for one connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_checkout(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_time_total += waited
+            if waited > self.wait_time_max:
+                self.wait_time_max = waited
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "timeouts": self.timeouts,
+                "wait_time_total_s": round(self.wait_time_total, 6),
+                "wait_time_avg_s": round(self.wait_time_total / attempts, 6) if attempts else 0.0,
+                "wait_time_max_s": round(self.wait_time_max, 6),
+            }
 
 
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_checkout(time.perf_counter() - start)
+        return conn
+
+    def _do_return_conn(self, record):
+        if self.metrics is not None:
+            self.metrics.record_checkin()
+        super()._do_return_conn(record)
+
+    def recreate(self):
+        # Engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+# ============================================================================
+# Clients and engines
+# ============================================================================
 def get_supabase_client() -> Client:
-    """Get Supabase client instance."""
+    """Get the process-wide Supabase client instance."""
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise ValueError("SUPABASE_URL and SUPABASE_KEY environment variables must be set")
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    key = (SUPABASE_URL, SUPABASE_KEY)
+    client = _supabase_clients.get(key)
+    if client is None:
+        with _registry_lock:
+            client = _supabase_clients.get(key)
+            if client is None:
+                client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                _supabase_clients[key] = client
+    return client
 
 
-def execute_schema(schema_file: str = "schema.sql") -> bool:
+def get_engine(database_url: Optional[str] = None) -> Engine:
     """
-    Execute the schema SQL file against Supabase.
-    Note: This requires the service role key for DDL operations.
+    Get the pooled SQLAlchemy engine for ``database_url`` (defaults to DATABASE_URL).
+    The engine is created on first use and shared by the whole process.
     """
+    url = database_url or DATABASE_URL
+    if not url:
+        raise ValueError("DATABASE_URL environment variable must be set")
+    engine = _engines.get(url)
+    if engine is None:
+        with _registry_lock:
+            engine = _engines.get(url)
+            if engine is None:
+                engine = create_engine(
+                    url,
+                    poolclass=InstrumentedQueuePool,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                )
+                engine.pool.metrics = PoolMetrics()
+                _engines[url] = engine
+    return engine
+
+
+def get_session_factory(database_url: Optional[str] = None) -> sessionmaker:
+    """Get the sessionmaker bound to ``models.Base`` for the given database."""
+    url = database_url or DATABASE_URL
+    factory = _session_factories.get(url)
+    if factory is None:
+        engine = get_engine(url)
+        with _registry_lock:
+            factory = _session_factories.get(url)
+            if factory is None:
+                factory = sessionmaker(bind=engine, binds={Base: engine}, expire_on_commit=False)
+                _session_factories[url] = factory
+    return factory
+
+
+def _session_scope_key():
+    """Scope sessions per thread, and per asyncio task when one is running."""
     try:
-        client = get_supabase_client()
-        
-        with open(schema_file, 'r') as f:
-            schema_sql = f.read()
-        
-        # Split into individual statements
-        statements = [s.strip() for s in schema_sql.split(';') if s.strip()]
-        
-        for statement in statements:
-            if statement and not statement.startswith('--'):
-                # Execute each statement
-                client.postgrest.rpc('exec_sql', {'query': statement}).execute()
-        
-        print("Schema executed successfully!")
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is None:
+        return threading.get_ident(), None
+    token = _task_tokens.get(task)
+    if token is None:
+        with _task_tokens_lock:
+            token = _task_tokens.setdefault(task, next(_task_token_counter))
+    return threading.get_ident(), token
+
+
+def get_scoped_session(database_url: Optional[str] = None) -> scoped_session:
+    """
+    Get the scoped session registry for the given database.
+    Call ``.remove()`` at the end of each request/task to release the session.
+    """
+    url = database_url or DATABASE_URL
+    registry = _scoped_sessions.get(url)
+    if registry is None:
+        factory = get_session_factory(url)
+        with _registry_lock:
+            registry = _scoped_sessions.get(url)
+            if registry is None:
+                registry = scoped_session(factory, scopefunc=_session_scope_key)
+                _scoped_sessions[url] = registry
+    return registry
+
+
+@contextmanager
+def session_scope(database_url: Optional[str] = None) -> Iterator[Session]:
+    """Provide a transactional scope: commit on success, rollback on error."""
+    session = get_session_factory(database_url)()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def get_pool_metrics(database_url: Optional[str] = None) -> dict:
+    """Return pool occupancy and checkout/wait metrics for the given database."""
+    engine = get_engine(database_url)
+    pool = engine.pool
+    metrics = pool.metrics.snapshot() if pool.metrics is not None else {}
+    metrics.update({
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    })
+    return metrics
+
+
+def dispose_engines(close: bool = True):
+    """
+    Dispose every pooled engine. Use ``close=False`` in a forked child so the
+    parent's connections are not closed from under it.
+
+    Scoped sessions of every thread and task are dropped as well (closed
+    first unless ``close=False``), not just the caller's.
+    """
+    with _registry_lock:
+        for registry in _scoped_sessions.values():
+            sessions = registry.registry.registry
+            if close:
+                for session in list(sessions.values()):
+                    session.close()
+            sessions.clear()
+        for engine in _engines.values():
+            engine.dispose(close=close)
+
+
+# ============================================================================
+# Operations
+# ============================================================================
+def execute_schema(schema_file: str = "schema.sql", dry_run: bool = False, baseline: bool = False) -> bool:
+    """
+    Apply new or changed statements from the schema SQL file.
+    Uses the pooled engine when DATABASE_URL is set, otherwise the Supabase
+    ``exec_sql`` RPC (this requires the service role key for DDL operations).
+    With ``dry_run`` the pending statements and model drift are only printed.
+    With ``baseline`` an already-deployed database is marked as up to date
+    without running anything (requires DATABASE_URL).
+    """
+    import migrations
+
+    try:
+        if dry_run:
+            plan = migrations.plan_schema(schema_file)
+        elif baseline:
+            plan = migrations.baseline_schema(schema_file)
+            print(f"Recorded {len(plan.pending)} statement(s) as applied")
+            return True
+        elif DATABASE_URL:
+            plan = migrations.apply_schema(schema_file)
+        else:
+            plan = migrations.apply_schema_supabase(schema_file)
+
+        print(plan.summary())
+        if not dry_run:
+            print("Schema executed successfully!")
         return True
-        
+
     except Exception as e:
         print(f"Error executing schema: {e}")
         return False
 
 
 def verify_table_exists(table_name: str = "abogados") -> bool:
-    """Verify that the table exists in the database."""
+    """
+    Verify that the table exists in the database.
+    Uses the pooled engine when DATABASE_URL is set, otherwise Supabase.
+    """
     try:
-        client = get_supabase_client()
-        # Try to select from the table
-        result = client.table(table_name).select("id").limit(1).execute()
+        if DATABASE_URL:
+            if not inspect(get_engine()).has_table(table_name):
+                raise LookupError("table not found")
+        else:
+            client = get_supabase_client()
+            # Try to select from the table
+            client.table(table_name).select("id").limit(1).execute()
         print(f"Table '{table_name}' exists and is accessible.")
         return True
     except Exception as e:
@@ -59,11 +314,15 @@ def verify_table_exists(table_name: str = "abogados") -> bool:
 
 if __name__ == "__main__":
     import sys
-    
+
     if len(sys.argv) > 1:
         if sys.argv[1] == "verify":
             verify_table_exists()
         elif sys.argv[1] == "deploy":
             execute_schema()
+        elif sys.argv[1] == "plan":
+            execute_schema(dry_run=True)
+        elif sys.argv[1] == "baseline":
+            execute_schema(baseline=True)
     else:
-        print("Usage: python database.py [verify|deploy]")
+        print("Usage: python database.py [verify|deploy|plan|baseline]")
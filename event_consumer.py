@@ -0,0 +1,240 @@
+"""
+Claim-based consumer framework for unprocessed ``event_log_legal`` rows.
+
+Workers claim batches with ``FOR UPDATE SKIP LOCKED`` (backed by the partial
+index on unprocessed events), so any number of threads and nodes can share
+the backlog without processing an event twice. Events are routed to handlers
+by ``event_category`` and acknowledged in bulk (``processed``/``processed_at``)
+in the same transaction as the claim.
+
+Failed events stay unprocessed with ``process_attempts`` incremented and the
+``last_error`` recorded; after ``max_attempts`` they are no longer claimed
+(dead letters) so they cannot starve the rest of the backlog.
+``retry_dead_letters`` puts them back in the queue once the cause is fixed.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+import database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Handlers receive every claimed event of their category and return the ids
+# that failed (or None when all succeeded). Failed events stay unprocessed
+# and are retried up to ``max_attempts`` times.
+EventHandler = Callable[[List[dict]], Optional[Iterable]]
+
+CLAIM_SQL = text("""
+SELECT id, actor_id, actor_type, organizacion_id, event_type, event_category,
+       resource_type, resource_id, payload, source, resultado, event_timestamp, metadata,
+       process_attempts
+FROM event_log_legal
+WHERE processed = FALSE AND process_attempts < :max_attempts
+ORDER BY event_timestamp
+LIMIT :limit
+FOR UPDATE SKIP LOCKED
+""")
+
+# The timestamp range lets the updates skip partitions outside the batch
+ACK_SQL = text("""
+UPDATE event_log_legal SET processed = TRUE, processed_at = :processed_at
+WHERE id = ANY(:ids) AND event_timestamp BETWEEN :min_ts AND :max_ts
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+FAIL_SQL = text("""
+UPDATE event_log_legal SET process_attempts = process_attempts + 1, last_error = :error
+WHERE id = ANY(:ids) AND event_timestamp BETWEEN :min_ts AND :max_ts
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+BACKLOG_SQL = text("""
+SELECT COUNT(*) FILTER (WHERE process_attempts < :max_attempts),
+       MIN(event_timestamp) FILTER (WHERE process_attempts < :max_attempts),
+       COUNT(*) FILTER (WHERE process_attempts >= :max_attempts)
+FROM event_log_legal WHERE processed = FALSE
+""")
+
+RETRY_DEAD_SQL = text("""
+UPDATE event_log_legal SET process_attempts = 0
+WHERE processed = FALSE AND process_attempts >= :max_attempts
+""")
+
+
+class ConsumerMetrics:
+    """Thread-safe throughput and lag counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.batches = 0
+        self.claimed = 0
+        self.processed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self.unhandled = 0
+        self.last_lag_s = 0.0
+        self.by_category: Dict[str, int] = defaultdict(int)
+
+    def record(self, claimed: int, processed: int, failed: int, dead_lettered: int, unhandled: int,
+               lag_s: float, by_category: Dict[str, int]):
+        with self._lock:
+            self.batches += 1
+            self.claimed += claimed
+            self.processed += processed
+            self.failed += failed
+            self.dead_lettered += dead_lettered
+            self.unhandled += unhandled
+            self.last_lag_s = lag_s
+            for category, count in by_category.items():
+                self.by_category[category] += count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                'batches': self.batches,
+                'claimed': self.claimed,
+                'processed': self.processed,
+                'failed': self.failed,
+                'dead_lettered': self.dead_lettered,
+                'unhandled': self.unhandled,
+                'events_per_second': round(self.processed / elapsed, 2) if elapsed else 0.0,
+                'last_lag_s': round(self.last_lag_s, 3),
+                'by_category': dict(self.by_category),
+            }
+
+
+class EventConsumer:
+    """Routes claimed events to per-category handlers."""
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, ack_unhandled: bool = True,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, database_url: Optional[str] = None):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.ack_unhandled = ack_unhandled
+        self.database_url = database_url
+        self.handlers: Dict[str, EventHandler] = {}
+        self.metrics = ConsumerMetrics()
+
+    def register(self, category: str, handler: EventHandler):
+        """Route events of ``category`` ('*' for any category without a handler)."""
+        self.handlers[category] = handler
+
+    def handler(self, category: str):
+        """Decorator form of ``register``."""
+        def decorator(func: EventHandler) -> EventHandler:
+            self.register(category, func)
+            return func
+        return decorator
+
+    def run_once(self) -> int:
+        """Claim, handle and acknowledge one batch. Returns the number claimed."""
+        engine = database.get_engine(self.database_url)
+        with engine.begin() as conn:
+            events = [dict(row) for row in conn.execute(
+                CLAIM_SQL, {"limit": self.batch_size, "max_attempts": self.max_attempts}).mappings()]
+            if not events:
+                return 0
+            span = {"min_ts": min(e['event_timestamp'] for e in events),
+                    "max_ts": max(e['event_timestamp'] for e in events)}
+
+            groups: Dict[str, List[dict]] = defaultdict(list)
+            for event in events:
+                groups[event['event_category'] or 'general'].append(event)
+
+            ack, unhandled = [], 0
+            failures: Dict[str, List] = defaultdict(list)
+            by_category = {}
+            for category, group in groups.items():
+                handler = self.handlers.get(category) or self.handlers.get('*')
+                if handler is None:
+                    unhandled += len(group)
+                    if self.ack_unhandled:
+                        ack.extend(e['id'] for e in group)
+                    continue
+                error = f"{category} handler reported failure"
+                try:
+                    failed_ids = set(handler(group) or ())
+                except Exception as exc:
+                    logger.exception("Handler for %r failed on %d events", category, len(group))
+                    failed_ids = {e['id'] for e in group}
+                    error = f"{category} handler raised {type(exc).__name__}: {exc}"[:1000]
+                ack.extend(e['id'] for e in group if e['id'] not in failed_ids)
+                if failed_ids:
+                    failures[error].extend(failed_ids)
+                by_category[category] = len(group) - len(failed_ids)
+
+            now = datetime.now(timezone.utc)
+            if ack:
+                conn.execute(ACK_SQL, dict(span, ids=ack, processed_at=now))
+            for error, ids in failures.items():
+                conn.execute(FAIL_SQL, dict(span, ids=ids, error=error))
+
+        failed = sum(len(ids) for ids in failures.values())
+        attempts = {e['id']: e['process_attempts'] for e in events}
+        dead = sum(1 for ids in failures.values() for i in ids if attempts.get(i, 0) + 1 >= self.max_attempts)
+        if dead:
+            logger.warning("%d event(s) reached %d failed attempts and were dead-lettered", dead, self.max_attempts)
+
+        timestamps = [e['event_timestamp'] for e in events if e['event_timestamp'] is not None]
+        lag = (now - min(timestamps)).total_seconds() if timestamps else 0.0
+        self.metrics.record(len(events), sum(by_category.values()), failed, dead, unhandled, lag, by_category)
+        return len(events)
+
+    def backlog(self) -> dict:
+        """Claimable event count, age of the oldest one, and dead-lettered count."""
+        with database.get_engine(self.database_url).connect() as conn:
+            count, oldest, dead = conn.execute(BACKLOG_SQL, {"max_attempts": self.max_attempts}).first()
+        age = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest is not None else 0.0
+        return {'unprocessed': count, 'oldest_age_s': round(age, 3), 'dead_letters': dead}
+
+    def retry_dead_letters(self) -> int:
+        """Make dead-lettered events claimable again; returns how many."""
+        with database.get_engine(self.database_url).begin() as conn:
+            return conn.execute(RETRY_DEAD_SQL, {"max_attempts": self.max_attempts}).rowcount
+
+
+class ConsumerPool:
+    """Runs ``run_once`` in a loop on several threads until stopped."""
+
+    def __init__(self, consumer: EventConsumer, workers: int = 4,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.consumer = consumer
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.consumer.run_once()
+            except Exception:
+                logger.exception("Event consumer batch failed")
+                claimed = 0
+            # Keep draining while batches come back full; back off when idle
+            if claimed < self.consumer.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'event-consumer-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = 30.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
@@ -0,0 +1,378 @@
+"""
+Buffered, asynchronous writer for ``event_log_legal``.
+
+``emit_event`` only enqueues: a background flusher writes events in multi-row
+inserts whenever ``batch_size`` events are waiting or ``flush_interval``
+seconds have passed. When the bounded queue is full, callers block for up to
+``put_timeout`` seconds (backpressure); what happens after that is set by
+``overflow``: ``'block'`` (default) drops the event and counts it in
+``dropped``, ``'raise'`` raises ``EventQueueFull``. ``'drop'`` opts out of
+backpressure and discards the event without waiting.
+
+Failed writes are retried with backoff up to ``max_attempts`` times. Events
+the database rejects outright (CHECK or foreign-key violations, bad values)
+are isolated by splitting the batch, logged and counted in ``invalid``; the
+rest of the batch is still written.
+
+Each flush links its events into the log's SHA-256 integrity chain:
+``integrity_hash = sha256(previous_hash + canonical_event)`` in ``chain_seq``
+order. Flushes take an advisory lock so writers in different processes extend
+the same chain without interleaving, and draw ``chain_seq`` values from a
+sequence while holding it, so chain order is commit order. ``event_timestamp``
+is never changed: an event flushed late keeps the time it was emitted.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Iterable, List, Mapping, Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import DataError, IntegrityError
+
+import database
+from models import EventLogLegal
+
+logger = logging.getLogger(__name__)
+
+GENESIS_HASH = '0' * 64
+# Arbitrary constant used with pg_advisory_xact_lock to serialize chain writers
+CHAIN_LOCK_KEY = 74_219_002
+
+# Fields covered by integrity_hash (order irrelevant: keys are sorted)
+HASH_FIELDS = (
+    'id', 'actor_id', 'actor_type', 'organizacion_id', 'event_type', 'event_category',
+    'resource_type', 'resource_id', 'payload', 'source', 'resultado', 'error_message',
+    'event_timestamp',
+)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_PUT_TIMEOUT = 1.0
+# Attempts per batch on transient errors (backoff 0.1s doubling up to 5s, ~30s in all)
+DEFAULT_MAX_ATTEMPTS = 10
+OVERFLOW_POLICIES = ('drop', 'block', 'raise')
+
+CHAIN_TAIL_SQL = text("""
+SELECT integrity_hash FROM event_log_legal
+WHERE chain_seq IS NOT NULL
+ORDER BY chain_seq DESC
+LIMIT 1
+""")
+
+# Once every chained event has been archived, the chain continues from the last anchor
+ANCHOR_TAIL_SQL = text("""
+SELECT integrity_hash FROM event_log_integrity_checkpoints
+WHERE archived = TRUE
+ORDER BY chain_seq DESC NULLS LAST, event_timestamp DESC, event_id DESC
+LIMIT 1
+""")
+
+NEXT_CHAIN_SEQ_SQL = text("SELECT nextval('event_log_legal_chain_seq') FROM generate_series(1, :n)")
+
+
+class EventQueueFull(RuntimeError):
+    """Raised with ``overflow='raise'`` when the queue stays full for longer than ``put_timeout``."""
+
+
+# ============================================================================
+# Integrity chain
+# ============================================================================
+def _canonical_value(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat()
+    return value
+
+
+def canonical_event(event: Mapping) -> str:
+    """Stable JSON serialization of the hashed fields of an event."""
+    return json.dumps(
+        {key: _canonical_value(event.get(key)) for key in HASH_FIELDS},
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str,
+    )
+
+
+def compute_integrity_hash(prev_hash: str, event: Mapping) -> str:
+    """SHA-256 link of ``event`` onto the chain ending in ``prev_hash``."""
+    return hashlib.sha256((prev_hash + canonical_event(event)).encode('utf-8')).hexdigest()
+
+
+def chain_events(prev_hash: str, events: Iterable[dict]) -> str:
+    """Set ``integrity_hash`` on each event in order; return the new chain tail."""
+    for event in events:
+        prev_hash = compute_integrity_hash(prev_hash, event)
+        event['integrity_hash'] = prev_hash
+    return prev_hash
+
+
+# ============================================================================
+# Writer
+# ============================================================================
+class EventWriter:
+    """Bounded in-process queue plus a background flusher thread."""
+
+    def __init__(self, database_url: Optional[str] = None, max_queue: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 put_timeout: float = DEFAULT_PUT_TIMEOUT, overflow: str = 'block',
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.database_url = database_url
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        # Guards ``_closing`` and ``_emitting`` so close() drains after the last put
+        self._state = threading.Condition()
+        self._closing = False
+        self._emitting = 0
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.flushes = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._state:
+                self._closing = False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+            self._thread.start()
+
+    def emit(self, event_type: str, event_category: str = 'general', actor_id=None,
+             actor_type: str = 'lawyer', organizacion_id=None, resource_type: Optional[str] = None,
+             resource_id=None, payload: Optional[dict] = None, source: str = 'api',
+             ip_address: Optional[str] = None, user_agent: Optional[str] = None,
+             resultado: str = 'success', error_message: Optional[str] = None,
+             metadata: Optional[dict] = None) -> uuid.UUID:
+        """
+        Queue an event and return its id. A full queue is handled according
+        to ``overflow``; emitting after ``close`` has started raises
+        ``RuntimeError``.
+        """
+        event = {
+            'id': uuid.uuid4(),
+            'actor_id': actor_id,
+            'actor_type': actor_type,
+            'organizacion_id': organizacion_id,
+            'event_type': event_type,
+            'event_category': event_category,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'payload': payload or {},
+            'source': source,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'resultado': resultado,
+            'error_message': error_message,
+            'event_timestamp': datetime.now(timezone.utc),
+            'metadata': metadata or {},
+        }
+        with self._state:
+            if self._closing:
+                raise RuntimeError("EventWriter is closed")
+            self._emitting += 1
+        try:
+            self._put(event)
+        finally:
+            with self._state:
+                self._emitting -= 1
+                if not self._emitting:
+                    self._state.notify_all()
+        return event['id']
+
+    def _put(self, event: dict):
+        try:
+            if self.overflow == 'drop':
+                self._queue.put_nowait(event)
+            else:
+                self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            if self.overflow == 'raise':
+                self.rejected += 1
+                raise EventQueueFull(f"event queue full ({self._queue.maxsize} events)")
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning("Event queue full (%d events); %d events dropped so far",
+                               self._queue.maxsize, self.dropped)
+
+    # ------------------------------------------------------------------
+    # Flusher side
+    # ------------------------------------------------------------------
+    def _take_batch(self, first_wait: float) -> List[dict]:
+        try:
+            batch = [self._queue.get(timeout=first_wait)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[dict]):
+        engine = database.get_engine(self.database_url)
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHAIN_LOCK_KEY})
+            prev_hash = (conn.execute(CHAIN_TAIL_SQL).scalar()
+                         or conn.execute(ANCHOR_TAIL_SQL).scalar()
+                         or GENESIS_HASH)
+            seqs = sorted(row[0] for row in conn.execute(NEXT_CHAIN_SEQ_SQL, {"n": len(batch)}))
+            batch.sort(key=lambda e: (e['event_timestamp'], e['id']))
+            for event, seq in zip(batch, seqs):
+                event['chain_seq'] = seq
+            chain_events(prev_hash, batch)
+            conn.execute(insert(EventLogLegal.__table__), batch)
+        self.written += len(batch)
+        self.flushes += 1
+
+    def _write_with_retry(self, batch: List[dict]):
+        """
+        Write ``batch``, retrying transient errors up to ``max_attempts``
+        times. Rows the database rejects (constraint or type errors) are not
+        retried: the batch is split to isolate them and the rest is written.
+        """
+        delay = 0.1
+        attempt = 1
+        while True:
+            try:
+                with self._flush_lock:
+                    self._write(batch)
+                return
+            except (IntegrityError, DataError) as exc:
+                self._isolate_invalid(batch, exc)
+                return
+            except Exception:
+                if attempt >= self.max_attempts:
+                    raise
+                logger.exception("Event flush of %d events failed (attempt %d/%d); retrying in %.1fs",
+                                 len(batch), attempt, self.max_attempts, delay)
+                if self._stop.is_set():
+                    # Draining in close(): _stop.wait would return at once
+                    time.sleep(delay)
+                else:
+                    self._stop.wait(delay)
+                attempt += 1
+                delay = min(delay * 2, 5.0)
+
+    def _isolate_invalid(self, batch: List[dict], exc: Exception):
+        if len(batch) == 1:
+            self.invalid += 1
+            logger.error("Event rejected by the database and not written: %s; event: %s",
+                         getattr(exc, 'orig', exc), canonical_event(batch[0]))
+            return
+        middle = len(batch) // 2
+        self._write_with_retry(batch[:middle])
+        self._write_with_retry(batch[middle:])
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(first_wait=self.flush_interval)
+            if batch:
+                try:
+                    self._write_with_retry(batch)
+                except Exception:
+                    self.failed += len(batch)
+                    logger.exception("Dropping %d events after %d failed attempts", len(batch), self.max_attempts)
+
+    def flush(self):
+        """
+        Synchronously write everything currently queued. If a batch still
+        fails after ``max_attempts`` the error is raised; during ``close`` the
+        database is then taken to be down and the rest of the queue is
+        counted as failed rather than retried batch after batch.
+        """
+        while True:
+            batch = self._take_batch(first_wait=0)
+            if not batch:
+                return
+            try:
+                self._write_with_retry(batch)
+            except Exception:
+                lost = len(batch)
+                while self._stop.is_set():
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    lost += 1
+                self.failed += lost
+                logger.error("Event flush gave up; %d events not written", lost)
+                raise
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Stop accepting events, let the flusher finish, then drain the queue."""
+        with self._state:
+            self._closing = True
+            # Emits already past the check finish their put before the drain
+            self._state.wait_for(lambda: not self._emitting, timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'flushes': self.flushes,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'invalid': self.invalid,
+            'failed': self.failed,
+        }
+
+
+_default_writer: Optional[EventWriter] = None
+_default_lock = threading.Lock()
+
+
+def _close_at_exit(writer: EventWriter):
+    try:
+        writer.close()
+    except Exception:
+        logger.exception("Event writer could not drain at exit")
+
+
+def get_event_writer() -> EventWriter:
+    """Process-wide writer, started on first use and drained at exit."""
+    global _default_writer
+    if _default_writer is None:
+        with _default_lock:
+            if _default_writer is None:
+                writer = EventWriter()
+                writer.start()
+                atexit.register(_close_at_exit, writer)
+                _default_writer = writer
+    return _default_writer
+
+
+def emit_event(event_type: str, **fields) -> uuid.UUID:
+    """Queue an event on the process-wide writer (see ``EventWriter.emit``)."""
+    return get_event_writer().emit(event_type, **fields)
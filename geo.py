@@ -0,0 +1,186 @@
+"""
+Geospatial nearest-lawyer search for SOAT Connect Lawyer Registry.
+
+Verified lawyers (``abogados``) and verified firms (``organizaciones_legales``)
+with ``latitud``/``longitud`` are bucketed into a fixed lat/lon grid. A query
+only visits the cells within the search radius (rings expand outward until
+enough results are found) and ranks candidates by haversine distance.
+"""
+import heapq
+import math
+import threading
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+import database
+
+EARTH_RADIUS_KM = 6371.0088
+# Great-circle km per degree of arc (~111.195), rounded down so distance bounds never overstate
+KM_PER_DEGREE = math.floor(math.radians(1) * EARTH_RADIUS_KM * 1000) / 1000
+# Cell edge in degrees (~11 km of latitude)
+DEFAULT_CELL_DEG = 0.1
+
+LAWYERS_SQL = """
+SELECT id, 'abogado' AS kind, latitud, longitud, especialidades
+FROM abogados
+WHERE estado_verificacion = 'verificado' AND activo = TRUE
+  AND latitud IS NOT NULL AND longitud IS NOT NULL
+"""
+
+FIRMS_SQL = """
+SELECT id, 'organizacion' AS kind, latitud, longitud, especialidades_principales AS especialidades
+FROM organizaciones_legales
+WHERE verificado = TRUE AND estado = 'activo'
+  AND latitud IS NOT NULL AND longitud IS NOT NULL
+"""
+
+
+class NearbyResult(NamedTuple):
+    """One result of a nearest search."""
+    id: object
+    kind: str
+    distancia_km: float
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in kilometres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """Grid-bucketed spatial index over lawyer and firm locations."""
+
+    def __init__(self, cell_deg: float = DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._ids: List[object] = []
+        self._kinds: List[str] = []
+        # Radians and cosine are precomputed once per point
+        self._lat_rad = array('d')
+        self._lon_rad = array('d')
+        self._cos_lat = array('d')
+        self._especialidades: List[frozenset] = []
+        self._cells: Dict[Tuple[int, int], array] = defaultdict(lambda: array('l'))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def build(self, rows: Iterable):
+        """Replace the index contents with rows of (id, kind, latitud, longitud, especialidades)."""
+        with self._lock:
+            self._reset()
+            for row in rows:
+                lat, lon = float(row['latitud']), float(row['longitud'])
+                pos = len(self._ids)
+                self._ids.append(row['id'])
+                self._kinds.append(row['kind'])
+                self._lat_rad.append(math.radians(lat))
+                self._lon_rad.append(math.radians(lon))
+                self._cos_lat.append(math.cos(math.radians(lat)))
+                self._especialidades.append(frozenset(e.strip().casefold() for e in (row['especialidades'] or ()) if e))
+                self._cells[self._cell(lat, lon)].append(pos)
+
+    def load(self, include_firms: bool = True, database_url: Optional[str] = None):
+        """Load verified lawyer (and optionally firm) locations from the database."""
+        with database.get_engine(database_url).connect() as conn:
+            rows = list(conn.execute(text(LAWYERS_SQL)).mappings())
+            if include_firms:
+                rows.extend(conn.execute(text(FIRMS_SQL)).mappings())
+        self.build(rows)
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+    def _ring(self, ci: int, cj: int, r: int):
+        """Cells at Chebyshev distance exactly ``r`` from (ci, cj)."""
+        if r == 0:
+            yield ci, cj
+            return
+        for dj in range(-r, r + 1):
+            yield ci - r, cj + dj
+            yield ci + r, cj + dj
+        for di in range(-r + 1, r):
+            yield ci + di, cj - r
+            yield ci + di, cj + r
+
+    def _ring_min_km(self, lat: float, r: int) -> float:
+        """Lower bound on the distance from the query to any cell in ring ``r + 1``."""
+        lat_km = r * self.cell_deg * KM_PER_DEGREE
+        # Chord across r cells of longitude at the highest latitude the ring reaches;
+        # shorter than the arc along the parallel
+        cos_max = max(math.cos(math.radians(min(abs(lat) + (r + 1) * self.cell_deg, 90.0))), 0.0)
+        half_lon = math.radians(min(r * self.cell_deg, 180.0)) / 2
+        lon_km = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_max * math.sin(half_lon)))
+        return min(lat_km, lon_km)
+
+    def nearest(self, latitud: float, longitud: float, n: int = 10, radio_km: float = 50.0,
+                especialidad: Optional[str] = None, kind: Optional[str] = None) -> List[NearbyResult]:
+        """
+        Nearest ``n`` verified lawyers/firms within ``radio_km`` of the point,
+        optionally filtered by especialidad and kind ('abogado' or 'organizacion').
+        """
+        if n <= 0:
+            return []
+        wanted = especialidad.strip().casefold() if especialidad else None
+        lat_r, lon_r = math.radians(latitud), math.radians(longitud)
+        cos_q = math.cos(lat_r)
+        ci, cj = self._cell(latitud, longitud)
+        max_rings = int(radio_km / (self.cell_deg * KM_PER_DEGREE * max(cos_q, 0.01))) + 1
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-dist, pos)
+        with self._lock:
+            lat_a, lon_a, cos_a = self._lat_rad, self._lon_rad, self._cos_lat
+            cells = self._cells
+            for r in range(max_rings + 1):
+                for cell in self._ring(ci, cj, r):
+                    bucket = cells.get(cell)
+                    if not bucket:
+                        continue
+                    for pos in bucket:
+                        if kind and self._kinds[pos] != kind:
+                            continue
+                        if wanted and wanted not in self._especialidades[pos]:
+                            continue
+                        a = (math.sin((lat_a[pos] - lat_r) / 2) ** 2
+                             + cos_q * cos_a[pos] * math.sin((lon_a[pos] - lon_r) / 2) ** 2)
+                        dist = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+                        if dist > radio_km:
+                            continue
+                        if len(best) < n:
+                            heapq.heappush(best, (-dist, pos))
+                        elif dist < -best[0][0]:
+                            heapq.heapreplace(best, (-dist, pos))
+                # Stop once the next ring cannot contain anything closer
+                bound = self._ring_min_km(latitud, r)
+                if bound > radio_km or (len(best) == n and bound > -best[0][0]):
+                    break
+            results = sorted((-d, pos) for d, pos in best)
+            return [NearbyResult(self._ids[pos], self._kinds[pos], round(d, 3)) for d, pos in results]
+
+    def nearest_bulk(self, points: Sequence[Tuple[float, float]], n: int = 10, radio_km: float = 50.0,
+                     especialidad: Optional[str] = None, kind: Optional[str] = None) -> List[List[NearbyResult]]:
+        """
+        Nearest search for many points at once (e.g. thousands of accident
+        locations). Points sharing a grid cell are answered together so the
+        lock is taken once and nearby queries reuse warm buckets.
+        """
+        order = sorted(range(len(points)), key=lambda i: self._cell(*points[i]))
+        results: List[List[NearbyResult]] = [[] for _ in points]
+        with self._lock:
+            for i in order:
+                lat, lon = points[i]
+                results[i] = self.nearest(lat, lon, n=n, radio_km=radio_km, especialidad=especialidad, kind=kind)
+        return results
@@ -0,0 +1,359 @@
+"""
+Streaming bulk importer for lawyer and firm registrations.
+
+Reads CSV or JSONL one record at a time, coerces values to the column types in
+``models.py``, checks every ``CheckConstraint`` declared on the model (compiled
+to Python once), drops duplicates on the model's unique keys with in-memory
+hash sets, and inserts valid rows in multi-row batches. A failing batch is
+split in halves until the offending rows are isolated, so one bad row does not
+cost the rest of its batch.
+"""
+import csv
+import gzip
+import io
+import json
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from sqlalchemy import ARRAY, Boolean, CheckConstraint, Date, Integer, Numeric, String, insert, select
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP, UUID
+
+import database
+from models import Abogado, OrganizacionLegal
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+IMPORTABLE_MODELS = {
+    'abogados': Abogado,
+    'organizaciones_legales': OrganizacionLegal,
+}
+
+_TRUE = {'true', 't', '1', 'si', 'sí', 'yes', 'y'}
+_FALSE = {'false', 'f', '0', 'no', 'n'}
+
+
+class ImportValidationError(ValueError):
+    """A record failed type coercion or a model constraint."""
+
+
+@dataclass
+class ImportReport:
+    """Outcome of one import run."""
+    table: str
+    read: int = 0
+    valid: int = 0
+    invalid: int = 0
+    duplicates: int = 0
+    inserted: int = 0
+    failed: int = 0
+    batches: int = 0
+    elapsed_s: float = 0.0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    def error(self, line: int, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed_s if self.elapsed_s else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.table}: read={self.read} valid={self.valid} invalid={self.invalid} "
+            f"duplicates={self.duplicates} inserted={self.inserted} failed={self.failed} "
+            f"batches={self.batches} elapsed={self.elapsed_s:.2f}s "
+            f"throughput={self.rows_per_second:.0f} rows/s"
+        )
+
+
+# ============================================================================
+# Reading
+# ============================================================================
+def _open_text(path: str) -> io.TextIOBase:
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def iter_records(path: str) -> Iterator[Tuple[int, Union[dict, ImportValidationError]]]:
+    """
+    Yield (line_number, record) from a CSV or JSONL file (optionally gzipped).
+    A JSONL line that is not a JSON object yields an ``ImportValidationError``
+    in place of the record, so the caller can count it and keep going.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    is_jsonl = name.endswith(('.jsonl', '.ndjson'))
+    with _open_text(path) as f:
+        if is_jsonl:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, ImportValidationError(f"malformed JSON: {e}")
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, ImportValidationError(f"expected a JSON object, got {type(record).__name__}")
+                    continue
+                yield line_no, record
+        else:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+
+
+# ============================================================================
+# Coercion and constraints
+# ============================================================================
+def _coerce(column, value):
+    """Convert a raw CSV/JSON value to the Python type for ``column``."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+    if value is None:
+        return None
+
+    col_type = column.type
+    if isinstance(col_type, ARRAY):
+        if isinstance(value, str):
+            value = json.loads(value) if value.startswith('[') else value.split('|')
+        return [str(v).strip() for v in value if str(v).strip()]
+    if isinstance(col_type, JSONB):
+        return json.loads(value) if isinstance(value, str) else value
+    if isinstance(col_type, UUID):
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    if isinstance(col_type, Boolean):
+        if isinstance(value, bool):
+            return value
+        lowered = str(value).lower()
+        if lowered in _TRUE:
+            return True
+        if lowered in _FALSE:
+            return False
+        raise ImportValidationError(f"{column.name}: not a boolean: {value!r}")
+    if isinstance(col_type, Integer):
+        return int(value)
+    if isinstance(col_type, Numeric):
+        return Decimal(str(value))
+    if isinstance(col_type, TIMESTAMP):
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if isinstance(col_type, Date):
+        return value if isinstance(value, date) else date.fromisoformat(str(value))
+    if isinstance(col_type, String):
+        value = str(value)
+        if col_type.length and len(value) > col_type.length:
+            raise ImportValidationError(f"{column.name}: longer than {col_type.length} characters")
+        return value
+    return value
+
+
+_IN_RE = re.compile(r"^(\w+) IN \((.*)\)$")
+_CMP_RE = re.compile(r"^(\w+) (>=|<=|>|<|=) (-?\d+(?:\.\d+)?)$")
+_OR_NULL_RE = re.compile(r"^(.*) OR (\w+) IS NULL$")
+_CMP_OPS = {
+    '>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b, '<': lambda a, b: a < b, '=': lambda a, b: a == b,
+}
+
+
+def _compile_term(term: str) -> Tuple[str, Callable]:
+    m = _IN_RE.match(term)
+    if m:
+        allowed = frozenset(v.strip().strip("'") for v in m.group(2).split(','))
+        return m.group(1), lambda v: v in allowed
+    m = _CMP_RE.match(term)
+    if m:
+        op, bound = _CMP_OPS[m.group(2)], Decimal(m.group(3))
+        return m.group(1), lambda v: op(v, bound)
+    raise ValueError(f"Unsupported check constraint term: {term!r}")
+
+
+def compile_check_constraints(model) -> List[Tuple[str, List[Tuple[str, Callable]]]]:
+    """
+    Compile the model's CheckConstraints to Python predicates.
+    Like SQL, a NULL operand passes. Raises ValueError for an expression
+    form the importer does not understand, so new constraints are not
+    silently ignored.
+    """
+    compiled = []
+    for constraint in model.__table__.constraints:
+        if not isinstance(constraint, CheckConstraint):
+            continue
+        expr = str(constraint.sqltext).strip()
+        m = _OR_NULL_RE.match(expr)
+        if m:
+            expr = m.group(1)
+        terms = [_compile_term(t.strip()) for t in expr.split(' AND ')]
+        compiled.append((constraint.name, terms))
+    return compiled
+
+
+class RecordValidator:
+    """Coerces and validates raw records for one model."""
+
+    def __init__(self, model):
+        self.model = model
+        self.table = model.__table__
+        self.checks = compile_check_constraints(model)
+        self.required = [
+            c.name for c in self.table.columns
+            if not c.nullable and c.default is None and c.server_default is None and not c.primary_key
+        ]
+
+    def __call__(self, record: dict) -> dict:
+        row = {}
+        for key, value in record.items():
+            column = self.table.columns.get(key)
+            if column is None:
+                continue
+            try:
+                row[key] = _coerce(column, value)
+            except ImportValidationError:
+                raise
+            except (ValueError, TypeError, InvalidOperation) as e:
+                raise ImportValidationError(f"{key}: {e}")
+        missing = [name for name in self.required if row.get(name) is None]
+        if missing:
+            raise ImportValidationError(f"missing required field(s): {', '.join(missing)}")
+        for name, terms in self.checks:
+            for column_name, predicate in terms:
+                value = row.get(column_name)
+                if value is not None and not predicate(value):
+                    raise ImportValidationError(f"violates {name} ({column_name}={value!r})")
+        # Drop explicit NULLs so column defaults still apply
+        return {k: v for k, v in row.items() if v is not None}
+
+
+# ============================================================================
+# Dedupe
+# ============================================================================
+class UniqueKeyIndex:
+    """Hash sets over the model's unique columns (email, tarjeta_profesional, nit, ...)."""
+
+    def __init__(self, model):
+        self.columns = [c for c in model.__table__.columns if c.unique]
+        self.seen: Dict[str, Set] = {c.name: set() for c in self.columns}
+
+    def preload(self, conn):
+        """Load keys that already exist in the database."""
+        for column in self.columns:
+            keys = self.seen[column.name]
+            result = conn.execution_options(stream_results=True, yield_per=10000).execute(
+                select(column).where(column.isnot(None))
+            )
+            keys.update(row[0] for row in result)
+
+    def duplicate_of(self, row: dict) -> Optional[str]:
+        for column in self.columns:
+            value = row.get(column.name)
+            if value is not None and value in self.seen[column.name]:
+                return column.name
+        return None
+
+    def add(self, row: dict):
+        for column in self.columns:
+            value = row.get(column.name)
+            if value is not None:
+                self.seen[column.name].add(value)
+
+
+# ============================================================================
+# Writing
+# ============================================================================
+def _insert_rows(conn, table, rows: List[dict]):
+    # executemany needs one key set per statement; group rows by their keys
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for group in groups.values():
+        conn.execute(insert(table), group)
+
+
+def _write_batch(engine, table, batch: List[Tuple[int, dict]], report: ImportReport):
+    """Insert a batch in its own transaction, bisecting on failure."""
+    try:
+        with engine.begin() as conn:
+            _insert_rows(conn, table, [row for _, row in batch])
+        report.inserted += len(batch)
+    except Exception as e:
+        if len(batch) == 1:
+            line, _ = batch[0]
+            report.failed += 1
+            report.error(line, f"insert failed: {str(e).splitlines()[0]}")
+            return
+        middle = len(batch) // 2
+        _write_batch(engine, table, batch[:middle], report)
+        _write_batch(engine, table, batch[middle:], report)
+
+
+def import_file(path: str, model=Abogado, batch_size: int = DEFAULT_BATCH_SIZE,
+                preload_existing: bool = True, dry_run: bool = False,
+                database_url: Optional[str] = None) -> ImportReport:
+    """
+    Stream ``path`` into ``model``'s table. Memory stays bounded by
+    ``batch_size`` plus the unique-key sets. With ``dry_run`` records are
+    validated and deduplicated but nothing is written.
+    """
+    table = model.__table__
+    report = ImportReport(table=table.name)
+    validator = RecordValidator(model)
+    keys = UniqueKeyIndex(model)
+    engine = None if dry_run else database.get_engine(database_url)
+
+    start = time.perf_counter()
+    if preload_existing and engine is not None:
+        with engine.connect() as conn:
+            keys.preload(conn)
+
+    batch: List[Tuple[int, dict]] = []
+    for line, record in iter_records(path):
+        report.read += 1
+        try:
+            if isinstance(record, ImportValidationError):
+                raise record
+            row = validator(record)
+        except ImportValidationError as e:
+            report.invalid += 1
+            report.error(line, str(e))
+            continue
+        duplicate = keys.duplicate_of(row)
+        if duplicate:
+            report.duplicates += 1
+            report.error(line, f"duplicate {duplicate}")
+            continue
+        keys.add(row)
+        report.valid += 1
+        if engine is None:
+            continue
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            _write_batch(engine, table, batch, report)
+            report.batches += 1
+            batch = []
+    if batch and engine is not None:
+        _write_batch(engine, table, batch, report)
+        report.batches += 1
+
+    report.elapsed_s = time.perf_counter() - start
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in IMPORTABLE_MODELS:
+        print(f"Usage: python importer.py [{'|'.join(IMPORTABLE_MODELS)}] <file.csv|file.jsonl> [--dry-run]")
+        sys.exit(1)
+
+    result = import_file(sys.argv[2], IMPORTABLE_MODELS[sys.argv[1]], dry_run='--dry-run' in sys.argv)
+    print(result.summary())
+    for line_no, message in result.errors[:20]:
+        print(f"  line {line_no}: {message}")
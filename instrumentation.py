@@ -0,0 +1,329 @@
+"""
+Query instrumentation and N+1 detection for the registry models.
+
+``install()`` attaches:
+
+- engine ``before/after_cursor_execute`` hooks that time every statement into
+  a latency histogram per (table, operation) and log statements slower than
+  ``slow_query_ms`` with their bound parameters redacted;
+- a session ``do_orm_execute`` hook that counts lazy relationship loads
+  (``Abogado.certificaciones``, ``SuscripcionLegal.plan``, ...) and flags a
+  relationship once it is lazy-loaded ``n_plus_one_threshold`` times within
+  one request.
+
+Per-request counts live in a context variable, so they are correct for
+threads and asyncio tasks alike:
+
+    with request_scope('GET /abogados') as stats:
+        render_directory()
+    stats.queries, stats.lazy_loads
+
+Aggregates are exported with ``export_prometheus()`` or ``export_json()``.
+"""
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(__name__ + '.slow')
+
+# Histogram bucket upper bounds, in milliseconds
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+DEFAULT_SLOW_QUERY_MS = 200.0
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_OPERATION_RE = re.compile(r"^\s*(?:WITH\b.*?\)\s*)?(SELECT|INSERT|UPDATE|DELETE|COPY)\b", re.I | re.S)
+_TABLE_RES = {
+    'INSERT': re.compile(r"\bINSERT\s+INTO\s+\"?(\w+)", re.I),
+    'UPDATE': re.compile(r"\bUPDATE\s+\"?(\w+)", re.I),
+    'DELETE': re.compile(r"\bDELETE\s+FROM\s+\"?(\w+)", re.I),
+    'COPY': re.compile(r"\bCOPY\s+\"?(\w+)", re.I),
+    'SELECT': re.compile(r"\bFROM\s+\"?(\w+)", re.I),
+}
+
+
+@lru_cache(maxsize=2048)
+def classify_statement(statement: str) -> Tuple[str, str]:
+    """(table, operation) for a SQL statement; 'other' when unknown."""
+    m = _OPERATION_RE.match(statement)
+    if not m:
+        word = statement.split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+        return 'other', word.lower()
+    operation = m.group(1).upper()
+    table = _TABLE_RES[operation].search(statement, m.start(1))
+    return (table.group(1) if table else 'other'), operation.lower()
+
+
+def redact_parameters(parameters) -> object:
+    """Replace bound values with their type names, keeping the shape."""
+    if isinstance(parameters, dict):
+        return {k: f"<{type(v).__name__}>" for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} rows"]
+        return [f"<{type(v).__name__}>" for v in parameters]
+    return '<redacted>' if parameters is not None else None
+
+
+# ============================================================================
+# Aggregates
+# ============================================================================
+class LatencyHistogram:
+    """Cumulative-style histogram over BUCKETS_MS (plus +Inf)."""
+
+    __slots__ = ('counts', 'total_ms', 'count', 'max_ms')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.count = 0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.count += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket bound containing quantile ``q`` (the max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        running = 0
+        for i, n in enumerate(self.counts):
+            running += n
+            if running >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+@dataclass
+class RequestStats:
+    """Counters for one request (see ``request_scope``)."""
+    name: str
+    queries: int = 0
+    total_ms: float = 0.0
+    lazy_loads: Counter = field(default_factory=Counter)
+    flagged: List[str] = field(default_factory=list)
+
+
+class QueryMetrics:
+    """Process-wide, thread-safe aggregates."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+            self.slow_queries = 0
+            self.lazy_loads: Counter = Counter()
+            self.n_plus_one: Counter = Counter()
+            self.requests = 0
+            self.request_queries = LatencyHistogram()
+
+    def observe(self, table: str, operation: str, ms: float, slow: bool):
+        with self._lock:
+            histogram = self.histograms.get((table, operation))
+            if histogram is None:
+                histogram = self.histograms[(table, operation)] = LatencyHistogram()
+            histogram.observe(ms)
+            if slow:
+                self.slow_queries += 1
+
+    def lazy_load(self, relationship: str):
+        with self._lock:
+            self.lazy_loads[relationship] += 1
+
+    def flag_n_plus_one(self, relationship: str):
+        with self._lock:
+            self.n_plus_one[relationship] += 1
+
+    def request_done(self, stats: RequestStats):
+        with self._lock:
+            self.requests += 1
+            # Query counts reuse the histogram type; buckets are counts, not ms
+            self.request_queries.observe(stats.queries)
+
+
+metrics = QueryMetrics()
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar('instrumentation_request', default=None)
+
+
+@contextmanager
+def request_scope(name: str = 'request') -> Iterator[RequestStats]:
+    """Collect per-request query counts and N+1 flags for the enclosed block."""
+    stats = RequestStats(name)
+    token = _current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_request.reset(token)
+        metrics.request_done(stats)
+        if stats.flagged:
+            logger.warning("N+1 in %s: %s (%d queries)", name, ', '.join(stats.flagged), stats.queries)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+# ============================================================================
+# Hooks
+# ============================================================================
+class Instrumentation:
+    """Event listeners for one engine target and one session target."""
+
+    def __init__(self, slow_query_ms: float = DEFAULT_SLOW_QUERY_MS,
+                 n_plus_one_threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instrumentation_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('instrumentation_start')
+        if not starts:
+            return
+        ms = (time.perf_counter() - starts.pop()) * 1000
+        table, operation = classify_statement(statement)
+        slow = ms >= self.slow_query_ms
+        metrics.observe(table, operation, ms, slow)
+        request = _current_request.get()
+        if request is not None:
+            request.queries += 1
+            request.total_ms += ms
+        if slow:
+            slow_logger.warning("Slow query (%.1f ms) %s.%s: %s params=%s", ms, table, operation,
+                                ' '.join(statement.split()), redact_parameters(parameters))
+
+    def handle_error(self, exception_context):
+        # Keep the timing stack balanced when a statement fails
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('instrumentation_start'):
+            conn.info['instrumentation_start'].pop()
+
+    def do_orm_execute(self, orm_execute_state):
+        if not orm_execute_state.is_relationship_load:
+            return
+        path = orm_execute_state.loader_strategy_path
+        prop = path[-1] if path is not None and len(path) else None
+        key = str(prop) if prop is not None else 'unknown'
+        metrics.lazy_load(key)
+        request = _current_request.get()
+        if request is None:
+            return
+        request.lazy_loads[key] += 1
+        if request.lazy_loads[key] == self.n_plus_one_threshold:
+            request.flagged.append(key)
+            metrics.flag_n_plus_one(key)
+
+
+_installed: Dict[int, Tuple[object, object, Instrumentation]] = {}
+
+
+def install(engine=Engine, session_target=Session, slow_query_ms: float = DEFAULT_SLOW_QUERY_MS,
+            n_plus_one_threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD) -> Instrumentation:
+    """
+    Instrument ``engine`` (an Engine, or the Engine class for all engines) and
+    ``session_target`` (a Session class, sessionmaker or session).
+    """
+    if id(engine) in _installed:
+        return _installed[id(engine)][2]
+    hooks = Instrumentation(slow_query_ms, n_plus_one_threshold)
+    event.listen(engine, 'before_cursor_execute', hooks.before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', hooks.after_cursor_execute)
+    event.listen(engine, 'handle_error', hooks.handle_error)
+    event.listen(session_target, 'do_orm_execute', hooks.do_orm_execute)
+    _installed[id(engine)] = (engine, session_target, hooks)
+    return hooks
+
+
+def uninstall(engine=Engine):
+    """Remove hooks installed by ``install`` for ``engine``."""
+    entry = _installed.pop(id(engine), None)
+    if entry is None:
+        return
+    _, session_target, hooks = entry
+    event.remove(engine, 'before_cursor_execute', hooks.before_cursor_execute)
+    event.remove(engine, 'after_cursor_execute', hooks.after_cursor_execute)
+    event.remove(engine, 'handle_error', hooks.handle_error)
+    event.remove(session_target, 'do_orm_execute', hooks.do_orm_execute)
+
+
+# ============================================================================
+# Export
+# ============================================================================
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def export_prometheus() -> str:
+    """Prometheus text exposition of the aggregates."""
+    lines = [
+        '# HELP db_query_duration_ms Statement latency by table and operation.',
+        '# TYPE db_query_duration_ms histogram',
+    ]
+    with metrics._lock:
+        for (table, operation), histogram in sorted(metrics.histograms.items()):
+            labels = f'table="{_label(table)}",operation="{operation}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS_MS, histogram.counts):
+                cumulative += n
+                lines.append(f'db_query_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'db_query_duration_ms_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'db_query_duration_ms_sum{{{labels}}} {histogram.total_ms:.3f}')
+            lines.append(f'db_query_duration_ms_count{{{labels}}} {histogram.count}')
+
+        lines += ['# HELP db_slow_queries_total Statements slower than the slow-query threshold.',
+                  '# TYPE db_slow_queries_total counter',
+                  f'db_slow_queries_total {metrics.slow_queries}',
+                  '# HELP orm_lazy_loads_total Lazy relationship loads.',
+                  '# TYPE orm_lazy_loads_total counter']
+        for relationship, n in sorted(metrics.lazy_loads.items()):
+            lines.append(f'orm_lazy_loads_total{{relationship="{_label(relationship)}"}} {n}')
+        lines += ['# HELP orm_n_plus_one_total Requests where a relationship was lazy-loaded repeatedly.',
+                  '# TYPE orm_n_plus_one_total counter']
+        for relationship, n in sorted(metrics.n_plus_one.items()):
+            lines.append(f'orm_n_plus_one_total{{relationship="{_label(relationship)}"}} {n}')
+        lines += ['# HELP db_requests_total Requests tracked with request_scope.',
+                  '# TYPE db_requests_total counter',
+                  f'db_requests_total {metrics.requests}']
+    return '\n'.join(lines) + '\n'
+
+
+def export_json() -> dict:
+    """The same aggregates as a JSON-serializable dict."""
+    with metrics._lock:
+        return {
+            'queries': [
+                {
+                    'table': table, 'operation': operation, 'count': h.count,
+                    'total_ms': round(h.total_ms, 3), 'max_ms': round(h.max_ms, 3),
+                    'p50_ms': h.quantile(0.5), 'p95_ms': h.quantile(0.95), 'p99_ms': h.quantile(0.99),
+                    'buckets': dict(zip([str(b) for b in BUCKETS_MS] + ['+Inf'], h.counts)),
+                }
+                for (table, operation), h in sorted(metrics.histograms.items())
+            ],
+            'slow_queries': metrics.slow_queries,
+            'lazy_loads': dict(metrics.lazy_loads),
+            'n_plus_one': dict(metrics.n_plus_one),
+            'requests': metrics.requests,
+            'queries_per_request_p95': metrics.request_queries.quantile(0.95),
+        }
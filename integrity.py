@@ -0,0 +1,259 @@
+"""
+Parallel integrity-chain verifier for ``event_log_legal``.
+
+The chain written by ``event_writer`` is split into segments of
+``segment_size`` events along ``chain_seq``. Each segment is streamed
+with keyset pagination and verified in a worker process: every event must
+hash, together with the stored hash of the event before it, to its own stored
+``integrity_hash``. Because each segment starts from the stored hash of the
+previous segment's last event, the segments stitch together without sharing
+state, and the first broken link is reported in chain order.
+
+Verified segment ends are stored in ``event_log_integrity_checkpoints``; a
+later run resumes after the latest checkpoint unless ``full=True``. When old
+partitions are archived, an ``archived`` checkpoint is anchored at the last
+dropped event; a full run starts from the latest anchor instead of genesis.
+Events still live with a ``chain_seq`` below that anchor (emitted in the
+archived month but flushed after later ones) are then not re-verified.
+"""
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+import database
+from event_writer import GENESIS_HASH, HASH_FIELDS, compute_integrity_hash
+
+DEFAULT_SEGMENT_SIZE = 200_000
+DEFAULT_PAGE_SIZE = 5000
+
+_COLUMNS = ", ".join(HASH_FIELDS) + ", integrity_hash"
+
+_CHECKPOINT_ORDER = "ORDER BY chain_seq DESC NULLS LAST, event_timestamp DESC, event_id DESC"
+
+LAST_CHECKPOINT_SQL = text(f"""
+SELECT chain_seq, event_timestamp, event_id, integrity_hash, events_verified, archived
+FROM event_log_integrity_checkpoints
+{_CHECKPOINT_ORDER}
+LIMIT 1
+""")
+
+LAST_ANCHOR_SQL = text(f"""
+SELECT chain_seq, event_timestamp, event_id, integrity_hash, events_verified, archived
+FROM event_log_integrity_checkpoints
+WHERE archived = TRUE
+{_CHECKPOINT_ORDER}
+LIMIT 1
+""")
+
+STORED_EVENT_SQL = text("""
+SELECT chain_seq, integrity_hash FROM event_log_legal WHERE event_timestamp = :ts AND id = :id
+""")
+
+BOUNDARY_SQL = text("""
+SELECT chain_seq, integrity_hash FROM event_log_legal
+WHERE chain_seq > :after
+ORDER BY chain_seq
+OFFSET :offset LIMIT 1
+""")
+
+LAST_KEY_SQL = text("""
+SELECT chain_seq, integrity_hash FROM event_log_legal
+WHERE chain_seq IS NOT NULL
+ORDER BY chain_seq DESC
+LIMIT 1
+""")
+
+PAGE_SQL = text(f"""
+SELECT {_COLUMNS}, chain_seq FROM event_log_legal
+WHERE chain_seq > :after AND chain_seq <= :end
+ORDER BY chain_seq
+LIMIT :limit
+""")
+
+INSERT_CHECKPOINT_SQL = text("""
+INSERT INTO event_log_integrity_checkpoints (chain_seq, event_timestamp, event_id, integrity_hash, events_verified)
+VALUES (:seq, :ts, :id, :hash, :verified)
+""")
+
+
+@dataclass
+class BrokenLink:
+    """The first event whose stored hash does not match the chain."""
+    event_id: object
+    event_timestamp: object
+    expected_hash: str
+    stored_hash: str
+
+
+@dataclass
+class SegmentResult:
+    index: int
+    verified: int = 0
+    last_key: Optional[Tuple] = None
+    last_hash: Optional[str] = None
+    broken: Optional[BrokenLink] = None
+
+
+@dataclass
+class VerificationReport:
+    """Outcome of one verification run."""
+    resumed_from: Optional[int] = None
+    segments: int = 0
+    verified: int = 0
+    elapsed_s: float = 0.0
+    broken: Optional[BrokenLink] = None
+    checkpoints_written: int = 0
+    segment_results: List[SegmentResult] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.broken is None
+
+    def summary(self) -> str:
+        status = "OK" if self.ok else (
+            f"BROKEN at event {self.broken.event_id} ({self.broken.event_timestamp}): "
+            f"expected {self.broken.expected_hash}, stored {self.broken.stored_hash}"
+        )
+        return (f"{status} - {self.verified} events in {self.segments} segment(s), "
+                f"{self.elapsed_s:.1f}s, {self.checkpoints_written} checkpoint(s) written")
+
+
+# ============================================================================
+# Worker side
+# ============================================================================
+def _init_worker():
+    # Connections inherited from the parent over fork must not be reused
+    database.dispose_engines(close=False)
+
+
+def verify_segment(index: int, start_seq: int, prev_hash: str, end_seq: int,
+                   database_url: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> SegmentResult:
+    """
+    Verify events with ``chain_seq`` in (start_seq, end_seq] against the
+    chain, starting from ``prev_hash`` (the stored hash at ``start_seq``).
+    """
+    result = SegmentResult(index=index)
+    after = start_seq
+    with database.get_engine(database_url).connect() as conn:
+        while True:
+            rows = conn.execute(PAGE_SQL, {"after": after, "end": end_seq, "limit": page_size}).mappings().all()
+            if not rows:
+                break
+            for row in rows:
+                expected = compute_integrity_hash(prev_hash, row)
+                if expected != row['integrity_hash']:
+                    result.broken = BrokenLink(row['id'], row['event_timestamp'], expected, row['integrity_hash'])
+                    return result
+                prev_hash = row['integrity_hash']
+                result.verified += 1
+                result.last_key = (row['chain_seq'], row['event_timestamp'], row['id'])
+                result.last_hash = prev_hash
+            after = result.last_key[0]
+    return result
+
+
+def _verify_segment_args(args) -> SegmentResult:
+    return verify_segment(*args)
+
+
+# ============================================================================
+# Coordinator
+# ============================================================================
+def _segment_boundaries(conn, start_seq: int, segment_size: int) -> List[Tuple[int, str]]:
+    """(chain_seq, stored hash) of the last event of each segment after ``start_seq``."""
+    last = conn.execute(LAST_KEY_SQL).first()
+    if last is None or last[0] <= start_seq:
+        return []
+    ends = []
+    after = start_seq
+    while True:
+        row = conn.execute(BOUNDARY_SQL, {"after": after, "offset": segment_size - 1}).first()
+        if row is None:
+            ends.append(tuple(last))
+            return ends
+        ends.append(tuple(row))
+        after = row[0]
+        if after == last[0]:
+            return ends
+
+
+def verify_chain(full: bool = False, workers: int = 4, segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 database_url: Optional[str] = None, write_checkpoints: bool = True) -> VerificationReport:
+    """
+    Verify the integrity chain, resuming after the latest checkpoint unless
+    ``full`` (then from the latest archive anchor, or genesis if nothing was
+    archived). Returns a report with the first broken link, if any.
+    """
+    started = time.perf_counter()
+    report = VerificationReport()
+    engine = database.get_engine(database_url)
+
+    start_seq, prev_hash, already_verified = 0, GENESIS_HASH, 0
+    with engine.connect() as conn:
+        checkpoint = conn.execute(LAST_ANCHOR_SQL if full else LAST_CHECKPOINT_SQL).first()
+        if checkpoint is not None:
+            seq, ts, event_id, checkpoint_hash, already_verified, archived = checkpoint
+            # An archive anchor's event is gone with its partition; trust the recorded hash
+            if not archived:
+                stored = conn.execute(STORED_EVENT_SQL, {"ts": ts, "id": event_id}).first()
+                if stored is None or stored[1] != checkpoint_hash:
+                    # The checkpointed event itself was altered or removed since the last run
+                    report.broken = BrokenLink(event_id, ts, checkpoint_hash, stored[1] if stored else None)
+                    report.elapsed_s = time.perf_counter() - started
+                    return report
+                seq = stored[0]
+            # Anchors archived before chain_seq existed precede every live event
+            start_seq, prev_hash = seq or 0, checkpoint_hash
+            report.resumed_from = start_seq
+        ends = _segment_boundaries(conn, start_seq, segment_size)
+
+    # Each segment starts from the stored hash at the previous segment's end
+    tasks = []
+    seg_start, seg_prev = start_seq, prev_hash
+    for index, (end_seq, end_hash) in enumerate(ends):
+        tasks.append((index, seg_start, seg_prev, end_seq, database_url))
+        seg_start, seg_prev = end_seq, end_hash
+
+    report.segments = len(tasks)
+    if tasks:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                results = list(pool.map(_verify_segment_args, tasks))
+        else:
+            results = [_verify_segment_args(task) for task in tasks]
+        report.segment_results = results
+
+        # Stitch in chain order: count verified events up to the first break
+        checkpoints = []
+        verified_total = already_verified
+        for result in results:
+            report.verified += result.verified
+            verified_total += result.verified
+            if result.broken is not None:
+                report.broken = result.broken
+                break
+            if result.last_key is not None:
+                seq, ts, event_id = result.last_key
+                checkpoints.append({"seq": seq, "ts": ts, "id": event_id,
+                                    "hash": result.last_hash, "verified": verified_total})
+
+        if write_checkpoints and checkpoints:
+            with engine.begin() as conn:
+                conn.execute(INSERT_CHECKPOINT_SQL, checkpoints)
+            report.checkpoints_written = len(checkpoints)
+
+    report.elapsed_s = time.perf_counter() - started
+    return report
+
+
+if __name__ == "__main__":
+    workers = 4
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    outcome = verify_chain(full="--full" in sys.argv, workers=workers)
+    print(outcome.summary())
+    sys.exit(0 if outcome.ok else 1)
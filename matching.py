@@ -0,0 +1,360 @@
+"""
+In-memory lawyer matching index over the ``abogados_directorio`` read model.
+
+Answers "which verified, active lawyers cover departamento X / municipio Y
+with especialidad Z, best rated first" without a database round-trip.
+
+Rows are stored in parallel arrays; each indexed term maps to a bitset
+(a Python int, bit i = row position i). Snapshot rows are laid out in rating
+order, so the top-k of a filtered bitset are simply its k lowest set bits.
+Rows changed by an incremental refresh are appended to an unordered tail that
+is merged at query time and folded back in by ``compact()``. Everything a
+result needs, including the plan code, is copied from the snapshot, so
+queries never touch the database.
+
+``refresh()`` re-reads rows changed since its watermark minus an overlap
+margin, because ``synced_at`` is a transaction start time and a long
+transaction can commit after a refresh with an older timestamp. Lawyers
+deleted outright are found by comparing row counts, and the index is reloaded
+in full every ``full_reload_interval``.
+"""
+import heapq
+import threading
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+
+import database
+
+TERM_FIELDS = ('departamentos_cobertura', 'municipios_cobertura', 'especialidades', 'idiomas')
+
+# Compact the index once the unordered tail reaches this share of the rows
+TAIL_COMPACT_RATIO = 0.05
+
+# Re-read window behind the watermark for transactions that committed late
+DEFAULT_REFRESH_OVERLAP = timedelta(minutes=5)
+DEFAULT_FULL_RELOAD_INTERVAL = 3600.0
+
+SNAPSHOT_COLUMNS = (
+    "id, nombres, apellidos, departamento, municipio, "
+    "departamentos_cobertura, municipios_cobertura, especialidades, idiomas, "
+    "cobertura_nacional, acepta_casos_emergencia, "
+    "calificacion_promedio, total_valoraciones, "
+    "nombre_organizacion, plan_codigo, synced_at"
+)
+
+
+class LawyerMatch(NamedTuple):
+    """One ranked match returned by ``MatchingIndex.match``."""
+    id: object
+    nombres: str
+    apellidos: str
+    departamento: str
+    municipio: str
+    calificacion_promedio: float
+    total_valoraciones: int
+    nombre_organizacion: Optional[str]
+    plan_codigo: Optional[str]
+
+
+@lru_cache(maxsize=65536)
+def normalize_term(value: str) -> str:
+    """Normalize an indexed/query term (case-insensitive, trimmed)."""
+    return value.strip().casefold()
+
+
+def _bitset(positions: List[int]) -> int:
+    """Bitset with the given ascending positions set, built in one pass."""
+    if not positions:
+        return 0
+    buf = bytearray((positions[-1] >> 3) + 1)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def _iter_bits(bits: int):
+    """Yield set bit positions, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class MatchingIndex:
+    """Read-side matching engine over a snapshot of ``abogados_directorio``."""
+
+    def __init__(self, refresh_overlap: timedelta = DEFAULT_REFRESH_OVERLAP,
+                 full_reload_interval: Optional[float] = DEFAULT_FULL_RELOAD_INTERVAL):
+        self.refresh_overlap = refresh_overlap
+        self.full_reload_interval = full_reload_interval
+        self._lock = threading.RLock()
+        self._reset()
+        self.watermark: Optional[datetime] = None
+        self.loaded_at: Optional[float] = None
+
+    def _reset(self):
+        self._ids: List[object] = []
+        self._display: List[tuple] = []
+        self._rating = array('d')
+        self._reviews = array('l')
+        self._terms: List[Tuple[Tuple[str, str], ...]] = []
+        self._position: Dict[object, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {f: {} for f in TERM_FIELDS}
+        self._nacional = 0
+        self._emergencia = 0
+        self._alive = 0
+        self._ordered_end = 0
+
+    def __len__(self) -> int:
+        return len(self._position)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def _store(self, row) -> Tuple[int, Tuple[Tuple[str, str], ...]]:
+        """Append the row's columns; postings and flags are left to the caller."""
+        pos = len(self._ids)
+        terms = []
+        for field in TERM_FIELDS:
+            values = row[field]
+            if values:
+                terms.extend((field, value) for value in {normalize_term(v) for v in values if v})
+        terms = tuple(terms)
+        self._ids.append(row['id'])
+        self._display.append((
+            row['nombres'], row['apellidos'], row['departamento'], row['municipio'],
+            row['nombre_organizacion'], row['plan_codigo'], row['synced_at'],
+        ))
+        self._rating.append(float(row['calificacion_promedio'] or 0))
+        self._reviews.append(int(row['total_valoraciones'] or 0))
+        self._terms.append(terms)
+        self._position[row['id']] = pos
+        return pos, terms
+
+    def _append(self, row) -> int:
+        pos, terms = self._store(row)
+        bit = 1 << pos
+        for field, value in terms:
+            postings = self._postings[field]
+            postings[value] = postings.get(value, 0) | bit
+        if row['cobertura_nacional']:
+            self._nacional |= bit
+        if row['acepta_casos_emergencia']:
+            self._emergencia |= bit
+        self._alive |= bit
+        return pos
+
+    def _kill(self, pos: int):
+        mask = ~(1 << pos)
+        for field, value in self._terms[pos]:
+            postings = self._postings[field]
+            remaining = postings[value] & mask
+            if remaining:
+                postings[value] = remaining
+            else:
+                del postings[value]
+        self._nacional &= mask
+        self._emergencia &= mask
+        self._alive &= mask
+        self._terms[pos] = ()
+        self._display[pos] = ()
+
+    def build(self, rows):
+        """Replace the index contents with ``rows`` (mappings with SNAPSHOT_COLUMNS keys)."""
+        ordered = sorted(
+            rows,
+            key=lambda r: (-float(r['calificacion_promedio'] or 0), -int(r['total_valoraciones'] or 0), str(r['id'])),
+        )
+        with self._lock:
+            self._reset()
+            # Growing an int bitset copies it, so collect positions and convert once
+            positions: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+            nacional, emergencia = [], []
+            for row in ordered:
+                pos, terms = self._store(row)
+                for term in terms:
+                    positions[term].append(pos)
+                if row['cobertura_nacional']:
+                    nacional.append(pos)
+                if row['acepta_casos_emergencia']:
+                    emergencia.append(pos)
+            for (field, value), term_positions in positions.items():
+                self._postings[field][value] = _bitset(term_positions)
+            self._nacional = _bitset(nacional)
+            self._emergencia = _bitset(emergencia)
+            self._alive = (1 << len(self._ids)) - 1
+            self._ordered_end = len(self._ids)
+            synced = [r['synced_at'] for r in ordered if r['synced_at'] is not None]
+            self.watermark = max(synced) if synced else None
+
+    def upsert(self, row) -> bool:
+        """
+        Insert or replace one lawyer; the row goes to the unordered tail.
+        Returns False when the indexed copy is already at this ``synced_at``.
+        """
+        with self._lock:
+            pos = self._position.get(row['id'])
+            if pos is not None:
+                if row['synced_at'] is not None and self._display[pos][6] == row['synced_at']:
+                    return False
+                del self._position[row['id']]
+                self._kill(pos)
+            self._append(row)
+            return True
+
+    def remove(self, abogado_id) -> bool:
+        """Drop a lawyer that is no longer verified/active."""
+        with self._lock:
+            pos = self._position.pop(abogado_id, None)
+            if pos is not None:
+                self._kill(pos)
+            return pos is not None
+
+    def compact(self):
+        """Rebuild the rank-ordered layout, dropping dead positions."""
+        with self._lock:
+            watermark = self.watermark
+            rows = []
+            for abogado_id, pos in self._position.items():
+                nombres, apellidos, departamento, municipio, org, plan_codigo, synced_at = self._display[pos]
+                row = {
+                    'id': abogado_id, 'nombres': nombres, 'apellidos': apellidos,
+                    'departamento': departamento, 'municipio': municipio,
+                    'nombre_organizacion': org, 'plan_codigo': plan_codigo,
+                    'calificacion_promedio': self._rating[pos],
+                    'total_valoraciones': self._reviews[pos],
+                    'cobertura_nacional': bool(self._nacional >> pos & 1),
+                    'acepta_casos_emergencia': bool(self._emergencia >> pos & 1),
+                    'synced_at': synced_at,
+                }
+                for field in TERM_FIELDS:
+                    row[field] = [value for f, value in self._terms[pos] if f == field]
+                rows.append(row)
+            self.build(rows)
+            self.watermark = watermark
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+    def _candidates(self, departamento, municipio, especialidad, idioma, emergencia) -> int:
+        bits = self._alive
+        if departamento:
+            bits &= self._postings['departamentos_cobertura'].get(normalize_term(departamento), 0) | self._nacional
+        if municipio:
+            bits &= self._postings['municipios_cobertura'].get(normalize_term(municipio), 0) | self._nacional
+        if especialidad:
+            bits &= self._postings['especialidades'].get(normalize_term(especialidad), 0)
+        if idioma:
+            bits &= self._postings['idiomas'].get(normalize_term(idioma), 0)
+        if emergencia:
+            bits &= self._emergencia
+        return bits
+
+    def _result(self, pos: int) -> LawyerMatch:
+        nombres, apellidos, departamento, municipio, org, plan_codigo, _ = self._display[pos]
+        return LawyerMatch(
+            self._ids[pos], nombres, apellidos, departamento, municipio,
+            self._rating[pos], self._reviews[pos], org, plan_codigo,
+        )
+
+    def count(self, departamento: Optional[str] = None, municipio: Optional[str] = None,
+              especialidad: Optional[str] = None, idioma: Optional[str] = None,
+              emergencia: bool = False) -> int:
+        """Number of lawyers matching the filters."""
+        with self._lock:
+            return bin(self._candidates(departamento, municipio, especialidad, idioma, emergencia)).count('1')
+
+    def match(self, departamento: Optional[str] = None, municipio: Optional[str] = None,
+              especialidad: Optional[str] = None, idioma: Optional[str] = None,
+              emergencia: bool = False, k: int = 10) -> List[LawyerMatch]:
+        """
+        Top-k lawyers covering the given departamento/municipio (or with
+        national coverage) and matching every other filter, ranked by
+        calificacion_promedio then total_valoraciones.
+        """
+        if k <= 0:
+            return []
+        with self._lock:
+            bits = self._candidates(departamento, municipio, especialidad, idioma, emergencia)
+            ordered = bits & ((1 << self._ordered_end) - 1)
+            picked = []
+            for pos in _iter_bits(ordered):
+                picked.append(pos)
+                if len(picked) == k:
+                    break
+            tail = bits >> self._ordered_end
+            if tail:
+                picked.extend(self._ordered_end + p for p in _iter_bits(tail))
+                picked = heapq.nlargest(k, picked, key=lambda p: (self._rating[p], self._reviews[p], -p))
+            return [self._result(pos) for pos in picked]
+
+    # ------------------------------------------------------------------
+    # Database sync
+    # ------------------------------------------------------------------
+    def load(self, database_url: Optional[str] = None):
+        """Take a full snapshot of ``abogados_directorio``."""
+        with database.get_engine(database_url).connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=5000).execute(
+                text(f"SELECT {SNAPSHOT_COLUMNS} FROM abogados_directorio")
+            )
+            self.build(result.mappings())
+        self.loaded_at = time.monotonic()
+
+    def _reconcile_deleted(self, conn) -> int:
+        """Remove indexed lawyers whose directory row no longer exists (hard deletes)."""
+        if conn.execute(text("SELECT COUNT(*) FROM abogados_directorio")).scalar() == len(self):
+            return 0
+        present = {row[0] for row in conn.execute(text("SELECT id FROM abogados_directorio"))}
+        with self._lock:
+            missing = [abogado_id for abogado_id in self._position if abogado_id not in present]
+            for abogado_id in missing:
+                self.remove(abogado_id)
+        return len(missing)
+
+    def refresh(self, database_url: Optional[str] = None) -> int:
+        """
+        Apply lawyers changed since the last snapshot/refresh, keyed on
+        ``abogados_directorio.synced_at`` (which also moves when only the
+        lawyer's organization or plan changed) and re-reading
+        ``refresh_overlap`` behind the watermark. Lawyers that left the
+        directory are found through ``abogados.updated_at`` and a row-count
+        check. Falls back to a full ``load()`` when none was taken yet or
+        the last one is older than ``full_reload_interval`` seconds.
+        Returns the number of rows applied.
+        """
+        stale = (self.full_reload_interval is not None and self.loaded_at is not None
+                 and time.monotonic() - self.loaded_at > self.full_reload_interval)
+        if self.watermark is None or stale:
+            self.load(database_url)
+            return len(self)
+
+        applied = 0
+        watermark = self.watermark
+        with database.get_engine(database_url).connect() as conn:
+            params = {"since": watermark - self.refresh_overlap}
+            for row in conn.execute(text(
+                f"SELECT {SNAPSHOT_COLUMNS} FROM abogados_directorio WHERE synced_at >= :since"
+            ), params).mappings():
+                if self.upsert(row):
+                    applied += 1
+                if row['synced_at'] > watermark:
+                    watermark = row['synced_at']
+            for row in conn.execute(text(
+                "SELECT id FROM abogados WHERE updated_at >= :since "
+                "AND NOT (estado_verificacion = 'verificado' AND activo = TRUE)"
+            ), params).mappings():
+                if self.remove(row['id']):
+                    applied += 1
+            applied += self._reconcile_deleted(conn)
+
+        with self._lock:
+            self.watermark = watermark
+            if len(self._ids) - self._ordered_end > TAIL_COMPACT_RATIO * max(len(self), 1):
+                self.compact()
+        return applied
@@ -0,0 +1,373 @@
+"""
+Incremental schema migrations for SOAT Connect Lawyer Registry.
+
+``schema.sql`` is split into statements by a parser that understands quoted
+strings, dollar-quoted bodies and comments. Every statement is identified by
+the SHA-256 of its normalized text and recorded in ``schema_migrations`` once
+applied, so a deploy only runs statements that are new or have changed. All
+pending statements run in one transaction, sent to the server in batches.
+
+A database deployed before migrations were tracked is adopted with
+``baseline_schema``, which records the current checksums without running
+anything. Edited ``CREATE TABLE/INDEX IF NOT EXISTS`` statements whose object
+already exists are reported as warnings: the server skips them, so the edit
+needs an explicit ``ALTER`` statement to take effect.
+"""
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, inspect, insert, text
+from sqlalchemy.dialects.postgresql import TIMESTAMP
+
+import database
+from models import Base
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant used with pg_advisory_xact_lock to serialize deploys
+MIGRATION_LOCK_KEY = 74_219_001
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_LOCK_TIMEOUT = "5s"
+
+_migrations_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _migrations_metadata,
+    Column('checksum', String(64), primary_key=True),
+    Column('statement_label', Text, nullable=False),
+    Column('schema_file', String(255), nullable=False),
+    Column('deploy_id', Integer, nullable=False),
+    Column('applied_at', TIMESTAMP(timezone=True), server_default=text('CURRENT_TIMESTAMP')),
+)
+
+VERSION_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    checksum VARCHAR(64) PRIMARY KEY,
+    statement_label TEXT NOT NULL,
+    schema_file VARCHAR(255) NOT NULL,
+    deploy_id INTEGER NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_CREATE_IF_NOT_EXISTS = re.compile(
+    r"^CREATE\s+(?:UNLOGGED\s+)?(?:UNIQUE\s+)?(TABLE|INDEX)\s+(?:CONCURRENTLY\s+)?IF\s+NOT\s+EXISTS\s+([\w.]+)",
+    re.IGNORECASE,
+)
+
+
+class SchemaParseError(ValueError):
+    """Raised when schema SQL has an unterminated quote, comment or body."""
+
+
+@dataclass(frozen=True)
+class Statement:
+    """A single SQL statement with its checksum."""
+    sql: str
+    checksum: str
+
+    @property
+    def label(self) -> str:
+        return self.sql if len(self.sql) <= 80 else self.sql[:77] + '...'
+
+
+@dataclass
+class MigrationPlan:
+    """What a deploy would do: pending statements and model drift."""
+    pending: List[Statement] = field(default_factory=list)
+    skipped: int = 0
+    removed: List[str] = field(default_factory=list)
+    model_diff: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        lines = [f"{len(self.pending)} statement(s) to apply, {self.skipped} unchanged"]
+        lines += [f"  + {s.label}" for s in self.pending]
+        lines += [f"  ! {w}" for w in self.warnings]
+        if self.removed:
+            lines.append(f"{len(self.removed)} applied statement(s) no longer in schema file")
+        if self.model_diff:
+            lines.append("Differences between models.py and the database:")
+            lines += [f"  ~ {d}" for d in self.model_diff]
+        return "\n".join(lines)
+
+
+# ============================================================================
+# Parser
+# ============================================================================
+def _quoted_end(sql: str, start: int, quote: str, backslash_escapes: bool) -> int:
+    """Return the index just past the closing quote of a literal/identifier."""
+    i, n = start + 1, len(sql)
+    while i < n:
+        ch = sql[i]
+        if backslash_escapes and ch == '\\':
+            i += 2
+            continue
+        if ch == quote:
+            if i + 1 < n and sql[i + 1] == quote:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    raise SchemaParseError(f"Unterminated {quote} quote starting at offset {start}")
+
+
+def _block_comment_end(sql: str, start: int) -> int:
+    """Return the index just past a (possibly nested) /* */ comment."""
+    depth, i, n = 1, start + 2, len(sql)
+    while i < n:
+        if sql.startswith('/*', i):
+            depth += 1
+            i += 2
+        elif sql.startswith('*/', i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    raise SchemaParseError(f"Unterminated block comment starting at offset {start}")
+
+
+def split_statements(sql: str) -> List[Statement]:
+    """
+    Split SQL text into statements on top-level semicolons.
+    Comments are dropped and whitespace outside literals is collapsed, so
+    reformatting or re-commenting the file does not change checksums.
+    """
+    statements: List[Statement] = []
+    buf: List[str] = []
+    i, n = 0, len(sql)
+
+    def emit_space():
+        if buf and buf[-1] != ' ':
+            buf.append(' ')
+
+    def flush():
+        stmt = ''.join(buf).strip()
+        buf.clear()
+        if stmt:
+            checksum = hashlib.sha256(stmt.encode('utf-8')).hexdigest()
+            statements.append(Statement(sql=stmt, checksum=checksum))
+
+    while i < n:
+        ch = sql[i]
+        if sql.startswith('--', i):
+            j = sql.find('\n', i)
+            i = n if j == -1 else j
+            continue
+        if sql.startswith('/*', i):
+            i = _block_comment_end(sql, i)
+            emit_space()
+            continue
+        if ch in ("'", '"'):
+            prev = sql[i - 1] if i else ''
+            j = _quoted_end(sql, i, ch, backslash_escapes=(ch == "'" and prev in 'eE'))
+            buf.append(sql[i:j])
+            i = j
+            continue
+        if ch == '$':
+            prev = sql[i - 1] if i else ''
+            m = _DOLLAR_TAG.match(sql, i)
+            if m and not (prev.isalnum() or prev == '_'):
+                tag = m.group(0)
+                end = sql.find(tag, m.end())
+                if end == -1:
+                    raise SchemaParseError(f"Unterminated {tag} body starting at offset {i}")
+                buf.append(sql[i:end + len(tag)])
+                i = end + len(tag)
+                continue
+        if ch == ';':
+            flush()
+            i += 1
+            continue
+        if ch.isspace():
+            emit_space()
+        else:
+            buf.append(ch)
+        i += 1
+
+    flush()
+    return statements
+
+
+def load_statements(schema_file: str) -> List[Statement]:
+    """Parse a schema file, dropping duplicate statements."""
+    with open(schema_file, 'r') as f:
+        statements = split_statements(f.read())
+    seen: Set[str] = set()
+    unique = []
+    for stmt in statements:
+        if stmt.checksum not in seen:
+            seen.add(stmt.checksum)
+            unique.append(stmt)
+    return unique
+
+
+# ============================================================================
+# Model drift
+# ============================================================================
+def diff_models(conn) -> List[str]:
+    """Compare ``models.Base`` metadata with the live database catalog."""
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    diffs = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            diffs.append(f"table {table.name} is missing")
+            continue
+        db_columns = {c['name']: c for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            db_column = db_columns.pop(column.name, None)
+            if db_column is None:
+                diffs.append(f"{table.name}.{column.name} is missing")
+            elif not column.primary_key and db_column['nullable'] != column.nullable:
+                expected = 'NULL' if column.nullable else 'NOT NULL'
+                diffs.append(f"{table.name}.{column.name} should be {expected}")
+        for name in db_columns:
+            diffs.append(f"{table.name}.{name} exists in the database but not in models.py")
+    return diffs
+
+
+# ============================================================================
+# Planning and applying
+# ============================================================================
+def _batches(items: List[Statement], size: int) -> Iterable[List[Statement]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _plan(statements: List[Statement], applied: Set[str]) -> MigrationPlan:
+    current = {s.checksum for s in statements}
+    return MigrationPlan(
+        pending=[s for s in statements if s.checksum not in applied],
+        skipped=sum(1 for s in statements if s.checksum in applied),
+        removed=sorted(applied - current),
+    )
+
+
+def _applied_checksums(conn) -> Set[str]:
+    if not inspect(conn).has_table('schema_migrations'):
+        return set()
+    return {row[0] for row in conn.execute(text("SELECT checksum FROM schema_migrations"))}
+
+
+def _noop_warnings(conn, pending: List[Statement]) -> List[str]:
+    """Pending ``CREATE ... IF NOT EXISTS`` statements whose object already exists."""
+    warnings = []
+    for stmt in pending:
+        m = _CREATE_IF_NOT_EXISTS.match(stmt.sql)
+        if m and conn.execute(text("SELECT to_regclass(:name)"), {"name": m.group(2)}).scalar() is not None:
+            warnings.append(f"{m.group(1).lower()} {m.group(2)} already exists; this changed statement "
+                            f"is a no-op unless an earlier statement drops or renames it")
+    return warnings
+
+
+def _record(conn, statements: List[Statement], schema_file: str):
+    deploy_id = conn.execute(text("SELECT COALESCE(MAX(deploy_id), 0) + 1 FROM schema_migrations")).scalar()
+    conn.execute(insert(schema_migrations), [
+        {"checksum": s.checksum, "statement_label": s.label,
+         "schema_file": schema_file, "deploy_id": deploy_id}
+        for s in statements
+    ])
+
+
+def plan_schema(schema_file: str = "schema.sql", database_url: Optional[str] = None) -> MigrationPlan:
+    """Dry run: list pending statements and diff models.py against the database."""
+    statements = load_statements(schema_file)
+    with database.get_engine(database_url).connect() as conn:
+        plan = _plan(statements, _applied_checksums(conn))
+        plan.warnings = _noop_warnings(conn, plan.pending)
+        plan.model_diff = diff_models(conn)
+    return plan
+
+
+def baseline_schema(schema_file: str = "schema.sql", database_url: Optional[str] = None) -> MigrationPlan:
+    """
+    Mark every statement of ``schema_file`` as applied without running it.
+    Use once on a database deployed before ``schema_migrations`` existed, after
+    checking that it matches the file; later deploys then only run new edits.
+    """
+    statements = load_statements(schema_file)
+    with database.get_engine(database_url).begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.exec_driver_sql(VERSION_TABLE_DDL)
+        plan = _plan(statements, _applied_checksums(conn))
+        if plan.pending:
+            _record(conn, plan.pending, schema_file)
+    return plan
+
+
+def apply_schema(schema_file: str = "schema.sql", database_url: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 lock_timeout: str = DEFAULT_LOCK_TIMEOUT) -> MigrationPlan:
+    """
+    Apply new or changed statements from ``schema_file`` in a single transaction.
+    Concurrent deploys are serialized with an advisory lock, and ``lock_timeout``
+    makes DDL fail fast instead of queueing behind long-running queries.
+    """
+    statements = load_statements(schema_file)
+    with database.get_engine(database_url).begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.execute(text("SELECT set_config('lock_timeout', :value, true)"), {"value": lock_timeout})
+        conn.exec_driver_sql(VERSION_TABLE_DDL)
+
+        plan = _plan(statements, _applied_checksums(conn))
+        if not plan.pending:
+            return plan
+        plan.warnings = _noop_warnings(conn, plan.pending)
+        for warning in plan.warnings:
+            logger.warning("Migration: %s", warning)
+
+        # No parameters: the driver must not treat format()'s %s / %I / %L as placeholders
+        raw = conn.execution_options(no_parameters=True)
+        for batch in _batches(plan.pending, batch_size):
+            try:
+                raw.exec_driver_sql(";\n".join(s.sql for s in batch))
+            except Exception as e:
+                labels = "\n".join(f"  {s.label}" for s in batch)
+                raise RuntimeError(f"Migration batch failed:\n{labels}\n{e}") from e
+
+        _record(conn, plan.pending, schema_file)
+    return plan
+
+
+def _sql_literal(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def apply_schema_supabase(schema_file: str = "schema.sql",
+                          lock_timeout: str = DEFAULT_LOCK_TIMEOUT) -> MigrationPlan:
+    """
+    Apply pending statements through the ``exec_sql`` RPC when no direct
+    database connection is configured. The whole migration is sent as one
+    RPC call, which Postgres runs as a single transaction.
+    """
+    client = database.get_supabase_client()
+    statements = load_statements(schema_file)
+    try:
+        rows = client.table('schema_migrations').select('checksum,deploy_id').execute().data
+    except Exception:
+        rows = []
+    plan = _plan(statements, {row['checksum'] for row in rows})
+    if not plan.pending:
+        return plan
+
+    deploy_id = max((row['deploy_id'] for row in rows), default=0) + 1
+    values = ",\n".join(
+        f"({_sql_literal(s.checksum)}, {_sql_literal(s.label)}, {_sql_literal(schema_file)}, {deploy_id})"
+        for s in plan.pending
+    )
+    script = [
+        f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_KEY})",
+        f"SET LOCAL lock_timeout = {_sql_literal(lock_timeout)}",
+        VERSION_TABLE_DDL.strip(),
+        *(s.sql for s in plan.pending),
+        "INSERT INTO schema_migrations (checksum, statement_label, schema_file, deploy_id) "
+        f"VALUES {values} ON CONFLICT (checksum) DO NOTHING",
+    ]
+    client.postgrest.rpc('exec_sql', {'query': ";\n".join(script)}).execute()
+    return plan
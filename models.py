@@ -2,15 +2,16 @@
 SQLAlchemy models for SOAT Connect Lawyer Registry (v2.0 - Future-Proof).
 
 Includes: Legal Organizations (Bufetes), Subscription Plans, Subscriptions,
-Lawyers, Certifications, Reviews, Event Log, Audit Log.
+Lawyers, Certifications, Reviews, Event Log, Audit Log, and the read-only
+Lawyer Directory read model.
 """
 from sqlalchemy import (
-    Column, Integer, String, Boolean, Date, Text, ARRAY,
+    Column, Integer, BigInteger, String, Boolean, Date, Text, ARRAY,
     ForeignKey, CheckConstraint, Numeric
 )
-from sqlalchemy.dialects.postgresql import UUID, JSONB, TIMESTAMP, INET
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TIMESTAMP, INET, TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 import uuid
 from datetime import datetime
 
@@ -241,6 +242,7 @@ class Abogado(Base):
     # Performance (cached)
     calificacion_promedio = Column(Numeric(3, 2), default=0)
     total_valoraciones = Column(Integer, default=0)
+    suma_calificaciones = Column(Integer, default=0)
     tasa_respuesta = Column(Numeric(5, 2), default=0)
     tiempo_respuesta_promedio = Column(Integer, default=0)
 
@@ -352,11 +354,14 @@ class EventLogLegal(Base):
     ip_address = Column(INET, nullable=True)
     user_agent = Column(Text, nullable=True)
     integrity_hash = Column(String(64), nullable=True)
+    chain_seq = Column(BigInteger, nullable=True)
     resultado = Column(String(20), default='success')
     error_message = Column(Text, nullable=True)
-    event_timestamp = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
+    event_timestamp = Column(TIMESTAMP(timezone=True), primary_key=True, default=datetime.utcnow)
     processed = Column(Boolean, default=False)
     processed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    process_attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
     metadata = Column(JSONB, default={})
     schema_version = Column(Integer, default=1)
     created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
@@ -385,9 +390,68 @@ class AuditLogLegal(Base):
     ip_address = Column(INET, nullable=True)
     user_agent = Column(Text, nullable=True)
     request_id = Column(String(100), nullable=True)
-    action_timestamp = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
+    action_timestamp = Column(TIMESTAMP(timezone=True), primary_key=True, default=datetime.utcnow)
     metadata = Column(JSONB, default={})
     created_at = Column(TIMESTAMP(timezone=True), default=datetime.utcnow)
 
     def __repr__(self):
-        return f"<AuditLogLegal(action='{self.action}', table='{self.table_name}')>"
\ No newline at end of file
+        return f"<AuditLogLegal(action='{self.action}', table='{self.table_name}')>"
+
+
+# ============================================================================
+# 9. Lawyer Directory (read model)
+# ============================================================================
+class AbogadoDirectorio(Base):
+    """
+    Denormalized verified, active lawyers with organization and plan.
+    Maintained by triggers in schema.sql; read-only from the application.
+    """
+    __tablename__ = 'abogados_directorio'
+
+    id = Column(UUID(as_uuid=True), ForeignKey('abogados.id', ondelete='CASCADE'), primary_key=True)
+    nombres = Column(String(100), nullable=False)
+    apellidos = Column(String(100), nullable=False)
+    tarjeta_profesional = Column(String(50), nullable=False)
+    email = Column(String(255), nullable=False)
+    telefono = Column(String(20), nullable=False)
+    departamento = Column(String(100), nullable=False)
+    municipio = Column(String(100), nullable=False)
+    departamentos_cobertura = Column(ARRAY(Text), nullable=False)
+    municipios_cobertura = Column(ARRAY(Text), nullable=True)
+    cobertura_nacional = Column(Boolean, nullable=True)
+    especialidades = Column(ARRAY(Text), nullable=False)
+    idiomas = Column(ARRAY(Text), nullable=True)
+    anos_experiencia = Column(Integer, nullable=True)
+    casos_soat_atendidos = Column(Integer, nullable=True)
+    nombre_bufete = Column(String(200), nullable=True)
+    tipo_practica = Column(String(50), nullable=True)
+    sitio_web = Column(String(255), nullable=True)
+    descripcion_servicios = Column(Text, nullable=True)
+    tarifa_consulta = Column(String(100), nullable=True)
+    calificacion_promedio = Column(Numeric(3, 2), nullable=True)
+    total_valoraciones = Column(Integer, nullable=True)
+    tasa_respuesta = Column(Numeric(5, 2), nullable=True)
+    tiempo_respuesta_promedio = Column(Integer, nullable=True)
+    disponibilidad = Column(JSONB, nullable=True)
+    acepta_casos_emergencia = Column(Boolean, nullable=True)
+    organizacion_id = Column(UUID(as_uuid=True), nullable=True)
+    suscripcion_id = Column(UUID(as_uuid=True), nullable=True)
+    plan_id = Column(UUID(as_uuid=True), nullable=True)
+    perfil_scoring = Column(JSONB, nullable=True)
+    segmento = Column(String(50), nullable=True)
+    nombre_organizacion = Column(String(300), nullable=True)
+    plan_codigo = Column(String(30), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    # Precomputed sort keys
+    rating_sort = Column(Numeric(3, 2), nullable=False)
+    nombre_sort = Column(Text, nullable=False)
+    synced_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    # Generated search columns (search.py); deferred so listings do not load them
+    search_text = deferred(Column(Text, nullable=True))
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+
+    def __repr__(self):
+        return f"<AbogadoDirectorio(id={self.id}, nombre='{self.nombres} {self.apellidos}')>"
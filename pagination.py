@@ -0,0 +1,258 @@
+"""
+Keyset pagination for directory listings, reviews and the legal logs.
+
+Pages are fetched with ``WHERE (sort_key, id) < (:last_key, :last_id)
+ORDER BY sort_key DESC, id DESC LIMIT n`` instead of OFFSET, so with the
+composite indexes in ``schema.sql`` every page costs one index range scan no
+matter how deep it is.
+
+Cursors are opaque URL-safe strings encoding the sort order and the last
+row's sort values plus ``id``:
+
+    page = list_abogados(session, departamento='Antioquia', sort='rating')
+    more = list_abogados(session, departamento='Antioquia', sort='rating', cursor=page.next_cursor)
+"""
+import base64
+import binascii
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import and_, literal, or_, select, tuple_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from models import AbogadoDirectorio, AbogadoValoracion, AuditLogLegal, EventLogLegal
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+T = TypeVar('T')
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or belongs to a different sort order."""
+
+
+@dataclass(frozen=True)
+class SortSpec:
+    """
+    A keyset order: ``keys`` (expressions, most significant first) followed by
+    the model's ``id`` as tie-breaker, all in the same direction so a single
+    row comparison matches one composite index.
+    """
+    name: str
+    keys: Tuple
+    id_column: object
+    descending: bool = True
+
+    @property
+    def columns(self) -> Tuple:
+        return tuple(self.keys) + (self.id_column,)
+
+    def order_by(self) -> List:
+        return [c.desc() if self.descending else c.asc() for c in self.columns]
+
+    def after(self, values: Sequence) -> object:
+        """Condition selecting rows strictly after ``values`` in this order."""
+        bound = [literal(v, type_=c.type) for c, v in zip(self.columns, values)]
+        if any(v is None for v in values):
+            return self._after_expanded(values)
+        row, key = tuple_(*self.columns), tuple_(*bound)
+        return row < key if self.descending else row > key
+
+    def _after_expanded(self, values: Sequence) -> object:
+        # Row comparison with NULL yields NULL; spell the comparison out instead
+        clauses = []
+        for i, (column, value) in enumerate(zip(self.columns, values)):
+            prefix = [self.columns[j] == values[j] if values[j] is not None else self.columns[j].is_(None)
+                      for j in range(i)]
+            if value is None:
+                # NULLs sort first in DESC and last in ASC order in Postgres
+                step = column.isnot(None) if self.descending else None
+            else:
+                step = column < value if self.descending else column > value
+            if step is not None:
+                clauses.append(and_(*prefix, step))
+        return or_(*clauses)
+
+
+# ============================================================================
+# Cursors
+# ============================================================================
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return ['t', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['d', str(value)]
+    if isinstance(value, uuid.UUID):
+        return ['u', str(value)]
+    return ['v', value]
+
+
+def _decode_value(item):
+    kind, value = item
+    if kind == 't':
+        return datetime.fromisoformat(value)
+    if kind == 'd':
+        return Decimal(value)
+    if kind == 'u':
+        return uuid.UUID(value)
+    if kind == 'v':
+        return value
+    raise InvalidCursor(f"Unknown cursor value type {kind!r}")
+
+
+def encode_cursor(spec: SortSpec, values: Sequence) -> str:
+    payload = json.dumps({'s': spec.name, 'k': [_encode_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(spec: SortSpec, cursor: str) -> List:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [_decode_value(item) for item in payload['k']]
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}") from e
+    if payload.get('s') != spec.name or len(values) != len(spec.columns):
+        raise InvalidCursor(f"Cursor does not belong to sort order {spec.name!r}")
+    return values
+
+
+# ============================================================================
+# Paging
+# ============================================================================
+@dataclass
+class Page(Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str]
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def paginate(session: Session, query: Select, spec: SortSpec, cursor: Optional[str] = None,
+             limit: int = DEFAULT_PAGE_SIZE) -> Page:
+    """
+    Fetch one page of ``query`` (a ``select()`` of a model, filters applied)
+    in ``spec`` order, after ``cursor``.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        query = query.where(spec.after(decode_cursor(spec, cursor)))
+    # Select the sort values next to the entity so cursors need no attribute access
+    rows = session.execute(query.add_columns(*spec.columns).order_by(*spec.order_by()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(spec, rows[-1][1:]) if has_more and rows else None
+    return Page(items=[row[0] for row in rows], next_cursor=next_cursor)
+
+
+# ============================================================================
+# Sort orders
+# ============================================================================
+def _sorts(*specs: SortSpec) -> Dict[str, SortSpec]:
+    return {spec.name: spec for spec in specs}
+
+
+# Directory orders use the read model's precomputed sort keys
+ABOGADO_SORTS = _sorts(
+    SortSpec('rating', (AbogadoDirectorio.rating_sort,), AbogadoDirectorio.id),
+    SortSpec('created_at', (AbogadoDirectorio.created_at,), AbogadoDirectorio.id),
+    SortSpec('nombre', (AbogadoDirectorio.nombre_sort,), AbogadoDirectorio.id, descending=False),
+)
+
+VALORACION_SORTS = _sorts(
+    SortSpec('created_at', (AbogadoValoracion.created_at,), AbogadoValoracion.id),
+    SortSpec('rating', (AbogadoValoracion.calificacion,), AbogadoValoracion.id),
+)
+
+EVENT_SORTS = _sorts(
+    SortSpec('event_timestamp', (EventLogLegal.event_timestamp,), EventLogLegal.id),
+    SortSpec('event_timestamp_asc', (EventLogLegal.event_timestamp,), EventLogLegal.id, descending=False),
+)
+
+AUDIT_SORTS = _sorts(
+    SortSpec('action_timestamp', (AuditLogLegal.action_timestamp,), AuditLogLegal.id),
+    SortSpec('action_timestamp_asc', (AuditLogLegal.action_timestamp,), AuditLogLegal.id, descending=False),
+)
+
+
+def _spec(sorts: Dict[str, SortSpec], sort: str) -> SortSpec:
+    try:
+        return sorts[sort]
+    except KeyError:
+        raise ValueError(f"Unknown sort {sort!r}; expected one of {', '.join(sorts)}") from None
+
+
+def directory_filters(departamento: Optional[str] = None, especialidad: Optional[str] = None) -> List:
+    """Directory conditions on ``AbogadoDirectorio``, served by its GIN array indexes."""
+    conditions = []
+    if departamento:
+        conditions.append(or_(AbogadoDirectorio.departamentos_cobertura.contains([departamento]),
+                              AbogadoDirectorio.cobertura_nacional))
+    if especialidad:
+        conditions.append(AbogadoDirectorio.especialidades.contains([especialidad]))
+    return conditions
+
+
+def list_abogados(session: Session, departamento: Optional[str] = None, especialidad: Optional[str] = None,
+                  sort: str = 'rating', cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> Page:
+    """
+    Verified, active lawyers covering ``departamento`` with ``especialidad``,
+    as ``AbogadoDirectorio`` rows.
+    """
+    query = select(AbogadoDirectorio).where(*directory_filters(departamento, especialidad))
+    return paginate(session, query, _spec(ABOGADO_SORTS, sort), cursor, limit)
+
+
+def list_valoraciones(session: Session, abogado_id, verified_only: bool = True, sort: str = 'created_at',
+                      cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE) -> Page:
+    """Reviews of one lawyer."""
+    query = select(AbogadoValoracion).where(AbogadoValoracion.abogado_id == abogado_id)
+    if verified_only:
+        query = query.where(AbogadoValoracion.verificado)
+    return paginate(session, query, _spec(VALORACION_SORTS, sort), cursor, limit)
+
+
+def list_events(session: Session, actor_id=None, organizacion_id=None, event_category: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None,
+                sort: str = 'event_timestamp', cursor: Optional[str] = None,
+                limit: int = DEFAULT_PAGE_SIZE) -> Page:
+    """Admin browsing of ``event_log_legal``; time bounds also prune partitions."""
+    query = select(EventLogLegal)
+    if actor_id is not None:
+        query = query.where(EventLogLegal.actor_id == actor_id)
+    if organizacion_id is not None:
+        query = query.where(EventLogLegal.organizacion_id == organizacion_id)
+    if event_category:
+        query = query.where(EventLogLegal.event_category == event_category)
+    if since is not None:
+        query = query.where(EventLogLegal.event_timestamp >= since)
+    if until is not None:
+        query = query.where(EventLogLegal.event_timestamp < until)
+    return paginate(session, query, _spec(EVENT_SORTS, sort), cursor, limit)
+
+
+def list_audit(session: Session, table_name: Optional[str] = None, record_id=None, actor_id=None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None,
+               sort: str = 'action_timestamp', cursor: Optional[str] = None,
+               limit: int = DEFAULT_PAGE_SIZE) -> Page:
+    """Admin browsing of ``audit_log_legal``."""
+    query = select(AuditLogLegal)
+    if table_name:
+        query = query.where(AuditLogLegal.table_name == table_name)
+    if record_id is not None:
+        query = query.where(AuditLogLegal.record_id == record_id)
+    if actor_id is not None:
+        query = query.where(AuditLogLegal.actor_id == actor_id)
+    if since is not None:
+        query = query.where(AuditLogLegal.action_timestamp >= since)
+    if until is not None:
+        query = query.where(AuditLogLegal.action_timestamp < until)
+    return paginate(session, query, _spec(AUDIT_SORTS, sort), cursor, limit)
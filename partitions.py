@@ -0,0 +1,321 @@
+"""
+Partition maintenance, archival and cross-archive queries for the legal logs.
+
+``event_log_legal`` and ``audit_log_legal`` are range-partitioned by month
+(``<table>_YYYY_MM`` plus ``<table>_default``). This module:
+
+- creates partitions ahead of time (``ensure_partitions``),
+- exports partitions past the retention window to gzipped JSONL segment files
+  with a JSON manifest, then detaches and drops them (``archive_partitions``);
+  for the event log an integrity checkpoint is anchored at the partition's
+  last event in chain order first, so ``integrity.verify_chain`` can start after it.
+  The manifest is written as ``.manifest.pending.json`` before the drop, so
+  one left behind by a crash is still published by ``list_archives`` once the
+  partition is gone,
+- reads a time range across live partitions and archived segments, touching
+  only the partitions/segments that overlap it (``query_logs``).
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+import database
+
+LOG_TABLES: Dict[str, str] = {
+    'event_log_legal': 'event_timestamp',
+    'audit_log_legal': 'action_timestamp',
+}
+
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "log_archive")
+DEFAULT_MONTHS_AHEAD = 3
+DEFAULT_RETENTION_MONTHS = 12
+EXPORT_FETCH_SIZE = 10000
+
+_PARTITION_RE = re.compile(r"^(?P<parent>\w+)_(?P<year>\d{4})_(?P<month>\d{2})$")
+
+ARCHIVE_ANCHOR_SQL = """
+INSERT INTO event_log_integrity_checkpoints
+    (chain_seq, event_timestamp, event_id, integrity_hash, events_verified, archived)
+SELECT e.chain_seq, e.event_timestamp, e.id, e.integrity_hash,
+       COALESCE((SELECT MAX(c.events_verified) FROM event_log_integrity_checkpoints c
+                 WHERE c.chain_seq <= e.chain_seq), 0),
+       TRUE
+FROM "{partition}" e
+WHERE e.chain_seq IS NOT NULL
+ORDER BY e.chain_seq DESC
+LIMIT 1
+"""
+
+RELATION_EXISTS_SQL = text("SELECT to_regclass(:name) IS NOT NULL")
+
+LIST_PARTITIONS_SQL = text("""
+SELECT c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+WHERE p.relname = :parent
+ORDER BY c.relname
+""")
+
+
+def _month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + (month == 12), month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _check_table(table: str) -> str:
+    if table not in LOG_TABLES:
+        raise ValueError(f"{table} is not a partitioned log table ({', '.join(LOG_TABLES)})")
+    return LOG_TABLES[table]
+
+
+# ============================================================================
+# Partition maintenance
+# ============================================================================
+def ensure_partitions(months_ahead: int = DEFAULT_MONTHS_AHEAD, database_url: Optional[str] = None) -> Dict[str, int]:
+    """Create monthly partitions from the current month to ``months_ahead`` ahead."""
+    created = {}
+    with database.get_engine(database_url).begin() as conn:
+        for table in LOG_TABLES:
+            created[table] = conn.execute(
+                text("SELECT create_monthly_partitions(:parent, :ahead)"),
+                {"parent": table, "ahead": months_ahead},
+            ).scalar()
+    return created
+
+
+def create_partitions_range(conn, table: str, start: date, end: date) -> int:
+    """
+    Create monthly partitions of ``table`` covering [start, end), e.g. for
+    backfills. Rows of those months already in the default partition are moved.
+    """
+    _check_table(table)
+    created = 0
+    month = start.replace(day=1)
+    while month < end:
+        if conn.execute(text("SELECT create_month_partition(:parent, :month)"),
+                        {"parent": table, "month": month}).scalar():
+            created += 1
+        month = _add_months(month, 1)
+    return created
+
+
+def list_partitions(conn, table: str) -> List[Tuple[str, datetime, datetime]]:
+    """Monthly partitions of ``table`` as (name, start, end); the default partition is skipped."""
+    _check_table(table)
+    partitions = []
+    for (name,) in conn.execute(LIST_PARTITIONS_SQL, {"parent": table}):
+        m = _PARTITION_RE.match(name)
+        if m and m.group('parent') == table:
+            partitions.append((name, *_month_bounds(int(m.group('year')), int(m.group('month')))))
+    return partitions
+
+
+# ============================================================================
+# Archival
+# ============================================================================
+def _table_archive_dir(table: str, archive_dir: str) -> str:
+    return os.path.join(archive_dir, table)
+
+
+def _export_partition(conn, partition: str, ts_column: str, path: str) -> Tuple[int, str]:
+    """Write every row of ``partition`` to ``path`` as gzipped JSONL; return (rows, sha256)."""
+    rows = 0
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as out:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(
+            text(f'SELECT * FROM "{partition}" ORDER BY {ts_column}, id')
+        )
+        for row in result.mappings():
+            out.write(json.dumps(dict(row), default=str, ensure_ascii=False, separators=(',', ':')))
+            out.write('\n')
+            rows += 1
+        out.flush()
+        os.fsync(out.fileobj.fileno())
+    digest = hashlib.sha256()
+    with open(tmp_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    os.replace(tmp_path, path)
+    return rows, digest.hexdigest()
+
+
+def _write_json(path: str, data: dict):
+    """Write ``data`` to ``path`` atomically and durably."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def archive_partitions(retention_months: int = DEFAULT_RETENTION_MONTHS, archive_dir: str = LOG_ARCHIVE_DIR,
+                       tables: Optional[List[str]] = None, database_url: Optional[str] = None) -> List[dict]:
+    """
+    Export monthly partitions that ended more than ``retention_months`` ago,
+    then detach and drop them. Each partition is handled in its own
+    transaction holding a SHARE lock, so no row can be added between the
+    export and the drop. Returns the manifests written.
+
+    The manifest is written as pending inside that transaction, before the
+    drop, and published once the drop has committed.
+    """
+    cutoff = datetime.combine(_add_months(date.today().replace(day=1), -retention_months),
+                              datetime.min.time(), tzinfo=timezone.utc)
+    engine = database.get_engine(database_url)
+    manifests = []
+    for table in tables or list(LOG_TABLES):
+        ts_column = _check_table(table)
+        target_dir = _table_archive_dir(table, archive_dir)
+        os.makedirs(target_dir, exist_ok=True)
+        with engine.connect() as conn:
+            expired = [p for p in list_partitions(conn, table) if p[2] <= cutoff]
+        for name, start, end in expired:
+            path = os.path.join(target_dir, f"{name}.jsonl.gz")
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f'LOCK TABLE "{name}" IN SHARE MODE')
+                rows, sha256 = _export_partition(conn, name, ts_column, path)
+                manifest = {
+                    'table': table,
+                    'partition': name,
+                    'time_column': ts_column,
+                    'from': start.isoformat(),
+                    'to': end.isoformat(),
+                    'rows': rows,
+                    'file': os.path.basename(path),
+                    'sha256': sha256,
+                    'archived_at': datetime.now(timezone.utc).isoformat(),
+                }
+                if table == 'event_log_legal':
+                    conn.exec_driver_sql(ARCHIVE_ANCHOR_SQL.format(partition=name))
+                # On disk before the rows are gone; list_archives ignores it while the partition exists
+                _write_json(os.path.join(target_dir, f"{name}.manifest.pending.json"), manifest)
+                conn.exec_driver_sql(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                conn.exec_driver_sql(f'DROP TABLE "{name}"')
+            # Publish the manifest only once the drop has committed, so queries
+            # never see the same month both live and archived
+            _publish_manifest(target_dir, name, manifest)
+            manifests.append(manifest)
+    return manifests
+
+
+def _publish_manifest(target_dir: str, name: str, manifest: dict):
+    _write_json(os.path.join(target_dir, f"{name}.manifest.json"), manifest)
+    try:
+        os.remove(os.path.join(target_dir, f"{name}.manifest.pending.json"))
+    except FileNotFoundError:
+        pass
+
+
+def _recover_pending(target_dir: str, pending: List[str], database_url: Optional[str]):
+    """
+    Publish pending manifests whose partition is gone (the drop committed but
+    the process stopped before publishing). Pending manifests of partitions
+    that still exist belong to an archive in progress or one that rolled back,
+    and are left for ``archive_partitions`` to rewrite.
+    """
+    with database.get_engine(database_url).connect() as conn:
+        for name in pending:
+            with open(os.path.join(target_dir, name)) as f:
+                manifest = json.load(f)
+            if not conn.execute(RELATION_EXISTS_SQL, {"name": manifest['partition']}).scalar():
+                _publish_manifest(target_dir, manifest['partition'], manifest)
+
+
+def list_archives(table: str, archive_dir: str = LOG_ARCHIVE_DIR, database_url: Optional[str] = None) -> List[dict]:
+    """Manifests of archived segments for ``table``, oldest first."""
+    _check_table(table)
+    target_dir = _table_archive_dir(table, archive_dir)
+    if not os.path.isdir(target_dir):
+        return []
+    pending = [name for name in os.listdir(target_dir) if name.endswith('.manifest.pending.json')]
+    if pending:
+        _recover_pending(target_dir, pending, database_url)
+    manifests = []
+    for name in sorted(os.listdir(target_dir)):
+        if name.endswith('.manifest.json'):
+            with open(os.path.join(target_dir, name)) as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m['from'])
+
+
+# ============================================================================
+# Querying
+# ============================================================================
+def _read_segment(table: str, manifest: dict, start: datetime, end: datetime,
+                  filters: Dict[str, object], archive_dir: str) -> Iterator[dict]:
+    ts_column = manifest['time_column']
+    wanted = {k: str(v) for k, v in filters.items()}
+    path = os.path.join(_table_archive_dir(table, archive_dir), manifest['file'])
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            ts = _as_utc(datetime.fromisoformat(row[ts_column]))
+            if ts < start:
+                continue
+            if ts >= end:
+                break  # segments are written in time order
+            if all(str(row.get(k)) == v for k, v in wanted.items()):
+                yield row
+
+
+def query_logs(table: str, start: datetime, end: datetime, filters: Optional[Dict[str, object]] = None,
+               archive_dir: str = LOG_ARCHIVE_DIR, database_url: Optional[str] = None) -> Iterator[dict]:
+    """
+    Yield rows of ``table`` with start <= timestamp < end in time order,
+    reading archived segments first (they are older) and then live
+    partitions. ``filters`` are equality conditions on columns; archived
+    values are compared as strings.
+    """
+    ts_column = _check_table(table)
+    filters = filters or {}
+    for column in filters:
+        if not re.match(r"^\w+$", column):
+            raise ValueError(f"Invalid filter column: {column!r}")
+    start, end = _as_utc(start), _as_utc(end)
+
+    for manifest in list_archives(table, archive_dir, database_url):
+        seg_start = datetime.fromisoformat(manifest['from'])
+        seg_end = datetime.fromisoformat(manifest['to'])
+        if seg_end > start and seg_start < end:
+            yield from _read_segment(table, manifest, start, end, filters, archive_dir)
+
+    conditions = [f"{ts_column} >= :start", f"{ts_column} < :end"]
+    params = {"start": start, "end": end}
+    for i, (column, value) in enumerate(filters.items()):
+        conditions.append(f"{column} = :f{i}")
+        params[f"f{i}"] = value
+    sql = text(f"SELECT * FROM {table} WHERE {' AND '.join(conditions)} ORDER BY {ts_column}, id")
+    with database.get_engine(database_url).connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(sql, params)
+        for row in result.mappings():
+            yield dict(row)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "ensure":
+        print(ensure_partitions())
+    elif len(sys.argv) > 1 and sys.argv[1] == "archive":
+        months = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RETENTION_MONTHS
+        for archived in archive_partitions(retention_months=months):
+            print(f"Archived {archived['partition']}: {archived['rows']} rows -> {archived['file']}")
+    else:
+        print("Usage: python partitions.py [ensure|archive [retention_months]]")
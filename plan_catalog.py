@@ -0,0 +1,230 @@
+"""
+Process-local cache of ``planes_suscripcion_legal``.
+
+Plans change a few times a year but are needed on every subscription check,
+so the whole table is loaded once and served from memory as immutable
+``Plan`` objects, keyed by ``id`` and ``codigo``.
+
+Staleness is detected with a one-row fingerprint query (row count,
+``max(updated_at)``, ``sum(version)``) run at most every ``poll_interval``
+seconds; the catalog reloads only when the fingerprint changes. Processes
+that want changes pushed instead call ``listen()``, which reloads on the
+``plan_catalog`` NOTIFY channel fed by a trigger in ``schema.sql``.
+"""
+import logging
+import select
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import text
+
+import database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 30.0
+NOTIFY_CHANNEL = 'plan_catalog'
+# Reconnect delays (seconds) of the NOTIFY listener after a database error
+LISTEN_RETRY_MIN = 1.0
+LISTEN_RETRY_MAX = 60.0
+
+PLANS_SQL = text("""
+SELECT id, codigo, nombre, descripcion, tipo_cliente, precio_mensual, precio_anual, moneda,
+       max_abogados, max_casos_activos, max_consultas_mes, max_documentos, features,
+       activo, visible, orden_display, version, updated_at
+FROM planes_suscripcion_legal
+ORDER BY orden_display, codigo
+""")
+
+FINGERPRINT_SQL = text("""
+SELECT COUNT(*), MAX(updated_at), COALESCE(SUM(version), 0) FROM planes_suscripcion_legal
+""")
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Immutable snapshot of one subscription plan."""
+    id: object
+    codigo: str
+    nombre: str
+    descripcion: Optional[str]
+    tipo_cliente: str
+    precio_mensual: Optional[Decimal]
+    precio_anual: Optional[Decimal]
+    moneda: str
+    max_abogados: Optional[int]
+    max_casos_activos: Optional[int]
+    max_consultas_mes: Optional[int]
+    max_documentos: Optional[int]
+    features: Mapping[str, object]
+    activo: bool
+    visible: bool
+    orden_display: int
+    version: int
+    updated_at: object
+
+    @classmethod
+    def from_row(cls, row) -> 'Plan':
+        values = dict(row)
+        values['features'] = _freeze(values.get('features') or {})
+        return cls(**values)
+
+    def has_feature(self, name: str) -> bool:
+        return bool(self.features.get(name))
+
+
+class PlanCatalog:
+    """Thread-safe plan cache with fingerprint polling and optional NOTIFY push."""
+
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL, database_url: Optional[str] = None):
+        self.poll_interval = poll_interval
+        self.database_url = database_url
+        self._lock = threading.Lock()
+        self._by_id: Mapping[object, Plan] = MappingProxyType({})
+        self._by_codigo: Mapping[str, Plan] = MappingProxyType({})
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at = float('-inf')
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def load(self):
+        """(Re)load every plan in one query."""
+        with database.get_engine(self.database_url).connect() as conn:
+            fingerprint = tuple(conn.execute(FINGERPRINT_SQL).first())
+            plans = [Plan.from_row(row) for row in conn.execute(PLANS_SQL).mappings()]
+        by_id: Dict[object, Plan] = {p.id: p for p in plans}
+        by_codigo: Dict[str, Plan] = {p.codigo: p for p in plans}
+        with self._lock:
+            # Swap whole mappings so readers never see a half-built catalog
+            self._by_id = MappingProxyType(by_id)
+            self._by_codigo = MappingProxyType(by_codigo)
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+        logger.debug("Plan catalog loaded: %d plans", len(plans))
+
+    def refresh_if_stale(self, force: bool = False) -> bool:
+        """Reload when the fingerprint changed. Polls at most every ``poll_interval``."""
+        now = time.monotonic()
+        if not force and self._fingerprint is not None and now - self._checked_at < self.poll_interval:
+            return False
+        if self._fingerprint is None:
+            self.load()
+            return True
+        with database.get_engine(self.database_url).connect() as conn:
+            fingerprint = tuple(conn.execute(FINGERPRINT_SQL).first())
+        self._checked_at = now
+        if fingerprint == self._fingerprint:
+            return False
+        self.load()
+        return True
+
+    def invalidate(self):
+        """Force a fingerprint check on the next lookup."""
+        self._checked_at = float('-inf')
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def get(self, plan_id) -> Optional[Plan]:
+        self.refresh_if_stale()
+        return self._by_id.get(plan_id)
+
+    def by_codigo(self, codigo: str) -> Optional[Plan]:
+        self.refresh_if_stale()
+        return self._by_codigo.get(codigo)
+
+    def codigo(self, plan_id) -> Optional[str]:
+        plan = self.get(plan_id) if plan_id is not None else None
+        return plan.codigo if plan else None
+
+    def all(self, visible_only: bool = False) -> List[Plan]:
+        self.refresh_if_stale()
+        plans = list(self._by_id.values())
+        return [p for p in plans if p.visible and p.activo] if visible_only else plans
+
+    # ------------------------------------------------------------------
+    # Push invalidation
+    # ------------------------------------------------------------------
+    def _listen(self):
+        delay = LISTEN_RETRY_MIN
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self._listen_once()
+            except Exception:
+                if time.monotonic() - started > LISTEN_RETRY_MAX:
+                    # The connection was up for a while: start backing off afresh
+                    delay = LISTEN_RETRY_MIN
+                logger.exception("Plan catalog listener failed; reconnecting in %.0fs", delay)
+                # Polling keeps working meanwhile; make the next lookup check
+                self.invalidate()
+                if self._stop.wait(delay):
+                    return
+                delay = min(delay * 2, LISTEN_RETRY_MAX)
+            else:
+                return
+
+    def _listen_once(self):
+        raw = database.get_engine(self.database_url).raw_connection()
+        try:
+            dbapi_conn = raw.driver_connection
+            dbapi_conn.autocommit = True
+            with dbapi_conn.cursor() as cur:
+                cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Changes made while the listener was down sent no NOTIFY we saw
+            self.invalidate()
+            while not self._stop.is_set():
+                if select.select([dbapi_conn], [], [], 1.0) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                if dbapi_conn.notifies:
+                    dbapi_conn.notifies.clear()
+                    try:
+                        self.load()
+                    except Exception:
+                        logger.exception("Plan catalog reload after NOTIFY failed")
+                        self.invalidate()
+        finally:
+            raw.invalidate()
+
+    def listen(self):
+        """Reload on ``NOTIFY plan_catalog`` from a background thread (psycopg2 only)."""
+        if self._listener is None or not self._listener.is_alive():
+            self._stop.clear()
+            self._listener = threading.Thread(target=self._listen, name='plan-catalog-listener', daemon=True)
+            self._listener.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+
+
+_catalog: Optional[PlanCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_plan_catalog() -> PlanCatalog:
+    """Process-wide catalog, loaded on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = PlanCatalog()
+            _catalog.load()
+        return _catalog
@@ -0,0 +1,302 @@
+"""
+Write-behind usage counters and quota enforcement for ``suscripciones_legales``.
+
+Consultation and active-case checks are answered from memory:
+
+- limits are the plan limits (``max_consultas_mes``, ``max_casos_activos``,
+  served by ``plan_catalog``) overridden by the subscription's
+  ``limites_custom``;
+- usage is the last value read from the database plus this process's pending
+  deltas, updated atomically under a lock;
+- pending deltas are flushed periodically as relative increments
+  (``col = col + delta``) in one batched UPDATE, so the hot subscription row is
+  touched once per flush interval instead of once per consultation.
+
+Across processes enforcement is approximate: other nodes' usage becomes
+visible after their next flush and this node's next limits refresh.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+import database
+from plan_catalog import PlanCatalog, get_plan_catalog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_LIMITS_TTL = 60.0
+RESET_CHUNK_SIZE = 5000
+
+# Subscription states that may consume quota
+ACTIVE_STATES = frozenset({'trial', 'activa'})
+
+_LIMIT_FIELDS = {'consultas': 'max_consultas_mes', 'casos': 'max_casos_activos'}
+_DELTA_INDEX = {'consultas': 0, 'casos': 1}
+
+SUBSCRIPTION_SQL = text("""
+SELECT plan_id, estado, consultas_usadas_mes, casos_activos_actual, limites_custom
+FROM suscripciones_legales
+WHERE id = :id
+""")
+
+FLUSH_SQL = text("""
+UPDATE suscripciones_legales SET
+    consultas_usadas_mes = GREATEST(COALESCE(consultas_usadas_mes, 0) + :consultas, 0),
+    casos_activos_actual = GREATEST(COALESCE(casos_activos_actual, 0) + :casos, 0)
+WHERE id = :id
+""")
+
+RESET_CHUNK_SQL = text("""
+WITH chunk AS (
+    SELECT id FROM suscripciones_legales
+    WHERE consultas_usadas_mes <> 0 AND id > :after
+    ORDER BY id
+    LIMIT :limit
+)
+UPDATE suscripciones_legales s SET consultas_usadas_mes = 0
+FROM chunk WHERE s.id = chunk.id
+RETURNING s.id
+""")
+
+
+@dataclass(frozen=True)
+class QuotaLimits:
+    """Merged plan + custom limits; None means unlimited."""
+    max_consultas_mes: Optional[int]
+    max_casos_activos: Optional[int]
+    activa: bool
+
+
+@dataclass(frozen=True)
+class QuotaDecision:
+    allowed: bool
+    used: int
+    limit: Optional[int]
+    reason: Optional[str] = None
+
+
+def merge_limits(plan_consultas: Optional[int], plan_casos: Optional[int],
+                 limites_custom: Optional[dict], estado: Optional[str]) -> QuotaLimits:
+    """Apply ``limites_custom`` overrides on top of the plan limits."""
+    custom = limites_custom or {}
+    return QuotaLimits(
+        max_consultas_mes=custom.get('max_consultas_mes', plan_consultas),
+        max_casos_activos=custom.get('max_casos_activos', plan_casos),
+        activa=(estado or 'activa') in ACTIVE_STATES,
+    )
+
+
+class _Counter:
+    """Last database values and limits for one subscription."""
+    __slots__ = ('plan_id', 'limites_custom', 'estado', 'loaded_at', 'consultas_base', 'casos_base')
+
+    def __init__(self, plan_id, limites_custom: Optional[dict], estado: Optional[str], consultas: int, casos: int,
+                 loaded_at: float):
+        self.plan_id = plan_id
+        self.limites_custom = limites_custom
+        self.estado = estado
+        self.loaded_at = loaded_at
+        self.consultas_base = consultas
+        self.casos_base = casos
+
+
+class QuotaService:
+    """
+    In-memory quota counters with periodic write-behind.
+
+    Unflushed deltas are kept per subscription apart from the counters, so a
+    counter refreshed from the database never takes deltas with it. While a
+    flush is running its deltas are "in flight" and still count as usage.
+    """
+
+    def __init__(self, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 limits_ttl: float = DEFAULT_LIMITS_TTL, database_url: Optional[str] = None,
+                 catalog: Optional[PlanCatalog] = None):
+        self.catalog = catalog or get_plan_catalog()
+        self.flush_interval = flush_interval
+        self.limits_ttl = limits_ttl
+        self.database_url = database_url
+        self._lock = threading.Lock()
+        # Serializes flushes with each other and with reset_monthly
+        self._flush_lock = threading.Lock()
+        self._counters: Dict[object, _Counter] = {}
+        self._deltas: Dict[object, List[int]] = {}
+        self._inflight: Dict[object, List[int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def _load(self, suscripcion_id) -> _Counter:
+        started = time.monotonic()
+        with database.get_engine(self.database_url).connect() as conn:
+            row = conn.execute(SUBSCRIPTION_SQL, {"id": suscripcion_id}).mappings().first()
+        if row is None:
+            raise LookupError(f"Subscription {suscripcion_id} not found")
+        return _Counter(row['plan_id'], row['limites_custom'], row['estado'],
+                        row['consultas_usadas_mes'] or 0, row['casos_activos_actual'] or 0, started)
+
+    def _merged(self, counter: _Counter) -> QuotaLimits:
+        plan = self.catalog.get(counter.plan_id)
+        if plan is None:
+            raise LookupError(f"Plan {counter.plan_id} not found in catalog")
+        return merge_limits(plan.max_consultas_mes, plan.max_casos_activos, counter.limites_custom, counter.estado)
+
+    def _counter(self, suscripcion_id) -> _Counter:
+        counter = self._counters.get(suscripcion_id)
+        if counter is not None and time.monotonic() - counter.loaded_at < self.limits_ttl:
+            return counter
+        fresh = self._load(suscripcion_id)
+        with self._lock:
+            self._counters[suscripcion_id] = fresh
+        return fresh
+
+    def _used(self, suscripcion_id, counter: _Counter, field: str) -> int:
+        """Base value plus in-flight and pending deltas; call with ``_lock`` held."""
+        index = _DELTA_INDEX[field]
+        used = getattr(counter, field + '_base')
+        for deltas in (self._inflight, self._deltas):
+            pending = deltas.get(suscripcion_id)
+            if pending is not None:
+                used += pending[index]
+        return used
+
+    def limits(self, suscripcion_id) -> QuotaLimits:
+        """Merged limits for a subscription."""
+        return self._merged(self._counter(suscripcion_id))
+
+    def invalidate(self, suscripcion_id=None):
+        """Force limits/usage to be re-read on next use (all subscriptions if None)."""
+        with self._lock:
+            targets = [suscripcion_id] if suscripcion_id is not None else list(self._counters)
+            for key in targets:
+                counter = self._counters.get(key)
+                if counter is not None:
+                    counter.loaded_at = float('-inf')
+
+    # ------------------------------------------------------------------
+    # Checks
+    # ------------------------------------------------------------------
+    def _consume(self, suscripcion_id, field: str, amount: int) -> QuotaDecision:
+        limits = self._merged(self._counter(suscripcion_id))
+        limit = getattr(limits, _LIMIT_FIELDS[field])
+        with self._lock:
+            used = self._used(suscripcion_id, self._counters[suscripcion_id], field)
+            if not limits.activa:
+                return QuotaDecision(False, used, limit, 'suscripcion_inactiva')
+            if amount > 0 and limit is not None and used + amount > limit:
+                return QuotaDecision(False, used, limit, 'limite_alcanzado')
+            self._deltas.setdefault(suscripcion_id, [0, 0])[_DELTA_INDEX[field]] += amount
+            return QuotaDecision(True, used + amount, limit)
+
+    def check_consulta(self, suscripcion_id) -> QuotaDecision:
+        """Allow and count one consultation if the monthly limit permits."""
+        return self._consume(suscripcion_id, 'consultas', 1)
+
+    def open_caso(self, suscripcion_id) -> QuotaDecision:
+        """Allow and count one more active case if the limit permits."""
+        return self._consume(suscripcion_id, 'casos', 1)
+
+    def close_caso(self, suscripcion_id) -> QuotaDecision:
+        """Release one active case."""
+        return self._consume(suscripcion_id, 'casos', -1)
+
+    # ------------------------------------------------------------------
+    # Write-behind
+    # ------------------------------------------------------------------
+    def flush(self) -> int:
+        """Write pending deltas in one batched UPDATE. Returns subscriptions touched."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        started = time.monotonic()
+        with self._lock:
+            pending = {sid: d for sid, d in self._deltas.items() if d[0] or d[1]}
+            self._deltas = {}
+            self._inflight = pending
+        if not pending:
+            return 0
+        try:
+            with database.get_engine(self.database_url).begin() as conn:
+                conn.execute(FLUSH_SQL, [
+                    {"id": sid, "consultas": consultas, "casos": casos}
+                    for sid, (consultas, casos) in sorted(pending.items(), key=lambda p: str(p[0]))
+                ])
+        except Exception:
+            with self._lock:
+                # Hand the deltas back to whatever counter is current now
+                for sid, (consultas, casos) in pending.items():
+                    deltas = self._deltas.setdefault(sid, [0, 0])
+                    deltas[0] += consultas
+                    deltas[1] += casos
+                self._inflight = {}
+            raise
+        with self._lock:
+            for sid, (consultas, casos) in pending.items():
+                counter = self._counters.get(sid)
+                if counter is None:
+                    continue
+                if counter.loaded_at < started:
+                    counter.consultas_base += consultas
+                    counter.casos_base += casos
+                else:
+                    # Re-read during the flush: the base may or may not include it
+                    counter.loaded_at = float('-inf')
+            self._inflight = {}
+        return len(pending)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Quota flush failed; deltas kept for the next attempt")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='quota-flusher', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the flusher and write any remaining deltas."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # Monthly reset
+    # ------------------------------------------------------------------
+    def reset_monthly(self, chunk_size: int = RESET_CHUNK_SIZE) -> int:
+        """
+        Zero ``consultas_usadas_mes`` for every subscription in chunks (one
+        short transaction each) and reset the in-memory base values.
+        """
+        with self._flush_lock:
+            # Usage recorded before the reset is written first. Consultations
+            # counted while it runs stay pending and are flushed afterwards,
+            # so they count towards the new month.
+            self._flush()
+            engine = database.get_engine(self.database_url)
+            total = 0
+            after = '00000000-0000-0000-0000-000000000000'
+            while True:
+                with engine.begin() as conn:
+                    ids = [row[0] for row in conn.execute(RESET_CHUNK_SQL, {"after": after, "limit": chunk_size})]
+                if not ids:
+                    break
+                total += len(ids)
+                after = max(ids, key=str)
+            with self._lock:
+                for counter in self._counters.values():
+                    counter.consultas_base = 0
+        return total
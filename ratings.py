@@ -0,0 +1,203 @@
+"""
+Incremental rating aggregation for SOAT Connect Lawyer Registry.
+
+Keeps ``abogados.calificacion_promedio`` / ``total_valoraciones`` in step with
+``abogados_valoraciones`` without re-aggregating. Each lawyer carries a
+running ``suma_calificaciones``; inserts, deletes, rating edits and
+``verificado`` flips are turned into (sum, count) deltas and applied in the
+same transaction as the review change. Only verified reviews count, matching
+the public "Verified reviews public" policy. The stored values of updated and
+deleted reviews are read in one query just before the flush, since attribute
+history does not reliably hold them (expired attributes, moved reviews).
+
+``recompute_all`` is the repair path: it walks lawyers in id order and
+recounts them in chunks, one short transaction per chunk. Upgraded databases
+get ``suma_calificaciones`` backfilled by the schema migration that adds it.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import Boolean, Integer, bindparam, event, inspect, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.orm import Session
+
+import database
+from models import AbogadoValoracion
+
+DEFAULT_CHUNK_SIZE = 5000
+
+APPLY_DELTA_SQL = text("""
+UPDATE abogados SET
+    suma_calificaciones = COALESCE(suma_calificaciones, 0) + :suma,
+    total_valoraciones = COALESCE(total_valoraciones, 0) + :total,
+    calificacion_promedio = CASE
+        WHEN COALESCE(total_valoraciones, 0) + :total > 0
+        THEN ROUND((COALESCE(suma_calificaciones, 0) + :suma)::numeric
+                   / (COALESCE(total_valoraciones, 0) + :total), 2)
+        ELSE 0 END
+WHERE id = :abogado_id
+""")
+
+RECOUNT_SQL = text("""
+UPDATE abogados a SET
+    suma_calificaciones = agg.suma,
+    total_valoraciones = agg.total,
+    calificacion_promedio = CASE WHEN agg.total > 0 THEN ROUND(agg.suma::numeric / agg.total, 2) ELSE 0 END
+FROM (
+    SELECT ids.id, COALESCE(SUM(v.calificacion), 0) AS suma, COUNT(v.id) AS total
+    FROM unnest(:ids) AS ids(id)
+    LEFT JOIN abogados_valoraciones v ON v.abogado_id = ids.id AND v.verificado = TRUE
+    GROUP BY ids.id
+) agg
+WHERE a.id = agg.id
+  AND (a.suma_calificaciones IS DISTINCT FROM agg.suma OR a.total_valoraciones IS DISTINCT FROM agg.total)
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+NEXT_CHUNK_SQL = text("SELECT id FROM abogados WHERE id > :after ORDER BY id LIMIT :limit")
+FIRST_CHUNK_SQL = text("SELECT id FROM abogados ORDER BY id LIMIT :limit")
+
+PREVIOUS_SQL = text("""
+SELECT id, abogado_id, calificacion, verificado FROM abogados_valoraciones WHERE id = ANY(:ids)
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True)))).columns(
+    id=UUID(as_uuid=True), abogado_id=UUID(as_uuid=True), calificacion=Integer, verificado=Boolean,
+)
+
+_REVIEW_FIELDS = ('abogado_id', 'calificacion', 'verificado')
+
+# session.info key holding stored review values read before a flush
+_PREVIOUS_KEY = 'ratings_previous'
+
+
+def _contribution(calificacion, verificado) -> Tuple[int, int]:
+    """(sum, count) a single review adds to its lawyer's aggregate."""
+    if verificado and calificacion is not None:
+        return int(calificacion), 1
+    return 0, 0
+
+
+class RatingDeltas:
+    """Accumulates per-lawyer (sum, count) deltas for one flush/batch."""
+
+    def __init__(self):
+        self.deltas: Dict[object, List[int]] = defaultdict(lambda: [0, 0])
+        self.recount: Set[object] = set()
+
+    def add(self, abogado_id, calificacion, verificado, sign: int = 1):
+        suma, total = _contribution(calificacion, verificado)
+        if abogado_id is not None and total:
+            entry = self.deltas[abogado_id]
+            entry[0] += sign * suma
+            entry[1] += sign * total
+
+    def inserted(self, review: AbogadoValoracion):
+        self.add(review.abogado_id, review.calificacion, review.verificado)
+
+    def deleted(self, review: AbogadoValoracion, previous: Optional[Tuple] = None):
+        if previous is None:
+            previous = (review.abogado_id, review.calificacion, review.verificado)
+        self.add(*previous, sign=-1)
+
+    def updated(self, review: AbogadoValoracion, previous: Optional[Tuple]):
+        """
+        Delta for an updated review from its stored ``previous`` (abogado_id,
+        calificacion, verificado). A review moved to another lawyer counts
+        against both.
+        """
+        if previous is None:
+            # Row not found before the flush; fall back to an exact recount
+            self.recount.add(review.abogado_id)
+            return
+        # Attributes still expired after the flush were not changed
+        loaded = inspect(review).dict
+        current = [loaded[key] if key in loaded else value for key, value in zip(_REVIEW_FIELDS, previous)]
+        self.add(*previous, sign=-1)
+        self.add(*current)
+
+    def apply(self, conn):
+        """Write the accumulated deltas (sorted by lawyer to keep lock order stable)."""
+        rows = [
+            {"abogado_id": abogado_id, "suma": suma, "total": total}
+            for abogado_id, (suma, total) in sorted(self.deltas.items(), key=lambda kv: str(kv[0]))
+            if suma or total
+        ]
+        if rows:
+            conn.execute(APPLY_DELTA_SQL, rows)
+        if self.recount:
+            recount(conn, self.recount)
+
+
+def recount(conn, abogado_ids: Iterable) -> int:
+    """Exact recount for specific lawyers (index scan per lawyer). Returns rows fixed."""
+    ids = sorted(set(abogado_ids), key=str)
+    if not ids:
+        return 0
+    return conn.execute(RECOUNT_SQL, {"ids": ids}).rowcount
+
+
+# ============================================================================
+# Session hooks
+# ============================================================================
+def _before_flush(session: Session, flush_context, instances):
+    # Attribute history cannot be trusted for old values: an attribute set on
+    # an expired review has none, and a later load of the row can report the
+    # pending value as unchanged. Read the stored values instead.
+    ids = [inspect(obj).identity[0] for obj in list(session.dirty) + list(session.deleted)
+           if isinstance(obj, AbogadoValoracion) and inspect(obj).identity]
+    previous = {}
+    if ids:
+        for row in session.connection().execute(PREVIOUS_SQL, {"ids": ids}):
+            previous[row[0]] = tuple(row[1:])
+    session.info[_PREVIOUS_KEY] = previous
+
+
+def _after_flush(session: Session, flush_context):
+    previous = session.info.pop(_PREVIOUS_KEY, {})
+    deltas = RatingDeltas()
+    for obj in session.new:
+        if isinstance(obj, AbogadoValoracion):
+            deltas.inserted(obj)
+    for obj in session.deleted:
+        if isinstance(obj, AbogadoValoracion):
+            deltas.deleted(obj, previous.get(inspect(obj).identity[0]))
+    for obj in session.dirty:
+        if isinstance(obj, AbogadoValoracion) and inspect(obj).identity:
+            deltas.updated(obj, previous.get(inspect(obj).identity[0]))
+    if deltas.deltas or deltas.recount:
+        deltas.apply(session.connection())
+
+
+def register_rating_hooks(target=Session):
+    """
+    Keep lawyer rating aggregates current on every ORM flush of ``target``
+    (a Session class, sessionmaker or session). Bulk ``update()``/``delete()``
+    statements bypass the flush; follow them with ``recount``.
+    """
+    if not event.contains(target, 'after_flush', _after_flush):
+        event.listen(target, 'before_flush', _before_flush)
+        event.listen(target, 'after_flush', _after_flush)
+
+
+# ============================================================================
+# Repair
+# ============================================================================
+def recompute_all(chunk_size: int = DEFAULT_CHUNK_SIZE, database_url: Optional[str] = None) -> dict:
+    """
+    Recount every lawyer's aggregate in chunks of ``chunk_size`` lawyers.
+    Each chunk is its own transaction, so locks are short and progress survives
+    interruption. Returns counts of lawyers scanned and rows corrected.
+    """
+    engine = database.get_engine(database_url)
+    scanned = fixed = 0
+    after = None
+    while True:
+        with engine.begin() as conn:
+            if after is None:
+                ids = [row[0] for row in conn.execute(FIRST_CHUNK_SQL, {"limit": chunk_size})]
+            else:
+                ids = [row[0] for row in conn.execute(NEXT_CHUNK_SQL, {"after": after, "limit": chunk_size})]
+            if not ids:
+                break
+            fixed += recount(conn, ids)
+        scanned += len(ids)
+        after = ids[-1]
+    return {"scanned": scanned, "fixed": fixed}
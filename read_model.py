@@ -0,0 +1,123 @@
+"""
+Maintenance for the ``abogados_directorio`` read model.
+
+The table is kept in step with ``abogados`` and its organization, subscription
+and plan by statement-level triggers in ``schema.sql``, each calling
+``refresh_abogados_directorio(ids)`` for just the lawyers a statement touched.
+
+Under READ COMMITTED two concurrent writers can still leave a row stale (a
+lawyer update and an organization rename committing at the same time each
+see the other's old value). ``rebuild`` is the repair path: it walks lawyers
+in id order and re-syncs them in chunks, one short transaction per chunk, so
+it can run alongside normal traffic. ``check`` reports rows that differ from
+the live tables without changing anything.
+"""
+import sys
+from typing import Iterable, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+import database
+
+DEFAULT_CHUNK_SIZE = 5000
+
+REFRESH_SQL = text("SELECT refresh_abogados_directorio(:ids)").bindparams(
+    bindparam('ids', type_=ARRAY(UUID(as_uuid=True)))
+)
+
+NEXT_CHUNK_SQL = text("SELECT id FROM abogados WHERE id > :after ORDER BY id LIMIT :limit")
+FIRST_CHUNK_SQL = text("SELECT id FROM abogados ORDER BY id LIMIT :limit")
+
+# Columns exposed through v_abogados_activos, compared by ``check``
+DIRECTORY_COLUMNS = (
+    "id, nombres, apellidos, tarjeta_profesional, email, telefono, departamento, municipio, "
+    "departamentos_cobertura, especialidades, anos_experiencia, casos_soat_atendidos, "
+    "nombre_bufete, tipo_practica, sitio_web, descripcion_servicios, tarifa_consulta, "
+    "calificacion_promedio, total_valoraciones, tasa_respuesta, tiempo_respuesta_promedio, "
+    "disponibilidad, acepta_casos_emergencia, organizacion_id, suscripcion_id, "
+    "perfil_scoring, segmento, nombre_organizacion, plan_codigo, created_at, "
+    "municipios_cobertura, idiomas, cobertura_nacional, updated_at, plan_id"
+)
+
+LIVE_SQL = """
+SELECT a.id, a.nombres, a.apellidos, a.tarjeta_profesional, a.email, a.telefono,
+    a.departamento, a.municipio, a.departamentos_cobertura, a.especialidades,
+    a.anos_experiencia, a.casos_soat_atendidos, a.nombre_bufete, a.tipo_practica,
+    a.sitio_web, a.descripcion_servicios, a.tarifa_consulta,
+    a.calificacion_promedio, a.total_valoraciones,
+    a.tasa_respuesta, a.tiempo_respuesta_promedio,
+    a.disponibilidad, a.acepta_casos_emergencia,
+    a.organizacion_id, a.suscripcion_id,
+    a.perfil_scoring, a.segmento,
+    ol.nombre_comercial, psl.codigo, a.created_at,
+    a.municipios_cobertura, a.idiomas, a.cobertura_nacional,
+    a.updated_at, sl.plan_id
+FROM abogados a
+LEFT JOIN organizaciones_legales ol ON a.organizacion_id = ol.id
+LEFT JOIN suscripciones_legales sl ON a.suscripcion_id = sl.id
+LEFT JOIN planes_suscripcion_legal psl ON sl.plan_id = psl.id
+WHERE a.estado_verificacion = 'verificado' AND a.activo = TRUE
+"""
+
+DRIFT_SQL = text(f"""
+WITH live AS ({LIVE_SQL}),
+stored AS (SELECT {DIRECTORY_COLUMNS} FROM abogados_directorio)
+SELECT
+    (SELECT COUNT(*) FROM (SELECT * FROM live EXCEPT SELECT * FROM stored) m) AS stale_or_missing,
+    (SELECT COUNT(*) FROM (SELECT * FROM stored EXCEPT SELECT * FROM live) x) AS stale_or_extra
+""")
+
+
+def refresh(conn, ids: Iterable) -> int:
+    """Re-sync ``ids`` in the caller's transaction; returns rows changed."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    return conn.execute(REFRESH_SQL, {"ids": ids}).scalar() or 0
+
+
+def rebuild(chunk_size: int = DEFAULT_CHUNK_SIZE, database_url: Optional[str] = None) -> dict:
+    """
+    Re-sync every lawyer in chunks of ``chunk_size``. Unchanged rows are not
+    rewritten, so a rebuild of an up-to-date table only reads. Returns counts
+    of lawyers scanned and directory rows changed.
+    """
+    engine = database.get_engine(database_url)
+    scanned = changed = 0
+    after = None
+    while True:
+        with engine.begin() as conn:
+            if after is None:
+                ids: List = [row[0] for row in conn.execute(FIRST_CHUNK_SQL, {"limit": chunk_size})]
+            else:
+                ids = [row[0] for row in conn.execute(NEXT_CHUNK_SQL, {"after": after, "limit": chunk_size})]
+            if not ids:
+                break
+            changed += refresh(conn, ids)
+        scanned += len(ids)
+        after = ids[-1]
+    return {"scanned": scanned, "changed": changed}
+
+
+def check(database_url: Optional[str] = None) -> dict:
+    """
+    Compare the read model with the live join. ``stale_or_missing`` counts
+    live rows with no identical stored row; ``stale_or_extra`` the reverse.
+    Both are 0 when the table is in sync.
+    """
+    with database.get_engine(database_url).connect() as conn:
+        row = conn.execute(DRIFT_SQL).mappings().one()
+    return dict(row)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        size = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CHUNK_SIZE
+        print(rebuild(chunk_size=size))
+    elif len(sys.argv) > 1 and sys.argv[1] == "check":
+        result = check()
+        print(result)
+        sys.exit(1 if any(result.values()) else 0)
+    else:
+        print("Usage: python read_model.py [rebuild [chunk_size]|check]")
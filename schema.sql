@@ -6,6 +6,8 @@
 
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
+CREATE EXTENSION IF NOT EXISTS "unaccent";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
 
 -- ============================================================================
 -- 1. Organizations / Bufetes (Law Firms)
@@ -206,6 +208,7 @@ CREATE TABLE IF NOT EXISTS abogados (
     -- Performance & Ratings (cached)
     calificacion_promedio NUMERIC(3,2) DEFAULT 0,
     total_valoraciones INTEGER DEFAULT 0,
+    suma_calificaciones INTEGER DEFAULT 0, -- running sum of verified ratings
     tasa_respuesta NUMERIC(5,2) DEFAULT 0, -- percentage
     tiempo_respuesta_promedio INTEGER DEFAULT 0, -- minutes
     
@@ -228,6 +231,9 @@ CREATE TABLE IF NOT EXISTS abogados (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Columns added after v2.0.0 (for databases created from an earlier schema)
+ALTER TABLE abogados ADD COLUMN IF NOT EXISTS suma_calificaciones INTEGER DEFAULT 0;
+
 -- Indexes
 CREATE INDEX IF NOT EXISTS idx_abogados_email ON abogados(email);
 CREATE INDEX IF NOT EXISTS idx_abogados_tarjeta ON abogados(tarjeta_profesional);
@@ -283,12 +289,166 @@ CREATE TABLE IF NOT EXISTS abogados_valoraciones (
 
 CREATE INDEX IF NOT EXISTS idx_valoraciones_abogado ON abogados_valoraciones(abogado_id);
 CREATE INDEX IF NOT EXISTS idx_valoraciones_calificacion ON abogados_valoraciones(calificacion);
+CREATE INDEX IF NOT EXISTS idx_valoraciones_abogado_verificadas ON abogados_valoraciones(abogado_id, calificacion)
+    WHERE verificado = TRUE;
+-- Keyset pagination of a lawyer's verified reviews, newest first
+CREATE INDEX IF NOT EXISTS idx_valoraciones_abogado_created ON abogados_valoraciones(abogado_id, created_at DESC, id DESC)
+    WHERE verificado = TRUE;
+
+-- Backfill suma_calificaciones for databases that predate the column (it starts
+-- at 0 while total_valoraciones is not), so incremental updates in ratings.py
+-- start from the real sum. Rows already in step are left alone.
+UPDATE abogados a SET
+    suma_calificaciones = agg.suma,
+    total_valoraciones = agg.total,
+    calificacion_promedio = CASE WHEN agg.total > 0 THEN ROUND(agg.suma::numeric / agg.total, 2) ELSE 0 END
+FROM (
+    SELECT ab.id, COALESCE(SUM(v.calificacion), 0) AS suma, COUNT(v.id) AS total
+    FROM abogados ab
+    LEFT JOIN abogados_valoraciones v ON v.abogado_id = ab.id AND v.verificado = TRUE
+    GROUP BY ab.id
+) agg
+WHERE a.id = agg.id
+  AND (a.suma_calificaciones IS DISTINCT FROM agg.suma OR a.total_valoraciones IS DISTINCT FROM agg.total);
 
 -- ============================================================================
--- 7. Event Log (Timestamps para todos los eventos)
+-- Log partitions: monthly range partitions plus a DEFAULT catch-all.
+-- Run periodically (partitions.ensure_partitions) to keep months ahead ready.
 -- ============================================================================
+-- Create the partition of p_parent for the month starting at p_month. Rows that
+-- already landed in the DEFAULT partition for that month (a missed ensure run)
+-- are moved into it first, since attaching over them would fail.
+CREATE OR REPLACE FUNCTION create_month_partition(p_parent TEXT, p_month DATE)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_name TEXT := p_parent || '_' || to_char(p_month, 'YYYY_MM');
+    v_default TEXT := p_parent || '_default';
+    v_from DATE := date_trunc('month', p_month)::date;
+    v_to DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::date;
+    v_column TEXT;
+    v_stray BOOLEAN := FALSE;
+    v_moved BIGINT;
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    SELECT a.attname INTO v_column
+    FROM pg_partitioned_table pt
+    JOIN pg_attribute a ON a.attrelid = pt.partrelid AND a.attnum = pt.partattrs[0]
+    WHERE pt.partrelid = p_parent::regclass;
+
+    IF to_regclass(v_default) IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)',
+                       v_default, v_column, v_from, v_column, v_to) INTO v_stray;
+    END IF;
+
+    IF NOT v_stray THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       v_name, p_parent, v_from, v_to);
+        RETURN TRUE;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name, p_parent);
+    EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved',
+                   v_default, v_column, v_from, v_column, v_to, v_name);
+    GET DIAGNOSTICS v_moved = ROW_COUNT;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   p_parent, v_name, v_from, v_to);
+    RAISE WARNING 'Moved % row(s) of % from % into new partition %', v_moved, p_parent, v_default, v_name;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(p_parent TEXT, p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month DATE := date_trunc('month', CURRENT_DATE)::date;
+    v_created INTEGER := 0;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(p_parent) AND relkind = 'p') THEN
+        RAISE WARNING '% is not a partitioned table; no partitions created', p_parent;
+        RETURN 0;
+    END IF;
+    IF to_regclass(p_parent || '_default') IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', p_parent || '_default', p_parent);
+    END IF;
+    FOR i IN 0..p_months_ahead LOOP
+        IF create_month_partition(p_parent, v_month) THEN
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Upgrade path for databases created before the logs were partitioned: the plain
+-- table (and its indexes, so their names are free) is renamed out of the way
+-- before the partitioned parent is created ...
+CREATE OR REPLACE FUNCTION set_aside_unpartitioned(p_parent TEXT)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_index TEXT;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass(p_parent) AND relkind = 'r') THEN
+        RETURN FALSE;
+    END IF;
+    FOR v_index IN
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = p_parent::regclass
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', v_index, left(v_index, 50) || '_unpartitioned');
+    END LOOP;
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', p_parent, p_parent || '_unpartitioned');
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ... and its rows are copied into monthly partitions afterwards, then it is dropped.
+CREATE OR REPLACE FUNCTION copy_unpartitioned(p_parent TEXT, p_ts_column TEXT)
+RETURNS BIGINT AS $$
+DECLARE
+    v_old TEXT := p_parent || '_unpartitioned';
+    v_min TIMESTAMPTZ;
+    v_max TIMESTAMPTZ;
+    v_month DATE;
+    v_columns TEXT;
+    v_copied BIGINT;
+BEGIN
+    IF to_regclass(v_old) IS NULL THEN
+        RETURN 0;
+    END IF;
+    EXECUTE format('UPDATE %I SET %I = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE %I IS NULL',
+                   v_old, p_ts_column, p_ts_column);
+    EXECUTE format('SELECT min(%I), max(%I) FROM %I', p_ts_column, p_ts_column, v_old) INTO v_min, v_max;
+    IF v_min IS NOT NULL THEN
+        v_month := date_trunc('month', v_min)::date;
+        WHILE v_month <= v_max LOOP
+            PERFORM create_month_partition(p_parent, v_month);
+            v_month := (v_month + INTERVAL '1 month')::date;
+        END LOOP;
+    END IF;
+
+    SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum) INTO v_columns
+    FROM pg_attribute a
+    WHERE a.attrelid = p_parent::regclass AND a.attnum > 0 AND NOT a.attisdropped
+      AND EXISTS (SELECT 1 FROM pg_attribute o
+                  WHERE o.attrelid = v_old::regclass AND o.attname = a.attname AND NOT o.attisdropped);
+    EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM %I', p_parent, v_columns, v_columns, v_old);
+    GET DIAGNOSTICS v_copied = ROW_COUNT;
+    EXECUTE format('DROP TABLE %I', v_old);
+    RETURN v_copied;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================
+-- 7. Event Log (Timestamps para todos los eventos), partitioned by month
+-- ============================================================================
+SELECT set_aside_unpartitioned('event_log_legal');
+
 CREATE TABLE IF NOT EXISTS event_log_legal (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     actor_id UUID,
     actor_type VARCHAR(30) DEFAULT 'lawyer' CHECK (actor_type IN ('lawyer', 'admin', 'system', 'api_client', 'user')),
     organizacion_id UUID REFERENCES organizaciones_legales(id) ON DELETE SET NULL,
@@ -304,25 +464,86 @@ CREATE TABLE IF NOT EXISTS event_log_legal (
     integrity_hash VARCHAR(64),
     resultado VARCHAR(20) DEFAULT 'success' CHECK (resultado IN ('success', 'failure', 'warning', 'info')),
     error_message TEXT,
-    event_timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    event_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     processed BOOLEAN DEFAULT FALSE,
     processed_at TIMESTAMP WITH TIME ZONE,
     metadata JSONB DEFAULT '{}',
     schema_version INTEGER DEFAULT 1,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, event_timestamp)
+) PARTITION BY RANGE (event_timestamp);
 
-CREATE INDEX IF NOT EXISTS idx_event_log_legal_actor ON event_log_legal(actor_id);
+SELECT create_monthly_partitions('event_log_legal', 3);
+
+-- Keyset pagination of an actor's / organization's events (pagination.py)
+CREATE INDEX IF NOT EXISTS idx_event_log_legal_actor_keyset ON event_log_legal(actor_id, event_timestamp, id);
+DROP INDEX IF EXISTS idx_event_log_legal_actor;
+CREATE INDEX IF NOT EXISTS idx_event_log_legal_org_keyset ON event_log_legal(organizacion_id, event_timestamp, id);
 CREATE INDEX IF NOT EXISTS idx_event_log_legal_type ON event_log_legal(event_type);
 CREATE INDEX IF NOT EXISTS idx_event_log_legal_category ON event_log_legal(event_category);
-CREATE INDEX IF NOT EXISTS idx_event_log_legal_timestamp ON event_log_legal(event_timestamp);
 CREATE INDEX IF NOT EXISTS idx_event_log_legal_resource ON event_log_legal(resource_type, resource_id);
+-- Keyset order (event_timestamp, id); also serves plain timestamp ranges
+CREATE INDEX IF NOT EXISTS idx_event_log_legal_chain ON event_log_legal(event_timestamp, id);
+DROP INDEX IF EXISTS idx_event_log_legal_timestamp;
+-- Consumer claim queue: only unprocessed events are indexed
+CREATE INDEX IF NOT EXISTS idx_event_log_legal_unprocessed ON event_log_legal(event_timestamp)
+    WHERE processed = FALSE;
+-- Consumer retries (event_consumer.py): events past the attempt limit are no longer claimed
+ALTER TABLE event_log_legal ADD COLUMN IF NOT EXISTS process_attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE event_log_legal ADD COLUMN IF NOT EXISTS last_error TEXT;
+
+SELECT copy_unpartitioned('event_log_legal', 'event_timestamp');
+
+-- Integrity chain order (event_writer.py): taken from this sequence under the
+-- writers' advisory lock, so it follows commit order while event_timestamp
+-- keeps the time the event was emitted
+CREATE SEQUENCE IF NOT EXISTS event_log_legal_chain_seq;
+ALTER TABLE event_log_legal ADD COLUMN IF NOT EXISTS chain_seq BIGINT;
+CREATE INDEX IF NOT EXISTS idx_event_log_legal_chain_seq ON event_log_legal(chain_seq)
+    WHERE chain_seq IS NOT NULL;
+-- Chains written before chain_seq existed were linked in (event_timestamp, id) order
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM event_log_legal WHERE chain_seq IS NOT NULL) THEN
+        UPDATE event_log_legal e SET chain_seq = o.seq
+        FROM (SELECT id, event_timestamp, row_number() OVER (ORDER BY event_timestamp, id) AS seq
+              FROM event_log_legal WHERE integrity_hash IS NOT NULL) o
+        WHERE e.id = o.id AND e.event_timestamp = o.event_timestamp;
+        PERFORM setval('event_log_legal_chain_seq',
+                       COALESCE((SELECT MAX(chain_seq) FROM event_log_legal), 0) + 1, false);
+    END IF;
+END;
+$$;
+
+-- Verified positions in the integrity chain; later runs resume after the latest one
+CREATE TABLE IF NOT EXISTS event_log_integrity_checkpoints (
+    id BIGSERIAL PRIMARY KEY,
+    event_timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+    event_id UUID NOT NULL,
+    integrity_hash VARCHAR(64) NOT NULL,
+    events_verified BIGINT NOT NULL,
+    verified_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_integrity_checkpoints_position ON event_log_integrity_checkpoints(event_timestamp, event_id);
+-- Anchors written by partitions.archive_partitions at the last event of a dropped
+-- partition; verification of the remaining chain starts from the latest one
+ALTER TABLE event_log_integrity_checkpoints ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT FALSE;
+-- Chain position of the checkpointed event. Stays NULL for anchors whose
+-- partition was archived before the column existed.
+ALTER TABLE event_log_integrity_checkpoints ADD COLUMN IF NOT EXISTS chain_seq BIGINT;
+UPDATE event_log_integrity_checkpoints c SET chain_seq = e.chain_seq
+FROM event_log_legal e
+WHERE c.chain_seq IS NULL AND e.id = c.event_id AND e.event_timestamp = c.event_timestamp;
+CREATE INDEX IF NOT EXISTS idx_integrity_checkpoints_chain_seq ON event_log_integrity_checkpoints(chain_seq);
 
 -- ============================================================================
--- 8. Audit Log
+-- 8. Audit Log, partitioned by month
 -- ============================================================================
+SELECT set_aside_unpartitioned('audit_log_legal');
+
 CREATE TABLE IF NOT EXISTS audit_log_legal (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     actor_id UUID,
     actor_type VARCHAR(30) DEFAULT 'lawyer',
     actor_email VARCHAR(255),
@@ -335,15 +556,25 @@ CREATE TABLE IF NOT EXISTS audit_log_legal (
     ip_address INET,
     user_agent TEXT,
     request_id VARCHAR(100),
-    action_timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    action_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     metadata JSONB DEFAULT '{}',
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, action_timestamp)
+) PARTITION BY RANGE (action_timestamp);
+
+SELECT create_monthly_partitions('audit_log_legal', 3);
 
-CREATE INDEX IF NOT EXISTS idx_audit_legal_actor ON audit_log_legal(actor_id);
 CREATE INDEX IF NOT EXISTS idx_audit_legal_action ON audit_log_legal(action);
-CREATE INDEX IF NOT EXISTS idx_audit_legal_table ON audit_log_legal(table_name);
-CREATE INDEX IF NOT EXISTS idx_audit_legal_timestamp ON audit_log_legal(action_timestamp);
+-- Keyset pagination (pagination.py): (action_timestamp, id), optionally per actor / table / record
+CREATE INDEX IF NOT EXISTS idx_audit_legal_keyset ON audit_log_legal(action_timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_audit_legal_actor_keyset ON audit_log_legal(actor_id, action_timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_audit_legal_table_keyset ON audit_log_legal(table_name, action_timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_audit_legal_record_keyset ON audit_log_legal(record_id, action_timestamp, id);
+DROP INDEX IF EXISTS idx_audit_legal_actor;
+DROP INDEX IF EXISTS idx_audit_legal_table;
+DROP INDEX IF EXISTS idx_audit_legal_timestamp;
+
+SELECT copy_unpartitioned('audit_log_legal', 'action_timestamp');
 
 -- ============================================================================
 -- Triggers: Auto-update updated_at
@@ -368,6 +599,22 @@ BEGIN
 END;
 $$;
 
+-- ============================================================================
+-- Trigger: Push plan changes to process-local plan catalogs (plan_catalog.py)
+-- ============================================================================
+CREATE OR REPLACE FUNCTION notify_plan_catalog()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('plan_catalog', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_notify_plan_catalog ON planes_suscripcion_legal;
+CREATE TRIGGER trigger_notify_plan_catalog
+    AFTER INSERT OR UPDATE OR DELETE ON planes_suscripcion_legal
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_plan_catalog();
+
 -- ============================================================================
 -- Row Level Security
 -- ============================================================================
@@ -393,24 +640,309 @@ CREATE POLICY "Certifications public" ON abogados_certificaciones FOR SELECT
 CREATE POLICY "Verified reviews public" ON abogados_valoraciones FOR SELECT USING (verificado = TRUE);
 
 -- ============================================================================
--- View: Active verified lawyers with cached rating
+-- Read model: abogados_directorio
+-- Denormalized copy of verified, active lawyers with their organization and
+-- plan, maintained by statement-level triggers on abogados, organizaciones_legales,
+-- suscripciones_legales and planes_suscripcion_legal. Directory reads are
+-- single-table index scans. read_model.py rebuilds it in chunks as a fallback.
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS abogados_directorio (
+    id UUID PRIMARY KEY REFERENCES abogados(id) ON DELETE CASCADE,
+    nombres VARCHAR(100) NOT NULL,
+    apellidos VARCHAR(100) NOT NULL,
+    tarjeta_profesional VARCHAR(50) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    telefono VARCHAR(20) NOT NULL,
+    departamento VARCHAR(100) NOT NULL,
+    municipio VARCHAR(100) NOT NULL,
+    departamentos_cobertura TEXT[] NOT NULL DEFAULT '{}',
+    especialidades TEXT[] NOT NULL DEFAULT '{}',
+    anos_experiencia INTEGER,
+    casos_soat_atendidos INTEGER,
+    nombre_bufete VARCHAR(200),
+    tipo_practica VARCHAR(50),
+    sitio_web VARCHAR(255),
+    descripcion_servicios TEXT,
+    tarifa_consulta VARCHAR(100),
+    calificacion_promedio NUMERIC(3,2),
+    total_valoraciones INTEGER,
+    tasa_respuesta NUMERIC(5,2),
+    tiempo_respuesta_promedio INTEGER,
+    disponibilidad JSONB,
+    acepta_casos_emergencia BOOLEAN,
+    organizacion_id UUID,
+    suscripcion_id UUID,
+    perfil_scoring JSONB,
+    segmento VARCHAR(50),
+    nombre_organizacion VARCHAR(300),
+    plan_codigo VARCHAR(30),
+    created_at TIMESTAMP WITH TIME ZONE,
+    municipios_cobertura TEXT[],
+    idiomas TEXT[],
+    cobertura_nacional BOOLEAN,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    plan_id UUID,
+    -- Precomputed sort keys
+    rating_sort NUMERIC(3,2) NOT NULL DEFAULT 0,
+    nombre_sort TEXT NOT NULL,
+    -- Transaction time of the last change to this row (incremental sync watermark)
+    synced_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_directorio_rating ON abogados_directorio(rating_sort DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_directorio_created ON abogados_directorio(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_directorio_nombre ON abogados_directorio(nombre_sort, id);
+CREATE INDEX IF NOT EXISTS idx_directorio_departamento ON abogados_directorio(departamento, rating_sort DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_directorio_synced ON abogados_directorio(synced_at);
+CREATE INDEX IF NOT EXISTS idx_directorio_deptos_cobertura ON abogados_directorio USING GIN(departamentos_cobertura);
+CREATE INDEX IF NOT EXISTS idx_directorio_municipios_cobertura ON abogados_directorio USING GIN(municipios_cobertura);
+CREATE INDEX IF NOT EXISTS idx_directorio_especialidades ON abogados_directorio USING GIN(especialidades);
+CREATE INDEX IF NOT EXISTS idx_directorio_idiomas ON abogados_directorio USING GIN(idiomas);
+
+-- Accent-insensitive search (search.py). unaccent() is only STABLE because its
+-- dictionary can change; pin the dictionary so it can be used in generated columns.
+-- The extension may live outside public (Supabase installs it in "extensions"),
+-- so both the function and the dictionary are qualified with its actual schema.
+DO $do$
+DECLARE
+    ext_schema TEXT;
+BEGIN
+    SELECT n.nspname INTO ext_schema
+    FROM pg_extension e JOIN pg_namespace n ON n.oid = e.extnamespace
+    WHERE e.extname = 'unaccent';
+
+    EXECUTE format($fn$
+        CREATE OR REPLACE FUNCTION f_unaccent(TEXT)
+        RETURNS TEXT AS $body$
+            SELECT %1$I.unaccent(%2$L::regdictionary, $1)
+        $body$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    $fn$, ext_schema, quote_ident(ext_schema) || '.unaccent');
+
+    -- Spanish stemming and stopwords on unaccented words
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+        EXECUTE format('ALTER TEXT SEARCH CONFIGURATION es_unaccent '
+                       'ALTER MAPPING FOR hword, hword_part, word WITH %I.unaccent, spanish_stem',
+                       ext_schema);
+    END IF;
+END;
+$do$;
+
+-- Maintained on every write of the row; refresh_abogados_directorio never lists them
+ALTER TABLE abogados_directorio ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (
+        lower(f_unaccent(nombres || ' ' || apellidos || ' ' || COALESCE(nombre_bufete, '') || ' '
+                         || COALESCE(nombre_organizacion, '')))
+    ) STORED;
+ALTER TABLE abogados_directorio ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('es_unaccent', nombres || ' ' || apellidos), 'A')
+        || setweight(to_tsvector('es_unaccent', COALESCE(nombre_bufete, '') || ' ' || COALESCE(nombre_organizacion, '')), 'B')
+        || setweight(to_tsvector('es_unaccent', COALESCE(descripcion_servicios, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_directorio_search_vector ON abogados_directorio USING GIN(search_vector);
+CREATE INDEX IF NOT EXISTS idx_directorio_search_trgm ON abogados_directorio USING GIN(search_text gin_trgm_ops);
+
+-- Superseded by the read model's indexes
+DROP INDEX IF EXISTS idx_abogados_directorio_rating;
+DROP INDEX IF EXISTS idx_abogados_directorio_created;
+
+ALTER TABLE abogados_directorio ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Directory public" ON abogados_directorio FOR SELECT USING (TRUE);
+
+-- Upsert the given lawyers from the live tables (or remove them when no longer
+-- verified/active). Unchanged rows are not rewritten. Returns rows changed.
+CREATE OR REPLACE FUNCTION refresh_abogados_directorio(p_ids UUID[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_upserted INTEGER;
+    v_deleted INTEGER;
+BEGIN
+    IF p_ids IS NULL OR cardinality(p_ids) = 0 THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO abogados_directorio (
+        id, nombres, apellidos, tarjeta_profesional, email, telefono, departamento, municipio,
+        departamentos_cobertura, especialidades, anos_experiencia, casos_soat_atendidos,
+        nombre_bufete, tipo_practica, sitio_web, descripcion_servicios, tarifa_consulta,
+        calificacion_promedio, total_valoraciones, tasa_respuesta, tiempo_respuesta_promedio,
+        disponibilidad, acepta_casos_emergencia, organizacion_id, suscripcion_id,
+        perfil_scoring, segmento, nombre_organizacion, plan_codigo, created_at,
+        municipios_cobertura, idiomas, cobertura_nacional, updated_at, plan_id, rating_sort,
+        nombre_sort, synced_at
+    )
+    SELECT
+        a.id, a.nombres, a.apellidos, a.tarjeta_profesional, a.email, a.telefono,
+        a.departamento, a.municipio, a.departamentos_cobertura, a.especialidades,
+        a.anos_experiencia, a.casos_soat_atendidos, a.nombre_bufete, a.tipo_practica,
+        a.sitio_web, a.descripcion_servicios, a.tarifa_consulta, a.calificacion_promedio,
+        a.total_valoraciones, a.tasa_respuesta, a.tiempo_respuesta_promedio, a.disponibilidad,
+        a.acepta_casos_emergencia, a.organizacion_id, a.suscripcion_id, a.perfil_scoring,
+        a.segmento, ol.nombre_comercial, psl.codigo, a.created_at, a.municipios_cobertura,
+        a.idiomas, a.cobertura_nacional, a.updated_at, sl.plan_id,
+        COALESCE(a.calificacion_promedio, 0), lower(a.apellidos || ' ' || a.nombres),
+        CURRENT_TIMESTAMP
+    FROM abogados a
+    LEFT JOIN organizaciones_legales ol ON a.organizacion_id = ol.id
+    LEFT JOIN suscripciones_legales sl ON a.suscripcion_id = sl.id
+    LEFT JOIN planes_suscripcion_legal psl ON sl.plan_id = psl.id
+    WHERE a.id = ANY(p_ids) AND a.estado_verificacion = 'verificado' AND a.activo = TRUE
+    ON CONFLICT (id) DO UPDATE SET (
+        nombres, apellidos, tarjeta_profesional, email, telefono, departamento, municipio,
+        departamentos_cobertura, especialidades, anos_experiencia, casos_soat_atendidos,
+        nombre_bufete, tipo_practica, sitio_web, descripcion_servicios, tarifa_consulta,
+        calificacion_promedio, total_valoraciones, tasa_respuesta, tiempo_respuesta_promedio,
+        disponibilidad, acepta_casos_emergencia, organizacion_id, suscripcion_id,
+        perfil_scoring, segmento, nombre_organizacion, plan_codigo, created_at,
+        municipios_cobertura, idiomas, cobertura_nacional, updated_at, plan_id, rating_sort,
+        nombre_sort, synced_at
+    ) = (
+        EXCLUDED.nombres, EXCLUDED.apellidos, EXCLUDED.tarjeta_profesional, EXCLUDED.email,
+        EXCLUDED.telefono, EXCLUDED.departamento, EXCLUDED.municipio,
+        EXCLUDED.departamentos_cobertura, EXCLUDED.especialidades, EXCLUDED.anos_experiencia,
+        EXCLUDED.casos_soat_atendidos, EXCLUDED.nombre_bufete, EXCLUDED.tipo_practica,
+        EXCLUDED.sitio_web, EXCLUDED.descripcion_servicios, EXCLUDED.tarifa_consulta,
+        EXCLUDED.calificacion_promedio, EXCLUDED.total_valoraciones, EXCLUDED.tasa_respuesta,
+        EXCLUDED.tiempo_respuesta_promedio, EXCLUDED.disponibilidad,
+        EXCLUDED.acepta_casos_emergencia, EXCLUDED.organizacion_id, EXCLUDED.suscripcion_id,
+        EXCLUDED.perfil_scoring, EXCLUDED.segmento, EXCLUDED.nombre_organizacion,
+        EXCLUDED.plan_codigo, EXCLUDED.created_at, EXCLUDED.municipios_cobertura,
+        EXCLUDED.idiomas, EXCLUDED.cobertura_nacional, EXCLUDED.updated_at, EXCLUDED.plan_id,
+        EXCLUDED.rating_sort, EXCLUDED.nombre_sort, EXCLUDED.synced_at
+    )
+    WHERE (
+        abogados_directorio.nombres, abogados_directorio.apellidos,
+        abogados_directorio.tarjeta_profesional, abogados_directorio.email,
+        abogados_directorio.telefono, abogados_directorio.departamento,
+        abogados_directorio.municipio, abogados_directorio.departamentos_cobertura,
+        abogados_directorio.especialidades, abogados_directorio.anos_experiencia,
+        abogados_directorio.casos_soat_atendidos, abogados_directorio.nombre_bufete,
+        abogados_directorio.tipo_practica, abogados_directorio.sitio_web,
+        abogados_directorio.descripcion_servicios, abogados_directorio.tarifa_consulta,
+        abogados_directorio.calificacion_promedio, abogados_directorio.total_valoraciones,
+        abogados_directorio.tasa_respuesta, abogados_directorio.tiempo_respuesta_promedio,
+        abogados_directorio.disponibilidad, abogados_directorio.acepta_casos_emergencia,
+        abogados_directorio.organizacion_id, abogados_directorio.suscripcion_id,
+        abogados_directorio.perfil_scoring, abogados_directorio.segmento,
+        abogados_directorio.nombre_organizacion, abogados_directorio.plan_codigo,
+        abogados_directorio.created_at, abogados_directorio.municipios_cobertura,
+        abogados_directorio.idiomas, abogados_directorio.cobertura_nacional,
+        abogados_directorio.updated_at, abogados_directorio.plan_id,
+        abogados_directorio.rating_sort, abogados_directorio.nombre_sort
+    ) IS DISTINCT FROM (
+        EXCLUDED.nombres, EXCLUDED.apellidos, EXCLUDED.tarjeta_profesional, EXCLUDED.email,
+        EXCLUDED.telefono, EXCLUDED.departamento, EXCLUDED.municipio,
+        EXCLUDED.departamentos_cobertura, EXCLUDED.especialidades, EXCLUDED.anos_experiencia,
+        EXCLUDED.casos_soat_atendidos, EXCLUDED.nombre_bufete, EXCLUDED.tipo_practica,
+        EXCLUDED.sitio_web, EXCLUDED.descripcion_servicios, EXCLUDED.tarifa_consulta,
+        EXCLUDED.calificacion_promedio, EXCLUDED.total_valoraciones, EXCLUDED.tasa_respuesta,
+        EXCLUDED.tiempo_respuesta_promedio, EXCLUDED.disponibilidad,
+        EXCLUDED.acepta_casos_emergencia, EXCLUDED.organizacion_id, EXCLUDED.suscripcion_id,
+        EXCLUDED.perfil_scoring, EXCLUDED.segmento, EXCLUDED.nombre_organizacion,
+        EXCLUDED.plan_codigo, EXCLUDED.created_at, EXCLUDED.municipios_cobertura,
+        EXCLUDED.idiomas, EXCLUDED.cobertura_nacional, EXCLUDED.updated_at, EXCLUDED.plan_id,
+        EXCLUDED.rating_sort, EXCLUDED.nombre_sort
+    );
+    GET DIAGNOSTICS v_upserted = ROW_COUNT;
+
+    DELETE FROM abogados_directorio d
+    WHERE d.id = ANY(p_ids)
+      AND NOT EXISTS (
+          SELECT 1 FROM abogados a
+          WHERE a.id = d.id AND a.estado_verificacion = 'verificado' AND a.activo = TRUE
+      );
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+
+    RETURN v_upserted + v_deleted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Statement-level triggers with transition tables: one refresh call per
+-- statement, however many rows it touched (bulk imports, rating recounts).
+-- Deleted lawyers leave through the ON DELETE CASCADE foreign key.
+CREATE OR REPLACE FUNCTION trg_directorio_abogados()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_abogados_directorio(ARRAY(SELECT id FROM new_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION trg_directorio_organizaciones()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_abogados_directorio(ARRAY(
+        SELECT a.id FROM abogados a
+        JOIN new_rows n ON a.organizacion_id = n.id
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.nombre_comercial IS DISTINCT FROM o.nombre_comercial
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION trg_directorio_suscripciones()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_abogados_directorio(ARRAY(
+        SELECT a.id FROM abogados a
+        JOIN new_rows n ON a.suscripcion_id = n.id
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.plan_id IS DISTINCT FROM o.plan_id
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION trg_directorio_planes()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_abogados_directorio(ARRAY(
+        SELECT a.id FROM abogados a
+        JOIN suscripciones_legales sl ON a.suscripcion_id = sl.id
+        JOIN new_rows n ON sl.plan_id = n.id
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.codigo IS DISTINCT FROM o.codigo
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS trigger_directorio_abogados_ins ON abogados;
+CREATE TRIGGER trigger_directorio_abogados_ins AFTER INSERT ON abogados
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION trg_directorio_abogados();
+DROP TRIGGER IF EXISTS trigger_directorio_abogados_upd ON abogados;
+CREATE TRIGGER trigger_directorio_abogados_upd AFTER UPDATE ON abogados
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION trg_directorio_abogados();
+DROP TRIGGER IF EXISTS trigger_directorio_organizaciones ON organizaciones_legales;
+CREATE TRIGGER trigger_directorio_organizaciones AFTER UPDATE ON organizaciones_legales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_directorio_organizaciones();
+DROP TRIGGER IF EXISTS trigger_directorio_suscripciones ON suscripciones_legales;
+CREATE TRIGGER trigger_directorio_suscripciones AFTER UPDATE ON suscripciones_legales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_directorio_suscripciones();
+DROP TRIGGER IF EXISTS trigger_directorio_planes ON planes_suscripcion_legal;
+CREATE TRIGGER trigger_directorio_planes AFTER UPDATE ON planes_suscripcion_legal
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_directorio_planes();
+
+-- Initial fill for databases that already have lawyers
+SELECT refresh_abogados_directorio(ARRAY(SELECT id FROM abogados))
+WHERE NOT EXISTS (SELECT 1 FROM abogados_directorio);
+
+-- ============================================================================
+-- View: Active verified lawyers with cached rating (thin view over the read model)
 -- ============================================================================
 CREATE OR REPLACE VIEW v_abogados_activos AS
-SELECT 
-    a.id, a.nombres, a.apellidos, a.tarjeta_profesional, a.email, a.telefono,
-    a.departamento, a.municipio, a.departamentos_cobertura, a.especialidades,
-    a.anos_experiencia, a.casos_soat_atendidos, a.nombre_bufete, a.tipo_practica,
-    a.sitio_web, a.descripcion_servicios, a.tarifa_consulta,
-    a.calificacion_promedio, a.total_valoraciones,
-    a.tasa_respuesta, a.tiempo_respuesta_promedio,
-    a.disponibilidad, a.acepta_casos_emergencia,
-    a.organizacion_id, a.suscripcion_id,
-    a.perfil_scoring, a.segmento,
-    ol.nombre_comercial AS nombre_organizacion,
-    psl.codigo AS plan_codigo,
-    a.created_at
-FROM abogados a
-LEFT JOIN organizaciones_legales ol ON a.organizacion_id = ol.id
-LEFT JOIN suscripciones_legales sl ON a.suscripcion_id = sl.id
-LEFT JOIN planes_suscripcion_legal psl ON sl.plan_id = psl.id
-WHERE a.estado_verificacion = 'verificado' AND a.activo = TRUE;
\ No newline at end of file
+SELECT
+    id, nombres, apellidos, tarjeta_profesional, email, telefono, departamento, municipio,
+    departamentos_cobertura, especialidades, anos_experiencia, casos_soat_atendidos,
+    nombre_bufete, tipo_practica, sitio_web, descripcion_servicios, tarifa_consulta,
+    calificacion_promedio, total_valoraciones, tasa_respuesta, tiempo_respuesta_promedio,
+    disponibilidad, acepta_casos_emergencia, organizacion_id, suscripcion_id, perfil_scoring,
+    segmento, nombre_organizacion, plan_codigo, created_at, municipios_cobertura, idiomas,
+    cobertura_nacional, updated_at, plan_id
+FROM abogados_directorio;
@@ -0,0 +1,94 @@
+"""
+Accent-insensitive fuzzy search over the lawyer directory.
+
+Searches names, firm/organization names and ``descripcion_servicios`` of
+``abogados_directorio`` through two generated columns (see ``schema.sql``):
+
+- ``search_vector``: Spanish full-text vector (unaccented, stemmed, stopwords
+  removed), weighted names > firms > services, GIN-indexed;
+- ``search_text``: unaccented, lower-cased names and firms, GIN trigram index,
+  which catches misspellings ("Gomes", "bufette") the stemmer cannot.
+
+A row matches when either index matches; results are ranked by text rank plus
+trigram word similarity, then by rating. Department and specialty filters are
+the directory ones from ``pagination.py``:
+
+    results = search(session, 'gomez seguros', departamento='Antioquia')
+"""
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import func, literal, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from models import AbogadoDirectorio
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, directory_filters
+
+# Minimum trigram word similarity (0-1) for a fuzzy match
+DEFAULT_MIN_SIMILARITY = 0.4
+
+# Spanish function words dropped from queries (PostgreSQL's ``spanish``
+# dictionary drops them from the indexed text as well)
+SPANISH_STOPWORDS = frozenset("""
+a al algo con contra de del desde donde durante e el ella ellas ellos en entre era es esa ese eso esta este
+esto ha hasta la las le les lo los mas me mi mis muy ni no nos o os otra otro para pero por que se sea ser si
+sin sobre son su sus tambien te tu un una uno unos unas y ya
+""".split())
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+_TS_CONFIG = literal_column("'es_unaccent'::regconfig")
+
+
+def normalize(value: str) -> str:
+    """Lower-case, fold accents (``Gómez`` -> ``gomez``, ``ñ`` -> ``n``) and collapse punctuation."""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(' ', folded.lower()).strip()
+
+
+def query_terms(value: str) -> List[str]:
+    """Normalized words of a search string without Spanish stopwords."""
+    return [word for word in normalize(value).split() if word not in SPANISH_STOPWORDS]
+
+
+def to_tsquery_text(terms: List[str]) -> str:
+    """``to_tsquery`` input requiring every term, each as a prefix (``gom:* & seguro:*``)."""
+    return ' & '.join(f"{term}:*" for term in terms)
+
+
+@dataclass
+class SearchResult:
+    abogado: AbogadoDirectorio
+    score: float
+
+
+def search(session: Session, q: str, departamento: Optional[str] = None, especialidad: Optional[str] = None,
+           limit: int = DEFAULT_PAGE_SIZE, min_similarity: float = DEFAULT_MIN_SIMILARITY) -> List[SearchResult]:
+    """
+    Best ``limit`` directory matches for ``q``, optionally restricted to
+    lawyers covering ``departamento`` with ``especialidad``.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return []
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    phrase = ' '.join(terms)
+
+    tsquery = func.to_tsquery(_TS_CONFIG, to_tsquery_text(terms))
+    text_match = AbogadoDirectorio.search_vector.op('@@')(tsquery)
+    # ``<%`` (word similarity above the threshold) is the operator the trigram index serves
+    fuzzy_match = literal(phrase).op('<%')(AbogadoDirectorio.search_text)
+    score = (func.ts_rank_cd(AbogadoDirectorio.search_vector, tsquery)
+             + func.word_similarity(phrase, AbogadoDirectorio.search_text)).label('score')
+
+    session.execute(select(func.set_config('pg_trgm.word_similarity_threshold', str(min_similarity), True)))
+    query = (
+        select(AbogadoDirectorio, score)
+        .where(or_(text_match, fuzzy_match), *directory_filters(departamento, especialidad))
+        .order_by(score.desc(), AbogadoDirectorio.rating_sort.desc(), AbogadoDirectorio.id.desc())
+        .limit(limit)
+    )
+    return [SearchResult(abogado=row[0], score=float(row[1])) for row in session.execute(query)]
@@ -0,0 +1,552 @@
+"""
+Seeded synthetic data generator for the lawyer registry schema.
+
+Fills all eight ``models.py`` tables at a chosen scale (``SCALES``; the
+``production`` preset is 1M lawyers, 10M reviews and 50M events) for
+benchmarking schema and index changes against a local Postgres.
+
+Generation is deterministic: every table is produced in fixed-size chunks,
+each from its own ``random.Random(f"{seed}:{table}:{chunk}")``, and row ids
+are derived from (seed, table, row number), so the same seed yields the same
+database regardless of how many worker processes loaded it. Rows are streamed
+with ``COPY ... FROM STDIN``; foreign keys are row numbers mapped back to
+derived ids, so no generated id is kept in memory.
+
+Lawyer rating aggregates are recomputed through ``ratings.recompute_all``
+after the reviews are loaded.
+"""
+import hashlib
+import io
+import json
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+import database
+import partitions
+import ratings
+
+CHUNK_ROWS = 50_000
+DEFAULT_SEED = 20240101
+
+# Anchor for generated timestamps, so output does not depend on the run date
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HISTORY_DAYS = 730
+
+
+@dataclass(frozen=True)
+class Scale:
+    organizaciones: int
+    planes: int
+    suscripciones_independientes: int
+    abogados: int
+    certificaciones: int
+    valoraciones: int
+    eventos: int
+    auditoria: int
+
+
+SCALES: Dict[str, Scale] = {
+    'tiny': Scale(organizaciones=50, planes=2, suscripciones_independientes=300, abogados=2_000,
+                  certificaciones=1_500, valoraciones=20_000, eventos=100_000, auditoria=20_000),
+    'medium': Scale(organizaciones=2_000, planes=5, suscripciones_independientes=30_000, abogados=100_000,
+                    certificaciones=60_000, valoraciones=1_000_000, eventos=5_000_000, auditoria=500_000),
+    'production': Scale(organizaciones=20_000, planes=10, suscripciones_independientes=300_000,
+                        abogados=1_000_000, certificaciones=600_000, valoraciones=10_000_000,
+                        eventos=50_000_000, auditoria=5_000_000),
+}
+
+# Department -> (capital, lat, lon, other municipalities). Weights follow
+# roughly where Colombian lawyers practise.
+DEPARTAMENTOS: Dict[str, Tuple[str, float, float, Tuple[str, ...]]] = {
+    'Bogotá D.C.': ('Bogotá', 4.711, -74.072, ('Usaquén', 'Suba', 'Kennedy', 'Chapinero')),
+    'Antioquia': ('Medellín', 6.244, -75.581, ('Envigado', 'Itagüí', 'Bello', 'Rionegro', 'Apartadó')),
+    'Valle del Cauca': ('Cali', 3.451, -76.532, ('Palmira', 'Buenaventura', 'Tuluá', 'Buga', 'Cartago')),
+    'Atlántico': ('Barranquilla', 10.964, -74.796, ('Soledad', 'Malambo', 'Sabanalarga')),
+    'Santander': ('Bucaramanga', 7.119, -73.123, ('Floridablanca', 'Girón', 'Piedecuesta', 'Barrancabermeja')),
+    'Bolívar': ('Cartagena', 10.391, -75.479, ('Magangué', 'Turbaco', 'El Carmen de Bolívar')),
+    'Cundinamarca': ('Soacha', 4.579, -74.217, ('Zipaquirá', 'Facatativá', 'Chía', 'Girardot', 'Fusagasugá')),
+    'Norte de Santander': ('Cúcuta', 7.893, -72.507, ('Ocaña', 'Pamplona', 'Villa del Rosario')),
+    'Tolima': ('Ibagué', 4.438, -75.232, ('Espinal', 'Melgar', 'Honda')),
+    'Risaralda': ('Pereira', 4.813, -75.696, ('Dosquebradas', 'Santa Rosa de Cabal')),
+    'Caldas': ('Manizales', 5.070, -75.517, ('La Dorada', 'Chinchiná', 'Villamaría')),
+    'Nariño': ('Pasto', 1.213, -77.281, ('Tumaco', 'Ipiales')),
+    'Córdoba': ('Montería', 8.748, -75.881, ('Lorica', 'Sahagún', 'Cereté')),
+    'Huila': ('Neiva', 2.927, -75.281, ('Pitalito', 'Garzón', 'La Plata')),
+    'Meta': ('Villavicencio', 4.142, -73.626, ('Acacías', 'Granada', 'Puerto López')),
+    'Boyacá': ('Tunja', 5.535, -73.367, ('Duitama', 'Sogamoso', 'Chiquinquirá')),
+    'Cauca': ('Popayán', 2.444, -76.614, ('Santander de Quilichao', 'Puerto Tejada')),
+    'Magdalena': ('Santa Marta', 11.240, -74.199, ('Ciénaga', 'Fundación')),
+    'Cesar': ('Valledupar', 10.463, -73.253, ('Aguachica', 'Codazzi')),
+    'Quindío': ('Armenia', 4.533, -75.681, ('Calarcá', 'Montenegro')),
+    'Sucre': ('Sincelejo', 9.304, -75.397, ('Corozal', 'Sampués')),
+    'La Guajira': ('Riohacha', 11.544, -72.907, ('Maicao', 'Uribia')),
+    'Casanare': ('Yopal', 5.337, -72.395, ('Aguazul', 'Villanueva')),
+    'Chocó': ('Quibdó', 5.694, -76.658, ('Istmina',)),
+    'Caquetá': ('Florencia', 1.614, -75.606, ('San Vicente del Caguán',)),
+}
+_DEPTO_WEIGHTS = (24, 14, 11, 6, 5, 4, 5, 3, 3, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1)
+
+ESPECIALIDADES = (
+    'SOAT', 'Accidentes de Tránsito', 'Responsabilidad Civil', 'Derecho de Seguros',
+    'Derecho Civil', 'Derecho Laboral', 'Derecho Penal', 'Derecho de Familia',
+    'Derecho Administrativo', 'Derecho Comercial', 'Seguridad Social', 'Derecho Médico',
+)
+# SOAT-related specialties dominate this registry
+_ESPECIALIDAD_WEIGHTS = (30, 25, 18, 12, 10, 8, 6, 5, 4, 4, 4, 3)
+
+IDIOMAS = ('Español', 'Inglés', 'Francés', 'Portugués', 'Alemán')
+
+NOMBRES = (
+    'Juan', 'María', 'Carlos', 'Ana', 'Luis', 'Laura', 'Andrés', 'Paula', 'Jorge', 'Diana',
+    'Felipe', 'Camila', 'Santiago', 'Valentina', 'Alejandro', 'Natalia', 'Sebastián', 'Catalina',
+    'Daniel', 'Carolina', 'José', 'Sofía', 'Miguel', 'Adriana', 'Ricardo', 'Juliana', 'Óscar', 'Mónica',
+)
+APELLIDOS = (
+    'Rodríguez', 'Gómez', 'González', 'Martínez', 'García', 'López', 'Hernández', 'Sánchez',
+    'Ramírez', 'Pérez', 'Díaz', 'Muñoz', 'Rojas', 'Moreno', 'Jiménez', 'Vargas', 'Castro',
+    'Gutiérrez', 'Ospina', 'Restrepo', 'Zapata', 'Cárdenas', 'Ortiz', 'Quintero', 'Peña', 'Suárez',
+)
+UNIVERSIDADES = (
+    'Universidad Nacional de Colombia', 'Universidad de los Andes', 'Pontificia Universidad Javeriana',
+    'Universidad Externado de Colombia', 'Universidad del Rosario', 'Universidad de Antioquia',
+    'Universidad Libre', 'Universidad Santo Tomás', 'Universidad del Valle', 'Universidad del Norte',
+)
+
+EVENT_TYPES = (
+    ('perfil_visto', 'lawyer'), ('busqueda_realizada', 'lawyer'), ('contacto_iniciado', 'case'),
+    ('consulta_creada', 'case'), ('consulta_respondida', 'case'), ('caso_asignado', 'case'),
+    ('caso_cerrado', 'case'), ('login', 'auth'), ('perfil_actualizado', 'lawyer'),
+    ('suscripcion_renovada', 'subscription'), ('pago_registrado', 'billing'),
+)
+_EVENT_WEIGHTS = (40, 25, 8, 8, 6, 3, 2, 5, 2, 1, 1)
+
+AUDITED_TABLES = ('abogados', 'organizaciones_legales', 'suscripciones_legales', 'abogados_certificaciones')
+
+
+# ============================================================================
+# Deterministic ids
+# ============================================================================
+def _id_prefix(seed: int, table: str) -> int:
+    digest = hashlib.sha256(f"{seed}:{table}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def synthetic_id(seed: int, table: str, n: int) -> uuid.UUID:
+    """Stable id of row ``n`` of ``table`` for ``seed``."""
+    return uuid.UUID(int=(_id_prefix(seed, table) << 64) | n)
+
+
+class _Ids:
+    """Maps row numbers to derived ids for one seed (prefixes cached)."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._prefix: Dict[str, int] = {}
+
+    def __call__(self, table: str, n: int) -> str:
+        prefix = self._prefix.get(table)
+        if prefix is None:
+            prefix = self._prefix[table] = _id_prefix(self.seed, table)
+        return str(uuid.UUID(int=(prefix << 64) | n))
+
+
+# ============================================================================
+# COPY encoding
+# ============================================================================
+def _copy_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _array_literal(values: Sequence[str]) -> str:
+    items = ('"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"' for v in values)
+    return '{' + ','.join(items) + '}'
+
+
+def copy_value(value) -> str:
+    """Encode one value for COPY text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (list, tuple)):
+        return _copy_escape(_array_literal(value))
+    if isinstance(value, dict):
+        return _copy_escape(json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return _copy_escape(str(value))
+
+
+def copy_rows(conn, table: str, columns: Sequence[str], rows) -> int:
+    """Stream ``rows`` (tuples in ``columns`` order) into ``table`` with one COPY."""
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write('\t'.join(copy_value(v) for v in row))
+        buf.write('\n')
+        count += 1
+    buf.seek(0)
+    with conn.connection.driver_connection.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+    return count
+
+
+# ============================================================================
+# Row generators: fn(rng, ids, scale, n) -> tuple
+# ============================================================================
+def _ts(rng: random.Random, days: int = HISTORY_DAYS, recent_bias: float = 1.0) -> datetime:
+    # recent_bias > 1 skews toward the anchor date (logs grow over time)
+    back = days * (rng.random() ** recent_bias)
+    return EPOCH - timedelta(days=back, seconds=rng.randrange(86400))
+
+
+def _place(rng: random.Random) -> Tuple[str, str, float, float, Tuple[str, ...]]:
+    depto = rng.choices(_DEPTO_NAMES, _DEPTO_WEIGHTS)[0]
+    capital, lat, lon, others = DEPARTAMENTOS[depto]
+    municipio = capital if rng.random() < 0.7 or not others else rng.choice(others)
+    return depto, municipio, lat + rng.gauss(0, 0.05), lon + rng.gauss(0, 0.05), (capital,) + others
+
+
+_DEPTO_NAMES = tuple(DEPARTAMENTOS)
+
+ORG_COLUMNS = (
+    'id', 'nombre_legal', 'nombre_comercial', 'tipo_organizacion', 'nit', 'email_corporativo',
+    'telefono_corporativo', 'departamento', 'municipio', 'latitud', 'longitud', 'tamano',
+    'numero_abogados', 'especialidades_principales', 'descripcion', 'estado', 'verificado',
+    'source_of_truth', 'created_at', 'updated_at',
+)
+
+
+def _org_row(rng, ids, scale, n):
+    depto, municipio, lat, lon, _ = _place(rng)
+    apellido1, apellido2 = rng.sample(APELLIDOS, 2)
+    comercial = f"{apellido1} & {apellido2} Abogados"
+    created = _ts(rng)
+    return (
+        ids('organizaciones_legales', n), f"{comercial} S.A.S.", comercial,
+        rng.choices(('bufete', 'consultorio_juridico', 'corporacion_legal', 'ong_legal'), (85, 8, 5, 2))[0],
+        f"9{n:08d}", f"contacto{n}@firma{n}.com.co", f"60{rng.randrange(10**8):08d}",
+        depto, municipio, round(lat, 7), round(lon, 7),
+        rng.choices(('pequeno', 'mediano', 'grande'), (70, 25, 5))[0], rng.randint(2, 80),
+        rng.sample(ESPECIALIDADES, rng.randint(1, 4)),
+        f"Firma especializada en {rng.choice(ESPECIALIDADES).lower()} con sede en {municipio}.",
+        rng.choices(('activo', 'inactivo', 'suspendido', 'pendiente_verificacion'), (90, 5, 1, 4))[0],
+        rng.random() < 0.8, 'synthetic', created, created,
+    )
+
+
+PLAN_COLUMNS = (
+    'id', 'codigo', 'nombre', 'tipo_cliente', 'precio_mensual', 'precio_anual', 'max_abogados',
+    'max_casos_activos', 'max_consultas_mes', 'features', 'visible', 'orden_display',
+)
+
+
+def _plan_row(rng, ids, scale, n):
+    mensual = rng.choice((49000, 99000, 199000, 299000))
+    return (
+        ids('planes_suscripcion_legal', n), f"synthetic_{n:03d}", f"Plan sintético {n}",
+        rng.choice(('abogado', 'bufete', 'todos')), mensual, mensual * 10,
+        rng.choice((1, 5, 20, None)), rng.choice((20, 50, 200, None)), rng.choice((100, 300, 1000, None)),
+        {'perfil_directorio': True, 'api_access': rng.random() < 0.5, 'ai_matching': rng.random() < 0.5},
+        False, 100 + n,
+    )
+
+
+SUSCRIPCION_COLUMNS = (
+    'id', 'abogado_id', 'organizacion_id', 'plan_id', 'estado', 'fecha_inicio', 'periodo_facturacion',
+    'es_trial', 'monto_actual', 'consultas_usadas_mes', 'casos_activos_actual', 'limites_custom',
+    'created_at', 'updated_at',
+)
+
+
+def _suscripcion_row(rng, ids, scale, n, plan_ids):
+    # Rows [0, organizaciones) belong to firms; the rest to independent lawyers
+    if n < scale.organizaciones:
+        organizacion_id, abogado_id = ids('organizaciones_legales', n), None
+        plan_id = plan_ids['enterprise'] if rng.random() < 0.6 else plan_ids['pro']
+    else:
+        organizacion_id = None
+        abogado_id = ids('abogados', _independent_lawyer(scale, n - scale.organizaciones))
+        plan_id = plan_ids['starter'] if rng.random() < 0.7 else plan_ids['pro']
+    estado = rng.choices(('activa', 'trial', 'pausada', 'cancelada', 'vencida'), (75, 10, 4, 7, 4))[0]
+    created = _ts(rng)
+    return (
+        ids('suscripciones_legales', n), abogado_id, organizacion_id, plan_id, estado, created,
+        'trial' if estado == 'trial' else rng.choice(('mensual', 'anual')), estado == 'trial',
+        rng.choice((0, 149000, 599000)), rng.randint(0, 60), rng.randint(0, 12),
+        {'max_consultas_mes': 2000} if rng.random() < 0.01 else {}, created, created,
+    )
+
+
+def _firm_of(scale: Scale, n: int) -> Optional[int]:
+    """Firm row number of lawyer ``n``, or None for independent lawyers (60%)."""
+    if not scale.organizaciones or n % 5 < 3:
+        return None
+    return (n * 2654435761) % scale.organizaciones
+
+
+def _independent_lawyer(scale: Scale, k: int) -> int:
+    """The k-th independent lawyer row number (lawyers with n % 5 in {0, 1, 2})."""
+    return (k // 3) * 5 + k % 3
+
+
+def _lawyer_subscription(scale: Scale, n: int) -> Optional[int]:
+    firm = _firm_of(scale, n)
+    if firm is not None:
+        return firm
+    k = (n // 5) * 3 + n % 5
+    return scale.organizaciones + k if k < scale.suscripciones_independientes else None
+
+
+ABOGADO_COLUMNS = (
+    'id', 'organizacion_id', 'suscripcion_id', 'tipo_documento', 'numero_documento', 'nombres', 'apellidos',
+    'tarjeta_profesional', 'universidad', 'fecha_grado', 'email', 'telefono', 'direccion_oficina',
+    'departamento', 'municipio', 'latitud', 'longitud', 'departamentos_cobertura', 'municipios_cobertura',
+    'cobertura_nacional', 'especialidades', 'anos_experiencia', 'casos_soat_atendidos', 'descripcion_servicios',
+    'tarifa_consulta', 'idiomas', 'acepta_casos_emergencia', 'nombre_bufete', 'tipo_practica',
+    'estado_verificacion', 'acepta_terminos', 'acepta_tratamiento_datos', 'activo', 'tasa_respuesta',
+    'tiempo_respuesta_promedio', 'segmento', 'tags', 'source_of_truth', 'created_at', 'updated_at',
+)
+
+
+def _abogado_row(rng, ids, scale, n):
+    depto, municipio, lat, lon, municipios = _place(rng)
+    nombres = rng.choice(NOMBRES) if rng.random() < 0.6 else ' '.join(rng.sample(NOMBRES, 2))
+    apellidos = ' '.join(rng.sample(APELLIDOS, 2))
+    firm = _firm_of(scale, n)
+    subscription = _lawyer_subscription(scale, n)
+    nacional = rng.random() < 0.03
+    extra_deptos = rng.sample(_DEPTO_NAMES, rng.choices((0, 1, 2, 4), (55, 25, 15, 5))[0])
+    especialidades = list(dict.fromkeys(rng.choices(ESPECIALIDADES, _ESPECIALIDAD_WEIGHTS, k=rng.randint(1, 4))))
+    anos = rng.randint(0, 40)
+    grado = EPOCH.date() - timedelta(days=365 * anos + rng.randrange(365))
+    created = _ts(rng)
+    return (
+        ids('abogados', n), ids('organizaciones_legales', firm) if firm is not None else None,
+        ids('suscripciones_legales', subscription) if subscription is not None else None,
+        rng.choices(('CC', 'CE', 'PASAPORTE'), (96, 3, 1))[0], f"{10_000_000 + n}", nombres, apellidos,
+        f"TP-{n:07d}", rng.choice(UNIVERSIDADES), grado, f"abogado{n}@example.com.co",
+        f"3{rng.randrange(10**9):09d}", f"Calle {rng.randint(1, 180)} # {rng.randint(1, 99)}-{rng.randint(1, 99)}",
+        depto, municipio, round(lat, 7), round(lon, 7),
+        list(dict.fromkeys([depto] + extra_deptos)),
+        rng.sample(municipios, rng.randint(1, len(municipios))),
+        nacional, especialidades, anos, rng.randint(0, 15 * (anos + 1)),
+        f"Abogado especialista en {', '.join(e.lower() for e in especialidades)} en {municipio}.",
+        rng.choice(('Gratuita', '50.000 COP', '100.000 COP', 'A convenir', None)),
+        ['Español'] + (rng.sample(IDIOMAS[1:], 1) if rng.random() < 0.15 else []),
+        rng.random() < 0.35, None if firm is None else f"Bufete {firm}",
+        'Bufete' if firm is not None else rng.choices(('Independiente', 'Consultorio Jurídico', 'Otro'), (90, 5, 5))[0],
+        rng.choices(('verificado', 'pendiente', 'en_revision', 'rechazado', 'suspendido'), (70, 15, 8, 5, 2))[0],
+        True, True, rng.random() < 0.95, round(rng.uniform(40, 100), 2), rng.randint(5, 2880),
+        rng.choice(('nuevo', 'activo', 'premium', 'inactivo')), rng.sample(('soat', 'urgencias', 'remoto', 'bilingue'), rng.randint(0, 2)),
+        'synthetic', created, created,
+    )
+
+
+CERTIFICACION_COLUMNS = (
+    'id', 'abogado_id', 'nombre_certificacion', 'institucion', 'fecha_obtencion', 'fecha_vencimiento',
+    'verificado', 'created_at',
+)
+
+
+def _certificacion_row(rng, ids, scale, n):
+    obtained = EPOCH.date() - timedelta(days=rng.randrange(HISTORY_DAYS * 3))
+    return (
+        ids('abogados_certificaciones', n), ids('abogados', rng.randrange(scale.abogados)),
+        f"Diplomado en {rng.choice(ESPECIALIDADES)}", rng.choice(UNIVERSIDADES), obtained,
+        obtained + timedelta(days=365 * 3) if rng.random() < 0.4 else None,
+        rng.random() < 0.7, _ts(rng),
+    )
+
+
+VALORACION_COLUMNS = (
+    'id', 'abogado_id', 'usuario_id', 'calificacion', 'comentario', 'caso_tipo', 'fecha_servicio',
+    'verificado', 'created_at',
+)
+
+_COMENTARIOS = (
+    'Excelente atención', 'Muy profesional', 'Resolvió mi caso rápido', 'Buena comunicación',
+    'Demoró en responder', 'Recomendado', None, None,
+)
+
+
+def _valoracion_row(rng, ids, scale, n):
+    # Popularity is heavy-tailed: a small share of lawyers gets most reviews
+    abogado = int(scale.abogados * (rng.random() ** 3))
+    created = _ts(rng, recent_bias=1.5)
+    return (
+        ids('abogados_valoraciones', n), ids('abogados', abogado), str(uuid.UUID(int=rng.getrandbits(128))),
+        rng.choices((1, 2, 3, 4, 5), (4, 4, 10, 30, 52))[0], rng.choice(_COMENTARIOS),
+        rng.choice(('soat', 'transito', 'civil', 'laboral')), created.date() - timedelta(days=rng.randrange(60)),
+        rng.random() < 0.8, created,
+    )
+
+
+EVENT_COLUMNS = (
+    'id', 'actor_id', 'actor_type', 'organizacion_id', 'event_type', 'event_category', 'resource_type',
+    'resource_id', 'payload', 'source', 'resultado', 'event_timestamp', 'processed', 'created_at',
+)
+
+
+def _event_row(rng, ids, scale, n):
+    event_type, category = rng.choices(EVENT_TYPES, _EVENT_WEIGHTS)[0]
+    abogado = rng.randrange(scale.abogados)
+    firm = _firm_of(scale, abogado)
+    ts = _ts(rng, recent_bias=2.0)
+    return (
+        ids('event_log_legal', n), ids('abogados', abogado), rng.choice(('lawyer', 'user', 'system')),
+        ids('organizaciones_legales', firm) if firm is not None else None, event_type, category,
+        'abogado', ids('abogados', abogado), {'n': n, 'canal': rng.choice(('web', 'app', 'api'))},
+        rng.choice(('api', 'web', 'worker')), 'success' if rng.random() < 0.98 else 'failure', ts,
+        ts < EPOCH - timedelta(hours=1), ts,
+    )
+
+
+AUDIT_COLUMNS = (
+    'id', 'actor_id', 'actor_type', 'action', 'table_name', 'record_id', 'old_values', 'new_values',
+    'changed_fields', 'action_timestamp', 'created_at',
+)
+
+
+def _audit_row(rng, ids, scale, n):
+    abogado = rng.randrange(scale.abogados)
+    action = rng.choices(('INSERT', 'UPDATE', 'DELETE'), (20, 78, 2))[0]
+    ts = _ts(rng, recent_bias=2.0)
+    fields = rng.sample(('telefono', 'descripcion_servicios', 'especialidades', 'tarifa_consulta'), 1)
+    return (
+        ids('audit_log_legal', n), ids('abogados', abogado), 'lawyer', action, rng.choice(AUDITED_TABLES),
+        ids('abogados', abogado), None if action == 'INSERT' else {fields[0]: 'antes'},
+        None if action == 'DELETE' else {fields[0]: 'despues'}, fields, ts, ts,
+    )
+
+
+# Load order respects foreign keys: firms and plans, subscriptions, lawyers, children
+TABLES: List[Tuple[str, Tuple[str, ...], Callable, Callable[[Scale], int]]] = [
+    ('organizaciones_legales', ORG_COLUMNS, _org_row, lambda s: s.organizaciones),
+    ('planes_suscripcion_legal', PLAN_COLUMNS, _plan_row, lambda s: s.planes),
+    ('suscripciones_legales', SUSCRIPCION_COLUMNS, _suscripcion_row,
+     lambda s: s.organizaciones + s.suscripciones_independientes),
+    ('abogados', ABOGADO_COLUMNS, _abogado_row, lambda s: s.abogados),
+    ('abogados_certificaciones', CERTIFICACION_COLUMNS, _certificacion_row, lambda s: s.certificaciones),
+    ('abogados_valoraciones', VALORACION_COLUMNS, _valoracion_row, lambda s: s.valoraciones),
+    ('event_log_legal', EVENT_COLUMNS, _event_row, lambda s: s.eventos),
+    ('audit_log_legal', AUDIT_COLUMNS, _audit_row, lambda s: s.auditoria),
+]
+_TABLES_BY_NAME = {name: (columns, row_fn) for name, columns, row_fn, _ in TABLES}
+
+
+# ============================================================================
+# Loading
+# ============================================================================
+@dataclass
+class GenerationReport:
+    seed: int
+    scale: str
+    rows: Dict[str, int]
+    seconds: Dict[str, float]
+
+    def summary(self) -> str:
+        lines = [f"seed={self.seed} scale={self.scale}"]
+        for table, count in self.rows.items():
+            secs = self.seconds.get(table, 0.0)
+            rate = count / secs if secs else 0.0
+            lines.append(f"  {table}: {count} rows in {secs:.1f}s ({rate:,.0f} rows/s)")
+        return "\n".join(lines)
+
+
+def _init_worker():
+    # Connections inherited from the parent over fork must not be reused
+    database.dispose_engines(close=False)
+
+
+def _load_chunk(table: str, chunk: int, start: int, stop: int, seed: int, scale: Scale,
+                plan_ids: Dict[str, str], database_url: Optional[str]) -> int:
+    columns, row_fn = _TABLES_BY_NAME[table]
+    rng = random.Random(f"{seed}:{table}:{chunk}")
+    ids = _Ids(seed)
+    if row_fn is _suscripcion_row:
+        rows = (row_fn(rng, ids, scale, n, plan_ids) for n in range(start, stop))
+    else:
+        rows = (row_fn(rng, ids, scale, n) for n in range(start, stop))
+    with database.get_engine(database_url).begin() as conn:
+        return copy_rows(conn, table, columns, rows)
+
+
+def _load_chunk_args(args) -> int:
+    return _load_chunk(*args)
+
+
+def generate(scale: str = 'tiny', seed: int = DEFAULT_SEED, workers: int = 4, truncate: bool = False,
+             tables: Optional[Sequence[str]] = None, database_url: Optional[str] = None) -> GenerationReport:
+    """
+    Load synthetic rows at ``scale`` (a key of ``SCALES``). With ``truncate``
+    the generated tables are emptied first (the seeded plans are kept).
+    """
+    sizes = SCALES[scale]
+    selected = [t for t in TABLES if tables is None or t[0] in tables]
+    engine = database.get_engine(database_url)
+    report = GenerationReport(seed=seed, scale=scale, rows={}, seconds={})
+
+    with engine.begin() as conn:
+        if truncate:
+            names = [name for name, *_ in selected if name != 'planes_suscripcion_legal']
+            if names:
+                conn.exec_driver_sql(f"TRUNCATE {', '.join(names)} CASCADE")
+            conn.execute(text("DELETE FROM planes_suscripcion_legal WHERE codigo LIKE 'synthetic\\_%'"))
+        plan_ids = {codigo: str(plan_id) for plan_id, codigo in conn.execute(
+            text("SELECT id, codigo FROM planes_suscripcion_legal"))}
+        # Give the generated history real monthly partitions instead of the default one
+        first_month = (EPOCH - timedelta(days=HISTORY_DAYS + 1)).date()
+        for table, *_ in selected:
+            if table in partitions.LOG_TABLES:
+                partitions.create_partitions_range(conn, table, first_month, EPOCH.date() + timedelta(days=1))
+    missing = {'starter', 'pro', 'enterprise'} - set(plan_ids)
+    if missing:
+        raise RuntimeError(f"Seeded plans missing ({', '.join(sorted(missing))}); deploy schema.sql first")
+
+    for table, _, _, count_fn in selected:
+        total = count_fn(sizes)
+        started = time.perf_counter()
+        tasks = [
+            (table, chunk, start, min(start + CHUNK_ROWS, total), seed, sizes, plan_ids, database_url)
+            for chunk, start in enumerate(range(0, total, CHUNK_ROWS))
+        ]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                loaded = sum(pool.map(_load_chunk_args, tasks))
+        else:
+            loaded = sum(_load_chunk_args(task) for task in tasks)
+        report.rows[table] = loaded
+        report.seconds[table] = time.perf_counter() - started
+
+    if tables is None or 'abogados_valoraciones' in tables:
+        started = time.perf_counter()
+        ratings.recompute_all(database_url=database_url)
+        report.seconds['ratings'] = time.perf_counter() - started
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for table, *_ in selected:
+            conn.exec_driver_sql(f"ANALYZE {table}")
+        if any(table == 'abogados' for table, *_ in selected):
+            # Filled by the abogados triggers during the load
+            conn.exec_driver_sql("ANALYZE abogados_directorio")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in SCALES:
+        print(f"Usage: python synthetic_data.py [{'|'.join(SCALES)}] [--seed N] [--workers N] [--truncate]")
+        sys.exit(1)
+    seed, workers = DEFAULT_SEED, 4
+    if "--seed" in sys.argv:
+        seed = int(sys.argv[sys.argv.index("--seed") + 1])
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    print(generate(sys.argv[1], seed=seed, workers=workers, truncate="--truncate" in sys.argv).summary())